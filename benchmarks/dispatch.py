@@ -0,0 +1,374 @@
+"""Micro-benchmarks of the per-request cost of RouteGroup endpoints.
+
+Each scenario builds a Starlette application and calls it in-process with a minimal ASGI scope,
+so the numbers include routing, dependency resolution and the view call, but no network or server overhead.
+Every scenario is compared against the same endpoint registered as a bare Starlette route.
+
+Usage:
+    python -m benchmarks.dispatch --output results.json
+    python -m benchmarks.dispatch --filter depth --number 2000
+    python -m benchmarks.dispatch --compare before.json after.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import inspect
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+import starlette
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route, WebSocketRoute
+from starlette.types import ASGIApp, Message
+from starlette.websockets import WebSocket
+
+from starlette_dispatch import (
+    ApplicationDependencies,
+    CachedResolver,
+    DependencyScope,
+    FactoryExecutor,
+    FactoryResolver,
+    RouteGroup,
+)
+from starlette_dispatch.injections import APP_DEPENDENCIES_KEY
+
+BASELINE = "baseline"
+
+
+@dataclasses.dataclass
+class Scenario:
+    name: str
+    group: str
+    app: ASGIApp
+    scope_type: str = "http"
+    params: dict[str, typing.Any] = dataclasses.field(default_factory=dict)
+    path: str = "/"
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    group: str
+    params: dict[str, typing.Any]
+    median_ns: float
+    min_ns: float
+    mean_ns: float
+    stdev_ns: float
+    overhead_ns: float = 0.0
+
+
+async def _ok_view() -> Response:
+    return PlainTextResponse("ok")
+
+
+async def _bare_view(request: Request) -> Response:
+    return PlainTextResponse("ok")
+
+
+async def _bare_websocket_view(websocket: WebSocket) -> None:
+    await websocket.accept()
+    await websocket.close()
+
+
+def _make_app(routes: typing.Sequence[typing.Any]) -> Starlette:
+    return Starlette(routes=list(routes))
+
+
+def _make_dispatch_app(view: typing.Callable[..., typing.Any], **options: typing.Any) -> Starlette:
+    group = RouteGroup(**options)
+    group.get("/")(view)
+    return _make_app(group)
+
+
+def _chain(depth: int, *, is_async: bool = False) -> typing.Any:
+    """Build an annotation of a chain of transient factories, each depending on the previous one."""
+    annotation: typing.Any = typing.Annotated[int, FactoryResolver(lambda: 0)]
+    for _ in range(depth - 1):
+        factory = _make_async_chain_factory() if is_async else _make_chain_factory()
+        factory.__annotations__["value"] = annotation
+        annotation = typing.Annotated[int, FactoryResolver(factory)]
+    return annotation
+
+
+def _make_chain_factory() -> typing.Callable[..., typing.Any]:
+    def factory(value: typing.Any) -> int:
+        return typing.cast(int, value) + 1
+
+    return factory
+
+
+def _make_async_chain_factory() -> typing.Callable[..., typing.Any]:
+    async def factory(value: typing.Any) -> int:
+        return typing.cast(int, value) + 1
+
+    return factory
+
+
+def _view_with(annotations: dict[str, typing.Any]) -> typing.Callable[..., typing.Awaitable[Response]]:
+    """Create a view that accepts parameters with the given annotations."""
+
+    async def view(**dependencies: typing.Any) -> Response:
+        return PlainTextResponse("ok")
+
+    view.__signature__ = _signature(annotations)  # type: ignore[attr-defined]
+    return view
+
+
+def _signature(annotations: dict[str, typing.Any]) -> inspect.Signature:
+    return inspect.Signature(
+        [
+            inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=annotation)
+            for name, annotation in annotations.items()
+        ]
+    )
+
+
+def _sync_factory() -> int:
+    return 1
+
+
+async def _async_factory() -> int:
+    return 1
+
+
+@contextlib.contextmanager
+def _sync_cm_factory() -> typing.Iterator[int]:
+    yield 1
+
+
+@contextlib.asynccontextmanager
+async def _async_cm_factory() -> typing.AsyncIterator[int]:
+    yield 1
+
+
+def build_scenarios() -> list[Scenario]:
+    scenarios = [
+        Scenario(BASELINE, BASELINE, _make_app([Route("/", _bare_view)])),
+        Scenario("no_dependencies", "dispatch", _make_dispatch_app(_ok_view)),
+        Scenario("request", "dispatch", _make_dispatch_app(_view_with({"request": Request}))),
+    ]
+
+    for depth in (1, 5, 10):
+        for is_async in (False, True):
+            view = _view_with({"value": _chain(depth, is_async=is_async)})
+            params = {"depth": depth, "async": is_async}
+            suffix = "async" if is_async else "sync"
+            scenarios.append(Scenario(f"depth_{depth}_{suffix}", "depth", _make_dispatch_app(view), params=params))
+        view = _view_with({"value": _chain(depth)})
+        scenarios.append(
+            Scenario(
+                f"depth_{depth}_compiled",
+                "depth",
+                _make_dispatch_app(view, compile_dependencies=True),
+                params={"depth": depth, "compiled": True},
+            )
+        )
+
+    for fan_out in (1, 5, 20):
+        for is_async in (False, True):
+            factory = _async_factory if is_async else _sync_factory
+            view = _view_with(
+                {f"value_{index}": typing.Annotated[int, FactoryResolver(factory)] for index in range(fan_out)}
+            )
+            suffix = "async" if is_async else "sync"
+            params = {"fan_out": fan_out, "async": is_async}
+            scenarios.append(
+                Scenario(f"fan_out_{fan_out}_{suffix}", "fan_out", _make_dispatch_app(view), params=params)
+            )
+
+    scoped_factories: dict[str, FactoryResolver] = {
+        "transient": FactoryResolver(_sync_factory),
+        "singleton": FactoryResolver(_sync_factory, scope=DependencyScope.SINGLETON),
+        "request": FactoryResolver(_sync_factory, scope=DependencyScope.REQUEST),
+        "app": FactoryResolver(_sync_factory, scope=DependencyScope.APP),
+        "cached": CachedResolver(_sync_factory, ttl=60),
+        "threadpool": FactoryResolver(_sync_factory, executor=FactoryExecutor.THREADPOOL),
+    }
+    for scope, resolver in scoped_factories.items():
+        view = _view_with({"value": typing.Annotated[int, resolver]})
+        scenarios.append(Scenario(f"scope_{scope}", "scope", _make_dispatch_app(view), params={"scope": scope}))
+
+    for name, cm_factory in (("sync", _sync_cm_factory), ("async", _async_cm_factory)):
+        view = _view_with({"value": typing.Annotated[int, FactoryResolver(cm_factory)]})
+        scenarios.append(Scenario(f"context_manager_{name}", "context_manager", _make_dispatch_app(view)))
+
+    routing_group = RouteGroup()
+    for index in range(2000):
+        routing_group.get(f"/resource{index}/{{id:int}}")(_ok_view)
+    for name, app in (("flat", _make_app(routing_group)), ("radix", _make_app(routing_group.compile()))):
+        for target, path in (("first", "/resource0/1"), ("last", "/resource1999/1"), ("missing", "/missing/1")):
+            routing_params: dict[str, typing.Any] = {"routes": 2000, "router": name, "target": target}
+            scenarios.append(Scenario(f"routing_{name}_{target}", "routing", app, params=routing_params, path=path))
+
+    websocket_group = RouteGroup()
+    websocket_group.websocket("/")(_bare_websocket_view)
+    scenarios += [
+        Scenario(
+            "websocket_baseline", "websocket", _make_app([WebSocketRoute("/", _bare_websocket_view)]), "websocket"
+        ),
+        Scenario("websocket", "websocket", _make_app(websocket_group), "websocket"),
+    ]
+    return scenarios
+
+
+def _make_scope(scope_type: str, state: dict[str, typing.Any], path: str = "/") -> dict[str, typing.Any]:
+    return {
+        "type": scope_type,
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http" if scope_type == "http" else "ws",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+        "state": state.copy(),
+    }
+
+
+async def _receive_http() -> Message:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _receive_websocket() -> Message:
+    return {"type": "websocket.connect"}
+
+
+async def _send(message: Message) -> None:
+    pass
+
+
+async def measure(scenario: Scenario, *, number: int, repeat: int, state: dict[str, typing.Any]) -> list[float]:
+    """Return nanoseconds per request for each round."""
+    receive = _receive_http if scenario.scope_type == "http" else _receive_websocket
+    app = scenario.app
+
+    for _ in range(min(number, 200)):
+        await app(_make_scope(scenario.scope_type, state, scenario.path), receive, _send)
+
+    rounds = []
+    for _ in range(repeat):
+        scopes = [_make_scope(scenario.scope_type, state, scenario.path) for _ in range(number)]
+        started_at = time.perf_counter_ns()
+        for scope in scopes:
+            await app(scope, receive, _send)
+        rounds.append((time.perf_counter_ns() - started_at) / number)
+    return rounds
+
+
+async def run(*, number: int, repeat: int, name_filter: str | None) -> list[Result]:
+    scenarios = [
+        scenario
+        for scenario in build_scenarios()
+        if scenario.name == BASELINE or not name_filter or name_filter in scenario.name
+    ]
+    results: list[Result] = []
+    async with ApplicationDependencies() as app_dependencies:
+        state = {APP_DEPENDENCIES_KEY: app_dependencies}
+        for scenario in scenarios:
+            rounds = await measure(scenario, number=number, repeat=repeat, state=state)
+            results.append(
+                Result(
+                    name=scenario.name,
+                    group=scenario.group,
+                    params=scenario.params,
+                    median_ns=statistics.median(rounds),
+                    min_ns=min(rounds),
+                    mean_ns=statistics.fmean(rounds),
+                    stdev_ns=statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+                )
+            )
+
+    baselines = {result.name: result.median_ns for result in results}
+    for result in results:
+        baseline = baselines["websocket_baseline"] if result.group == "websocket" else baselines[BASELINE]
+        result.overhead_ns = result.median_ns - baseline
+    return results
+
+
+def _git_revision() -> str | None:
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        output = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL)
+        return output.decode().strip()
+    return None
+
+
+def _metadata(number: int, repeat: int) -> dict[str, typing.Any]:
+    return {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "starlette": starlette.__version__,
+        "number": number,
+        "repeat": repeat,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def print_results(results: list[Result]) -> None:
+    print(f"{'scenario':<28} {'median':>12} {'min':>12} {'stdev':>10} {'overhead':>12}")
+    for result in results:
+        print(
+            f"{result.name:<28} {result.median_ns / 1000:>10.2f}us {result.min_ns / 1000:>10.2f}us "
+            f"{result.stdev_ns / 1000:>8.2f}us {result.overhead_ns / 1000:>+10.2f}us"
+        )
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before = {result["name"]: result for result in json.load(before_file)["results"]}
+        after = {result["name"]: result for result in json.load(after_file)["results"]}
+
+    print(f"{'scenario':<28} {'before':>12} {'after':>12} {'change':>8}")
+    for name, result in after.items():
+        if name not in before:
+            continue
+        old, new = before[name]["median_ns"], result["median_ns"]
+        print(f"{name:<28} {old / 1000:>10.2f}us {new / 1000:>10.2f}us {(new - old) / old:>+8.1%}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=1000, help="requests per round")
+    parser.add_argument("--repeat", type=int, default=5, help="number of rounds")
+    parser.add_argument("--filter", dest="name_filter", help="run only scenarios containing this string")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = asyncio.run(run(number=args.number, repeat=args.repeat, name_filter=args.name_filter))
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "metadata": _metadata(args.number, args.repeat),
+                    "results": [dataclasses.asdict(result) for result in results],
+                },
+                output,
+                indent=2,
+            )
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""Load test of a RouteGroup application with realistic dependency graphs.
+
+Concurrent clients send requests back-to-back for a fixed duration, the harness reports throughput
+and p50/p99/p999 latency per scenario. The application reuses dependencies and middleware of `examples/`.
+
+HTTP scenarios can be driven in-process (the ASGI application is called directly) or through uvicorn
+on loopback (in a separate process) with httpx. WebSocket scenarios are always driven in-process, as httpx has no websocket client.
+
+Usage:
+    python -m benchmarks.load
+    python -m benchmarks.load --driver uvicorn --concurrency 64 --duration 10
+    python -m benchmarks.load --scenario deep_chain --scenario websockets --output load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import json
+import math
+import platform
+import socket
+import subprocess
+import sys
+import time
+import typing
+
+import anyio
+import httpx
+from starlette.applications import Starlette
+from starlette.authentication import SimpleUser
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.types import ASGIApp, Message
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from examples.dependencies import aenter_factory, AsyncValue, ChildValue, CurrentUser, enter_factory
+from examples.middleware import ProvideUser
+from starlette_dispatch import (
+    DependencyScope,
+    dependency_lifespan,
+    FactoryResolver,
+    RouteGroup,
+)
+
+
+@dataclasses.dataclass
+class Scenario:
+    name: str
+    description: str
+    path: str
+    websocket: bool = False
+
+
+SCENARIOS = [
+    Scenario("deep_chain", "chain of 10 sync and async factories", "/deep"),
+    Scenario("request_scope", "REQUEST scoped factory shared by 8 dependents", "/request-scope"),
+    Scenario("sync_view", "sync view and factories running in the threadpool", "/sync"),
+    Scenario("context_managers", "sync and async context manager factories", "/cm"),
+    Scenario("mixed", "path, request and user dependencies", "/users/42"),
+    Scenario("websockets", "many open websockets exchanging messages", "/ws", websocket=True),
+]
+
+
+def _build_deep_chain(depth: int) -> typing.Any:
+    annotation: typing.Any = typing.Annotated[int, FactoryResolver(lambda: 0)]
+    for level in range(depth):
+        factory = _make_async_step() if level % 2 else _make_sync_step()
+        factory.__annotations__["value"] = annotation
+        annotation = typing.Annotated[int, FactoryResolver(factory)]
+    return annotation
+
+
+def _make_sync_step() -> typing.Callable[..., typing.Any]:
+    def step(value: typing.Any) -> int:
+        return typing.cast(int, value) + 1
+
+    return step
+
+
+def _make_async_step() -> typing.Callable[..., typing.Any]:
+    async def step(value: typing.Any) -> int:
+        return typing.cast(int, value) + 1
+
+    return step
+
+
+def _load_settings(request: Request) -> dict[str, str]:
+    return {"path": request.url.path}
+
+
+Settings = typing.Annotated[dict[str, str], FactoryResolver(_load_settings, scope=DependencyScope.REQUEST)]
+
+
+def _dependent(settings: Settings) -> str:
+    return settings["path"]
+
+
+Dependent = typing.Annotated[str, FactoryResolver(_dependent)]
+
+
+def _blocking_factory() -> int:
+    time.sleep(0.0001)
+    return 1
+
+
+DeepChain = _build_deep_chain(10)
+Blocking = typing.Annotated[int, FactoryResolver(_blocking_factory)]
+
+
+def build_app() -> Starlette:
+    group = RouteGroup()
+
+    @group.get("/deep")
+    async def deep_view(value: DeepChain) -> Response:  # type: ignore[valid-type]
+        return PlainTextResponse(str(value))
+
+    @group.get("/request-scope")
+    async def request_scope_view(
+        settings: Settings,
+        a: Dependent,
+        b: Dependent,
+        c: Dependent,
+        d: Dependent,
+        e: Dependent,
+        f: Dependent,
+        g: Dependent,
+        h: Dependent,
+    ) -> Response:
+        return PlainTextResponse(settings["path"])
+
+    @group.get("/sync")
+    def sync_view(value: Blocking, child: ChildValue) -> Response:
+        time.sleep(0.0001)
+        return PlainTextResponse(child)
+
+    @group.get("/cm")
+    async def context_manager_view(
+        sync: typing.Annotated[str, enter_factory], asyncf: typing.Annotated[str, aenter_factory]
+    ) -> Response:
+        return JSONResponse({"sync": sync, "async": asyncf})
+
+    @group.get("/users/{user_id}")
+    async def user_view(request: Request, user: CurrentUser, value: AsyncValue) -> Response:
+        return JSONResponse({"user": user.username, "id": request.path_params["user_id"], "value": value})
+
+    @group.websocket("/ws")
+    async def websocket_view(websocket: WebSocket, user: CurrentUser) -> None:
+        await websocket.accept()
+        with contextlib.suppress(WebSocketDisconnect):
+            while True:
+                await websocket.send_text(f"{user.username}: {await websocket.receive_text()}")
+
+    return Starlette(
+        routes=group,
+        middleware=[Middleware(ProvideUser, user=SimpleUser(username="load"))],
+        lifespan=dependency_lifespan,
+    )
+
+
+@dataclasses.dataclass
+class Report:
+    scenario: str
+    driver: str
+    concurrency: int
+    duration: float
+    requests: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    p999_ms: float
+    max_ms: float
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return math.nan
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def make_report(
+    scenario: Scenario, driver: str, concurrency: int, duration: float, latencies: list[float], errors: int
+) -> Report:
+    latencies.sort()
+    return Report(
+        scenario=scenario.name,
+        driver=driver,
+        concurrency=concurrency,
+        duration=duration,
+        requests=len(latencies),
+        errors=errors,
+        throughput=len(latencies) / duration,
+        p50_ms=percentile(latencies, 0.5) * 1000,
+        p99_ms=percentile(latencies, 0.99) * 1000,
+        p999_ms=percentile(latencies, 0.999) * 1000,
+        max_ms=(latencies[-1] if latencies else math.nan) * 1000,
+    )
+
+
+async def _run_clients(
+    concurrency: int, duration: float, send: typing.Callable[[], typing.Awaitable[bool]]
+) -> tuple[list[float], int, float]:
+    """Run closed-loop clients, each sending the next request when the previous completes."""
+    latencies: list[float] = []
+    errors = 0
+    started_at = time.perf_counter()
+    deadline = started_at + duration
+
+    async def client() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            request_started_at = time.perf_counter()
+            if await send():
+                latencies.append(time.perf_counter() - request_started_at)
+            else:
+                errors += 1
+
+    async with anyio.create_task_group() as task_group:
+        for _ in range(concurrency):
+            task_group.start_soon(client)
+    return latencies, errors, time.perf_counter() - started_at
+
+
+def _make_scope(scope_type: str, path: str, state: dict[str, typing.Any]) -> dict[str, typing.Any]:
+    return {
+        "type": scope_type,
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http" if scope_type == "http" else "ws",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"loadtest")],
+        "server": ("loadtest", 80),
+        "client": ("127.0.0.1", 50000),
+        "state": state.copy(),
+    }
+
+
+async def run_in_process(
+    app: ASGIApp, scenario: Scenario, *, concurrency: int, duration: float, state: dict[str, typing.Any]
+) -> Report:
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send_request() -> bool:
+        status = 0
+
+        async def send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await app(_make_scope("http", scenario.path, state), receive, send)
+        return status == 200
+
+    latencies, errors, elapsed = await _run_clients(concurrency, duration, send_request)
+    return make_report(scenario, "asgi", concurrency, elapsed, latencies, errors)
+
+
+class _WebSocketSession:
+    """In-process websocket client connected to the ASGI application."""
+
+    def __init__(self, app: ASGIApp, path: str, state: dict[str, typing.Any]) -> None:
+        self.app = app
+        self.scope = _make_scope("websocket", path, state)
+        self.inbound: asyncio.Queue[Message] = asyncio.Queue()
+        self.outbound: asyncio.Queue[Message] = asyncio.Queue()
+
+    async def run(self) -> None:
+        await self.app(self.scope, self.inbound.get, self.outbound.put)
+
+    async def connect(self) -> None:
+        await self.inbound.put({"type": "websocket.connect"})
+        message = await self.outbound.get()
+        assert message["type"] == "websocket.accept", message
+
+    async def exchange(self, text: str) -> bool:
+        await self.inbound.put({"type": "websocket.receive", "text": text})
+        message = await self.outbound.get()
+        return bool(message["type"] == "websocket.send")
+
+    async def close(self) -> None:
+        await self.inbound.put({"type": "websocket.disconnect", "code": 1000})
+
+
+async def run_websockets(
+    app: ASGIApp, scenario: Scenario, *, concurrency: int, duration: float, state: dict[str, typing.Any]
+) -> Report:
+    """Open `concurrency` websockets, then measure message round trips while all of them stay open."""
+    sessions = [_WebSocketSession(app, scenario.path, state) for _ in range(concurrency)]
+    async with anyio.create_task_group() as task_group:
+        for session in sessions:
+            task_group.start_soon(session.run)
+        for session in sessions:
+            await session.connect()
+
+        available: asyncio.Queue[_WebSocketSession] = asyncio.Queue()
+        for session in sessions:
+            available.put_nowait(session)
+
+        async def send_message() -> bool:
+            session = await available.get()
+            try:
+                return await session.exchange("ping")
+            finally:
+                available.put_nowait(session)
+
+        latencies, errors, elapsed = await _run_clients(concurrency, duration, send_message)
+        for session in sessions:
+            await session.close()
+    return make_report(scenario, "asgi", concurrency, elapsed, latencies, errors)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return typing.cast(int, sock.getsockname()[1])
+
+
+@contextlib.contextmanager
+def serve() -> typing.Iterator[str]:
+    """Run the application with uvicorn on loopback in a separate process, so the server does not share
+    the interpreter with the load generator."""
+    port = _free_port()
+    command = [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.load:build_app"]
+    command += ["--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"]
+    process = subprocess.Popen(command)
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                break
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("uvicorn failed to start.")
+            time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def run_over_http(base_url: str, scenario: Scenario, *, concurrency: int, duration: float) -> Report:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+
+        async def send_request() -> bool:
+            response = await client.get(scenario.path)
+            return response.status_code == 200
+
+        latencies, errors, elapsed = await _run_clients(concurrency, duration, send_request)
+    return make_report(scenario, "uvicorn", concurrency, elapsed, latencies, errors)
+
+
+async def run(scenarios: list[Scenario], *, driver: str, concurrency: int, duration: float) -> list[Report]:
+    app = build_app()
+    reports: list[Report] = []
+    with serve() if driver == "uvicorn" else contextlib.nullcontext("") as base_url:
+        async with dependency_lifespan(app) as state:
+            for scenario in scenarios:
+                if scenario.websocket:
+                    report = await run_websockets(
+                        app, scenario, concurrency=concurrency, duration=duration, state=state
+                    )
+                elif driver == "uvicorn":
+                    report = await run_over_http(base_url, scenario, concurrency=concurrency, duration=duration)
+                else:
+                    report = await run_in_process(
+                        app, scenario, concurrency=concurrency, duration=duration, state=state
+                    )
+                reports.append(report)
+    return reports
+
+
+def print_reports(reports: list[Report]) -> None:
+    print(
+        f"{'scenario':<18} {'driver':<8} {'conc':>5} {'requests':>9} {'errors':>6} {'req/s':>10} "
+        f"{'p50':>9} {'p99':>9} {'p999':>9}"
+    )
+    for report in reports:
+        print(
+            f"{report.scenario:<18} {report.driver:<8} {report.concurrency:>5} {report.requests:>9} "
+            f"{report.errors:>6} {report.throughput:>10.0f} {report.p50_ms:>7.3f}ms {report.p99_ms:>7.3f}ms "
+            f"{report.p999_ms:>7.3f}ms"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--driver", choices=["asgi", "uvicorn"], default="asgi", help="how to send HTTP requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=[scenario.name for scenario in SCENARIOS],
+        help="scenario to run, can be repeated (default: all)",
+    )
+    parser.add_argument("--output", help="write reports as JSON to this file")
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+    reports = asyncio.run(run(scenarios, driver=args.driver, concurrency=args.concurrency, duration=args.duration))
+    print_reports(reports)
+    if args.output:
+        metadata = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        with open(args.output, "w") as output:
+            json.dump(
+                {"metadata": metadata, "reports": [dataclasses.asdict(report) for report in reports]},
+                output,
+                indent=2,
+            )
+        print(f"Reports written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
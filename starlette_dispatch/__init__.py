@@ -1,19 +1,41 @@
 from starlette_dispatch.contrib.dependencies import FromPath, PathParamValue
 from starlette_dispatch.injections import (
+    ApplicationDependencies,
+    CachedResolver,
+    dependency_lifespan,
     DependencyError,
     DependencyResolver,
     DependencySpec,
+    FactoryExecutor,
     FactoryResolver,
+    get_request_cache,
+    Lazy,
     VariableResolver,
     RequestResolver,
     ResolveContext,
     DependencyScope,
+    PlanStep,
+    ResolutionHooks,
+    ResolutionPlan,
+    ResolveEvent,
+    warm_up_dependencies,
+    WarmUpResult,
 )
-from starlette_dispatch.route_group import RouteGroup
+from starlette_dispatch.profiling import RequestProfiler
+from starlette_dispatch.route_group import DispatchRoute, DispatchWebSocketRoute, RouteGroup
+from starlette_dispatch.routing import RadixRouter
+from starlette_dispatch.stats import RouteStats
+from starlette_dispatch.timing import BlockingCall, BlockingDetector, RequestTimings, ServerTiming
 
 __all__ = [
+    "ApplicationDependencies",
+    "CachedResolver",
+    "dependency_lifespan",
     "DependencyResolver",
+    "FactoryExecutor",
     "FactoryResolver",
+    "get_request_cache",
+    "Lazy",
     "VariableResolver",
     "RequestResolver",
     "DependencyError",
@@ -23,5 +45,20 @@ __all__ = [
     "FromPath",
     "ResolveContext",
     "DependencyScope",
+    "PlanStep",
+    "ResolutionHooks",
+    "ResolutionPlan",
+    "ResolveEvent",
+    "DispatchRoute",
+    "DispatchWebSocketRoute",
+    "BlockingCall",
+    "BlockingDetector",
+    "RadixRouter",
+    "RequestProfiler",
+    "RequestTimings",
+    "RouteStats",
+    "ServerTiming",
+    "warm_up_dependencies",
+    "WarmUpResult",
 ]
 __version__ = "0.27.3"
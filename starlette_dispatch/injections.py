@@ -1,14 +1,30 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import collections
+import concurrent.futures
 import contextlib
+import contextvars
 import dataclasses
 import enum
+import functools
+import importlib
 import inspect
+import linecache
+import logging
+import math
+import time
 import types
 import typing
 
-from starlette.requests import HTTPConnection
+import anyio
+import anyio.abc
+import anyio.to_thread
+import sniffio
+from starlette.requests import HTTPConnection, Request
+from starlette.types import Scope
+from starlette.websockets import WebSocket
 
 
 @dataclasses.dataclass
@@ -17,6 +33,11 @@ class ResolveContext:
     sync_stack: contextlib.ExitStack
     async_stack: contextlib.AsyncExitStack
     static_resolvers: dict[typing.Any, DependencyResolver]
+    factory_executor: SyncExecutor | None = None
+    hooks: ResolutionHooks | None = None
+    route_path: str | None = None
+    # values of transient factories shared within one resolution of a deduplicated plan
+    transient_values: dict[FactoryResolver, _PendingValue] | None = None
 
 
 class DependencyError(Exception): ...
@@ -37,61 +58,462 @@ class DependencyScope(enum.StrEnum):
     TRANSIENT = "transient"
     SINGLETON = "singleton"
     REQUEST = "request"
+    APP = "app"
+
+
+_MISSING: typing.Any = object()
+_T = typing.TypeVar("_T")
+
+logger = logging.getLogger(__name__)
+_REQUEST_CACHE_KEY = "starlette_dispatch.request_cache"
+_REQUEST_PENDING_KEY = "starlette_dispatch.request_pending"
+
+
+def get_request_cache(scope: Scope) -> dict[DependencyResolver, typing.Any]:
+    """Return the cache of REQUEST scoped dependencies of the connection.
+
+    The cache is stored in the ASGI scope, so it is shared by middleware and the endpoint.
+    Keys are resolver instances, middleware can put values into the cache to provide them to the endpoint."""
+    try:
+        return typing.cast(dict[DependencyResolver, typing.Any], scope[_REQUEST_CACHE_KEY])
+    except KeyError:
+        cache: dict[DependencyResolver, typing.Any] = {}
+        scope[_REQUEST_CACHE_KEY] = cache
+        return cache
+
+
+@dataclasses.dataclass(slots=True)
+class _Initialization:
+    event: anyio.Event
+    error: Exception | None = None
+
+
+@dataclasses.dataclass(slots=True)
+class _SharedValue:
+    """Value that is created once and shared by all callers.
+
+    Concurrent callers wait for the running initialization and share its result.
+    Failed initialization is not cached, the next caller will create the value again."""
+
+    value: typing.Any = _MISSING
+    initialization: _Initialization | None = None
+
+    async def get_or_create(self, create: typing.Callable[[], typing.Awaitable[typing.Any]]) -> typing.Any:
+        while initialization := self.initialization:
+            await initialization.event.wait()
+            if initialization.error is not None:
+                raise initialization.error
+            # the value is set unless the initialization was cancelled, then it is initialized again
+
+        if self.value is not _MISSING:
+            return self.value
+
+        initialization = self.initialization = _Initialization(event=anyio.Event())
+        try:
+            self.value = await create()
+            return self.value
+        except Exception as ex:
+            initialization.error = ex
+            raise
+        finally:
+            self.initialization = None
+            initialization.event.set()
+
+
+def _outliving_context(context: ResolveContext) -> ResolveContext:
+    """Context for creating a value that outlives the resolution, it must not capture values shared by the resolution."""
+    if context.transient_values is None:
+        return context
+    return dataclasses.replace(context, transient_values=None)
+
+
+class _PendingValue:
+    """Value that is being created (REQUEST scoped, or transient in deduplicated plans),
+    the event is allocated only when another task waits for it."""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self) -> None:
+        self.event: anyio.Event | None = None
+        self.value: typing.Any = _MISSING
+        self.error: Exception | None = None
+
+
+APP_DEPENDENCIES_KEY = "starlette_dispatch.app_dependencies"
+
+
+class ApplicationDependencies:
+    """Storage of APP scoped dependencies.
+
+    Values are created once per application, context managers returned by factories are closed
+    when this object exits. Use `dependency_lifespan` to bind it to the application lifespan.
+
+    Background tasks started with `start_soon` run until the application shuts down, then they are cancelled."""
+
+    def __init__(self) -> None:
+        self.values: dict[DependencyResolver, _SharedValue] = {}
+        self.sync_stack = contextlib.ExitStack()
+        self.async_stack = contextlib.AsyncExitStack()
+        self._task_group: anyio.abc.TaskGroup | None = None
+
+    @property
+    def running(self) -> bool:
+        """Whether background tasks can be started."""
+        return self._task_group is not None
+
+    def start_soon(self, fn: typing.Callable[[], typing.Coroutine[typing.Any, typing.Any, None]]) -> None:
+        if self._task_group is None:
+            raise RuntimeError("Application dependencies are not entered, background tasks cannot be started.")
+        self._task_group.start_soon(fn)
+
+    async def __aenter__(self) -> ApplicationDependencies:
+        task_group = anyio.create_task_group()
+        await task_group.__aenter__()
+        self._task_group = task_group
+        return self
+
+    async def __aexit__(self, *exc_info: typing.Any) -> None:
+        try:
+            task_group, self._task_group = self._task_group, None
+            if task_group is not None:
+                task_group.cancel_scope.cancel()
+                await task_group.__aexit__(None, None, None)
+            await self.async_stack.aclose()
+        finally:
+            self.sync_stack.close()
+            self.values.clear()
+
+
+@contextlib.asynccontextmanager
+async def dependency_lifespan(
+    app: typing.Any, *, warm_up: bool = False
+) -> typing.AsyncGenerator[dict[str, typing.Any], None]:
+    """Lifespan that provides APP scoped dependencies to the application.
+    Pass it to `Starlette(lifespan=...)` or enter it in your own lifespan and include the yielded state.
+
+    When `warm_up` is set, SINGLETON and APP scoped factories of the application routes are created on startup,
+    see `warm_up_dependencies`."""
+    async with ApplicationDependencies() as dependencies:
+        if warm_up:
+            await warm_up_dependencies(iter_route_dependencies(app.routes), app_dependencies=dependencies)
+        yield {APP_DEPENDENCIES_KEY: dependencies}
+
+
+class FactoryExecutor(enum.StrEnum):
+    """Defines where sync factories are called."""
+
+    INLINE = "inline"
+    THREADPOOL = "threadpool"
+
+
+SyncExecutor = FactoryExecutor | concurrent.futures.Executor
 
 
 class FactoryResolver(DependencyResolver):
-    """Dependency resolver that resolves dependencies from factories."""
+    """Dependency resolver that resolves dependencies from factories.
+
+    Sync factories are called on the event loop unless `executor` is set.
+    Use FactoryExecutor.THREADPOOL or a custom executor for blocking factories.
+    When `executor` is not set, the default executor of the route group is used."""
 
     def __init__(
-        self, resolver: typing.Callable[..., typing.Any], *, scope: DependencyScope = DependencyScope.TRANSIENT
+        self,
+        resolver: typing.Callable[..., typing.Any],
+        *,
+        scope: DependencyScope = DependencyScope.TRANSIENT,
+        executor: SyncExecutor | None = None,
     ) -> None:
         self._scope = scope
+        self._executor = executor
         self._resolver = resolver
         self._dependencies = create_dependency_specs(resolver)
+        self._plan = ResolutionPlan.build(self._dependencies)
         self._is_async = inspect.iscoroutinefunction(resolver)
-        self._value: typing.Any = None
+        self._may_return_context_manager = _may_return_context_manager(resolver)
+        self._singleton = _SharedValue()
+
+    @property
+    def _is_inlinable(self) -> bool:
+        """Transient factories can be inlined into resolution plans unless a subclass changes how they resolve."""
+        return self._scope == DependencyScope.TRANSIENT and type(self).resolve is FactoryResolver.resolve
+
+    @property
+    def requires_exit_stacks(self) -> bool:
+        # APP scoped dependencies use exit stacks of the application
+        if self._scope == DependencyScope.APP:
+            return False
+        return self._may_return_context_manager or self._plan.requires_exit_stacks
 
     async def resolve(self, context: ResolveContext, spec: DependencySpec) -> typing.Any:
-        if self._scope == DependencyScope.SINGLETON and self._value is not None:
-            return self._value
+        if self._scope == DependencyScope.SINGLETON:
+            if self._singleton.value is not _MISSING:
+                return self._singleton.value
+            create = functools.partial(self._create, _outliving_context(context), spec)
+            return await self._singleton.get_or_create(create)
 
         if self._scope == DependencyScope.REQUEST:
-            if value := self._get_dependency_from_request(context.connection, spec):
-                return value
+            cache = get_request_cache(context.connection.scope)
+            value = cache.get(self, _MISSING)
+            if value is _MISSING:
+                value = await self._create_request_value(context, spec, cache)
+            return value
+
+        if self._scope == DependencyScope.APP:
+            return await self._resolve_app_value(context, spec)
+
+        if context.transient_values is not None:
+            return await self._create_shared(context, functools.partial(self._create, context, spec))
+        return await self._create(context, spec)
+
+    async def _create_shared(
+        self, context: ResolveContext, create: typing.Callable[[], typing.Awaitable[typing.Any]]
+    ) -> typing.Any:
+        """Create the transient value once per resolution, including nested resolutions of scoped factories."""
+        shared = typing.cast(dict[FactoryResolver, _PendingValue], context.transient_values)
+        while (entry := shared.get(self)) is not None:
+            if entry.value is not _MISSING:
+                return entry.value
+            if entry.error is not None:
+                raise entry.error
+            if entry.event is None:
+                entry.event = anyio.Event()
+            await entry.event.wait()
+            # the creation was cancelled when the entry is gone, try to create again
+
+        entry = shared[self] = _PendingValue()
+        try:
+            entry.value = await create()
+            return entry.value
+        except Exception as ex:
+            entry.error = ex
+            raise
+        except BaseException:
+            del shared[self]
+            raise
+        finally:
+            if entry.event is not None:
+                entry.event.set()
+
+    async def _create_request_value(
+        self, context: ResolveContext, spec: DependencySpec, cache: dict[DependencyResolver, typing.Any]
+    ) -> typing.Any:
+        # concurrent tasks of one request may need the same value, they wait for the first task to create it
+        scope = context.connection.scope
+        pending: dict[DependencyResolver, _PendingValue] | None = scope.get(_REQUEST_PENDING_KEY)
+        if pending is None:
+            pending = scope[_REQUEST_PENDING_KEY] = {}
+
+        while (waiting := pending.get(self)) is not None:
+            if waiting.event is None:
+                waiting.event = anyio.Event()
+            await waiting.event.wait()
+            if waiting.error is not None:
+                raise waiting.error
+            if waiting.value is not _MISSING:
+                return waiting.value
+            # the creation was cancelled, try to create again
+
+        entry = pending[self] = _PendingValue()
+        try:
+            entry.value = cache[self] = await self._create(context, spec)
+            return entry.value
+        except Exception as ex:
+            entry.error = ex
+            raise
+        finally:
+            del pending[self]
+            if entry.event is not None:
+                entry.event.set()
+
+    def _has_cached_value(self, context: ResolveContext) -> bool | None:
+        """Check whether resolve() will return a cached value, None when it is not known in advance."""
+        if self._scope == DependencyScope.SINGLETON:
+            return self._singleton.value is not _MISSING
+        if self._scope == DependencyScope.REQUEST:
+            return self in get_request_cache(context.connection.scope)
+        if self._scope == DependencyScope.APP:
+            dependencies = context.connection.scope.get("state", {}).get(APP_DEPENDENCIES_KEY)
+            shared = dependencies.values.get(self) if dependencies is not None else None
+            return shared is not None and shared.value is not _MISSING
+        return False
+
+    async def _resolve_app_value(self, context: ResolveContext, spec: DependencySpec) -> typing.Any:
+        try:
+            dependencies: ApplicationDependencies = context.connection.scope["state"][APP_DEPENDENCIES_KEY]
+        except KeyError:
+            raise DependencyError(
+                f"Dependency {self._resolver!r} has APP scope, "
+                "but application dependencies are not available. Did you add `dependency_lifespan`?"
+            ) from None
+
+        shared = dependencies.values.get(self)
+        if shared is None:
+            shared = dependencies.values[self] = _SharedValue()
+        elif shared.value is not _MISSING:
+            return shared.value
+
+        # context managers are entered into the application stacks so they stay open until shutdown
+        app_context = dataclasses.replace(
+            context, sync_stack=dependencies.sync_stack, async_stack=dependencies.async_stack, transient_values=None
+        )
+        return await shared.get_or_create(functools.partial(self._create, app_context, spec))
 
-        dependencies = await _solve_dependencies(context, self._dependencies)
-        value = await self._resolve_function(dependencies)
+    async def _create(self, context: ResolveContext, spec: DependencySpec | None = None) -> typing.Any:
+        dependencies = await self._plan.execute(context)
+        return await self._create_value(context, dependencies, spec)
+
+    def _get_sync_executor(self, default: SyncExecutor | None) -> SyncExecutor | None:
+        """Return the executor for the sync factory or None if the factory is called on the event loop."""
+        executor = default if self._executor is None else self._executor
+        if self._is_async or executor == FactoryExecutor.INLINE:
+            return None
+        return executor
+
+    async def _create_value(
+        self, context: ResolveContext, dependencies: dict[str, typing.Any], spec: DependencySpec | None = None
+    ) -> typing.Any:
+        value = await self._resolve_function(context, dependencies)
+        if not self._may_return_context_manager:
+            return value
+        return await self._enter_value(context, value, spec)
+
+    async def _enter_value(self, context: ResolveContext, value: typing.Any, spec: DependencySpec | None) -> typing.Any:
+        """Enter the value into the exit stacks of the context if it is a context manager."""
+        if not isinstance(value, _CONTEXT_MANAGER_TYPES):
+            return value
         if isinstance(value, contextlib.AbstractContextManager):
-            value = context.sync_stack.enter_context(value)
-        elif isinstance(value, contextlib.AbstractAsyncContextManager):
-            value = await context.async_stack.enter_async_context(value)
-        else:
-            value = value
+            # sync context managers of offloaded factories usually block in __enter__, like the factory itself
+            executor = self._get_sync_executor(context.factory_executor)
+            if executor is not None:
+                return await _enter_context_in_executor(context, value, executor, spec)
+        if context.hooks is not None:
+            return await _enter_context_with_hooks(context, value, spec)
+        if isinstance(value, contextlib.AbstractContextManager):
+            return context.sync_stack.enter_context(value)
+        return await context.async_stack.enter_async_context(value)
 
-        if self._scope == DependencyScope.REQUEST:
-            self._set_dependency_in_request(context.connection, spec, value)
+    async def _resolve_function(self, context: ResolveContext, dependencies: dict[str, typing.Any]) -> typing.Any:
+        if self._is_async:
+            return await self._resolver(**dependencies)
 
-        if self._scope == DependencyScope.SINGLETON:
-            self._value = value
+        executor = self._get_sync_executor(context.factory_executor)
+        if executor is None:
+            if context.hooks is not None:
+                return _call_sync_with_hooks(context, self._resolver, **dependencies)
+            return self._resolver(**dependencies)
+        return await run_sync(executor, functools.partial(self._resolver, **dependencies))
 
-        return value
 
-    async def _resolve_function(self, dependencies: dict[str, typing.Any]) -> typing.Any:
-        return await self._resolver(**dependencies) if self._is_async else self._resolver(**dependencies)
+@dataclasses.dataclass(slots=True)
+class _CacheEntry:
+    shared: _SharedValue
+    expires_at: float
+    refresh_at: float
+    refreshing: bool = False
+
+
+class CachedResolver(FactoryResolver):
+    """Factory resolver that caches values by the values of the factory dependencies.
+
+    Dependencies of the factory are resolved on each call and used as the cache key, so they must be hashable.
+    Entries expire after `ttl` seconds, when the cache has more than `max_entries` entries,
+    the least recently used entry is evicted. Concurrent calls with the same key share one factory call.
 
-    def _get_dependency_from_request(self, request: HTTPConnection, spec: DependencySpec) -> typing.Any:
+    When `refresh_after` is set, values older than `refresh_after` seconds are still returned,
+    but refreshed in a background task (stale-while-revalidate). With `dependency_lifespan`, the task runs
+    in the task group of the application dependencies and is cancelled on shutdown, otherwise it is detached.
+    Only one refresh per entry runs at a time. If it fails, the stale value is kept until `ttl` expires
+    and the next refresh starts after another `refresh_after` seconds.
+
+    Values are shared between requests, so the factory should not return context managers."""
+
+    def __init__(
+        self,
+        resolver: typing.Callable[..., typing.Any],
+        *,
+        ttl: float | None = None,
+        refresh_after: float | None = None,
+        max_entries: int = 1024,
+        executor: SyncExecutor | None = None,
+    ) -> None:
+        super().__init__(resolver, executor=executor)
+        self._ttl = ttl
+        self._refresh_after = refresh_after
+        self._max_entries = max_entries
+        self._cache: collections.OrderedDict[typing.Hashable, _CacheEntry] = collections.OrderedDict()
+
+    async def resolve(self, context: ResolveContext, spec: DependencySpec) -> typing.Any:
+        dependencies = await self._plan.execute(_outliving_context(context))
+        key = tuple(dependencies.values())
+        now = time.monotonic()
         try:
-            stash = request.state.dispatch_dependencies
-            return stash.get(f"{id(self._resolver)}_{spec.param_name}")
-        except (KeyError, AttributeError):
-            return None
+            entry = self._cache.get(key)
+        except TypeError as ex:
+            message = f"Dependencies of cached factory {self._resolver!r} must be hashable: {ex}."
+            raise DependencyError(message) from ex
+
+        if entry is None or entry.expires_at <= now:
+            expires_at, refresh_at = self._get_deadlines(now)
+            entry = self._cache[key] = _CacheEntry(_SharedValue(), expires_at=expires_at, refresh_at=refresh_at)
+            if len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+
+        if entry.shared.value is _MISSING:
+            return await entry.shared.get_or_create(functools.partial(self._create_value, context, dependencies))
+
+        if entry.refresh_at <= now and not entry.refreshing:
+            entry.refreshing = True
+            refresh = functools.partial(self._refresh, entry, dependencies, context.factory_executor)
+            app_dependencies = context.connection.scope.get("state", {}).get(APP_DEPENDENCIES_KEY)
+            if app_dependencies is not None and app_dependencies.running:
+                app_dependencies.start_soon(refresh)
+            else:
+                start_detached(refresh)
+        return entry.shared.value
 
-    def _set_dependency_in_request(self, request: HTTPConnection, spec: DependencySpec, value: typing.Any) -> None:
-        stash = {}
-        with contextlib.suppress(KeyError, AttributeError):
-            stash = request.state.dispatch_dependencies
-        stash.update({f"{id(self._resolver)}_{spec.param_name}": value})
-        request.state.dispatch_dependencies = stash
+    def _get_deadlines(self, now: float) -> tuple[float, float]:
+        expires_at = math.inf if self._ttl is None else now + self._ttl
+        refresh_at = math.inf if self._refresh_after is None else now + self._refresh_after
+        return expires_at, refresh_at
+
+    async def _refresh(
+        self, entry: _CacheEntry, dependencies: dict[str, typing.Any], factory_executor: SyncExecutor | None
+    ) -> None:
+        # the request that found the stale value may be finished, the refresh does not use its context
+        try:
+            with contextlib.ExitStack() as sync_stack:
+                async with contextlib.AsyncExitStack() as async_stack:
+                    context = ResolveContext(
+                        connection=HTTPConnection({"type": "http", "state": {}}),
+                        sync_stack=sync_stack,
+                        async_stack=async_stack,
+                        static_resolvers={},
+                        factory_executor=factory_executor,
+                    )
+                    value = await self._create_value(context, dependencies)
+            entry.shared.value = value
+            entry.expires_at, entry.refresh_at = self._get_deadlines(time.monotonic())
+        except Exception:
+            logger.exception("Failed to refresh cached value of %r, keeping the stale value.", self._resolver)
+            # back off instead of starting a refresh on every request until the value expires
+            entry.refresh_at = self._get_deadlines(time.monotonic())[1]
+        finally:
+            entry.refreshing = False
+
+    def _has_cached_value(self, context: ResolveContext) -> bool | None:
+        # the cache key is known only after dependencies are resolved
+        return None
+
+    def invalidate(self, **dependencies: typing.Any) -> None:
+        """Remove the value cached for the given dependencies of the factory."""
+        key = tuple(dependencies[spec.param_name] for spec in self._dependencies)
+        self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all cached values."""
+        self._cache.clear()
 
 
 class NoDependencyResolver(DependencyResolver):
@@ -104,6 +526,10 @@ class NoDependencyResolver(DependencyResolver):
         if spec.param_type in context.static_resolvers:
             return await context.static_resolvers[spec.param_type].resolve(context, spec)
 
+        # connection objects are not registered as static resolvers to avoid creating resolvers on each request
+        if spec.param_type in _CONNECTION_TYPES and isinstance(context.connection, spec.param_type):
+            return context.connection
+
         message = (
             f'Cannot inject parameter "{spec.param_name}": '
             f'no resolver registered for type "{spec.param_type.__name__}".'
@@ -142,11 +568,66 @@ class RequestResolver(DependencyResolver):
 
     async def resolve(self, context: ResolveContext, spec: DependencySpec) -> typing.Any:
         conn: HTTPConnection = context.connection
+        if context.hooks is not None:
+            arguments = (conn, spec) if self.takes_spec else (conn,)
+            return _call_sync_with_hooks(context, self._fn, *arguments)
         if self.takes_spec:
             return self._fn(conn, spec)  # type: ignore[call-arg]
         return self._fn(conn)  # type: ignore[call-arg]
 
 
+class Lazy(typing.Generic[_T]):
+    """Handle of a dependency that is resolved when awaited.
+
+    Annotate a parameter with `Lazy[T]`, where T is a dependency annotation, to defer resolution until the view needs it.
+    The dependency is resolved at most once per request, context managers are closed with other request dependencies.
+
+    Example:
+        async def view(session: Lazy[DbSession]) -> Response:
+            ...
+            db = await session
+    """
+
+    __slots__ = ("_spec", "_context", "_shared")
+
+    def __init__(self, spec: DependencySpec, context: ResolveContext) -> None:
+        self._spec = spec
+        self._context = context
+        self._shared = _SharedValue()
+
+    @property
+    def resolved(self) -> bool:
+        return self._shared.value is not _MISSING
+
+    async def get(self) -> _T:
+        if self._shared.value is not _MISSING:
+            return typing.cast(_T, self._shared.value)
+        return typing.cast(_T, await self._shared.get_or_create(self._resolve))
+
+    async def _resolve(self) -> typing.Any:
+        if self._context.hooks is not None:
+            resolve = functools.partial(self._spec.resolve, self._context)
+            value = await _call_with_hooks(self._context, self._spec, self._spec.resolver, resolve)
+        else:
+            value = await self._spec.resolve(self._context)
+        if value is None and not self._spec.optional:
+            raise _none_value_error(self._spec)
+        return value
+
+    def __await__(self) -> typing.Generator[typing.Any, None, _T]:
+        return self.get().__await__()
+
+
+class LazyResolver(DependencyResolver):
+    """Resolver that injects a `Lazy` handle of the wrapped dependency."""
+
+    def __init__(self, spec: DependencySpec) -> None:
+        self.spec = spec
+
+    async def resolve(self, context: ResolveContext, spec: DependencySpec) -> typing.Any:
+        return Lazy(self.spec, context)
+
+
 @dataclasses.dataclass(slots=True)
 class DependencySpec:
     param_name: str
@@ -161,12 +642,48 @@ class DependencySpec:
         return await self.resolver.resolve(context, self)
 
 
+@dataclasses.dataclass(slots=True, frozen=True)
+class _ParsedAnnotation:
+    param_type: typing.Any
+    optional: bool
+    resolver: DependencyResolver
+    resolver_options: tuple[typing.Any, ...] = ()
+
+
+_NO_DEPENDENCY_RESOLVER = NoDependencyResolver()
+
+# parsed annotations by annotation identity, the annotation is kept alive so its id is not reused
+_parsed_annotations: dict[int, tuple[typing.Any, _ParsedAnnotation]] = {}
+
+
 def create_dependency_from_parameter(parameter: inspect.Parameter) -> DependencySpec:
+    # annotation aliases are usually shared by many views, parse each of them once,
+    # so parameters with the same annotation share the resolver
+    if cached := _parsed_annotations.get(id(parameter.annotation)):
+        parsed = cached[1]
+    else:
+        parsed = _parse_annotation(parameter)
+        # lazy resolvers keep the spec of the parameter
+        if not isinstance(parsed.resolver, LazyResolver):
+            _parsed_annotations[id(parameter.annotation)] = (parameter.annotation, parsed)
+
+    return DependencySpec(
+        resolver=parsed.resolver,
+        optional=parsed.optional,
+        param_type=parsed.param_type,
+        default=parameter.default,
+        param_name=parameter.name,
+        annotation=parameter.annotation,
+        resolver_options=list(parsed.resolver_options),
+    )
+
+
+def _parse_annotation(parameter: inspect.Parameter) -> _ParsedAnnotation:
     origin = typing.get_origin(parameter.annotation)
     is_optional = False
     annotation: type = parameter.annotation
 
-    resolver: DependencyResolver = NoDependencyResolver()
+    resolver: DependencyResolver = _NO_DEPENDENCY_RESOLVER
     resolver_options: list[typing.Any] = []
 
     # if param is union then extract first non None argument from type
@@ -175,20 +692,18 @@ def create_dependency_from_parameter(parameter: inspect.Parameter) -> Dependency
         annotation = [arg for arg in typing.get_args(parameter.annotation) if arg is not None][0]
         origin = typing.get_origin(annotation)
 
+    # deferred dependencies like: Lazy[typing.Annotated[T, func]]
+    if origin is Lazy:
+        (inner_annotation,) = typing.get_args(annotation)
+        inner_spec = create_dependency_from_parameter(parameter.replace(annotation=inner_annotation))
+        return _ParsedAnnotation(param_type=Lazy, optional=is_optional, resolver=LazyResolver(inner_spec))
+
     # resolve annotated dependencies like: typing.Annotated[T, func]
     param_type = annotation
     if origin is not typing.Annotated:
         # unannotated parameters are allowed, but they will raise an error during resolution
         # the NoDependencyResolver will try to look up the overridden type in the prepared dependencies
-        return DependencySpec(
-            optional=is_optional,
-            param_type=param_type,
-            default=parameter.default,
-            param_name=parameter.name,
-            resolver=NoDependencyResolver(),
-            annotation=parameter.annotation,
-            resolver_options=resolver_options,
-        )
+        return _ParsedAnnotation(param_type=param_type, optional=is_optional, resolver=_NO_DEPENDENCY_RESOLVER)
 
     match typing.get_args(annotation):
         case (defined_param_type, *options, DependencyResolver() as defined_resolver):
@@ -201,18 +716,8 @@ def create_dependency_from_parameter(parameter: inspect.Parameter) -> Dependency
             signature = inspect.signature(fn)
             if len(signature.parameters) == 0:
                 resolver = FactoryResolver(fn)
-            elif len(signature.parameters) == 1:
-
-                def callback(request: HTTPConnection, spec: DependencySpec) -> typing.Any:
-                    return fn(request)
-
-                resolver = RequestResolver(callback)
-            elif len(signature.parameters) == 2:
-
-                def callback(request: HTTPConnection, spec: DependencySpec) -> typing.Any:
-                    return fn(request, spec)
-
-                resolver = RequestResolver(callback)
+            elif len(signature.parameters) in (1, 2):
+                resolver = RequestResolver(fn)
             else:
                 raise DependencyError(
                     "Lamda passed as dependency should accept only zero, one, or two parameters: "
@@ -240,14 +745,11 @@ def create_dependency_from_parameter(parameter: inspect.Parameter) -> Dependency
         case _:  # pragma: no cover, we never reach this line
             ...
 
-    return DependencySpec(
-        resolver=resolver,
-        optional=is_optional,
+    return _ParsedAnnotation(
         param_type=param_type,
-        default=parameter.default,
-        param_name=parameter.name,
-        annotation=parameter.annotation,
-        resolver_options=resolver_options,
+        optional=is_optional,
+        resolver=resolver,
+        resolver_options=tuple(resolver_options),
     )
 
 
@@ -256,30 +758,688 @@ def create_dependency_specs(fn: typing.Callable[..., typing.Any]) -> list[Depend
     return [create_dependency_from_parameter(parameter) for parameter in signature.parameters.values()]
 
 
-async def _solve_dependencies(context: ResolveContext, dependencies: list[DependencySpec]) -> dict[str, typing.Any]:
-    solved_dependencies: dict[str, typing.Any] = {}
-    for spec in dependencies:
-        dependency = await spec.resolve(context)
-        if dependency is None and not spec.optional:
-            message = f'Dependency "{spec.param_name}" has None value but it is not optional.'
-            raise DependencyRequiresValueError(message)
-        solved_dependencies[spec.param_name] = dependency
+_CONTEXT_MANAGER_TYPES = (contextlib.AbstractContextManager, contextlib.AbstractAsyncContextManager)
+_CONNECTION_TYPES = (HTTPConnection, Request, WebSocket)
+_PREDEFINED_TYPES = (*_CONNECTION_TYPES, DependencySpec)
+_VALUE_TYPES = frozenset({str, bytes, bytearray, int, float, complex, tuple, list, dict, set, frozenset})
+_TPFLAGS_BASETYPE = 1 << 10
+
+
+def _may_return_context_manager(fn: typing.Callable[..., typing.Any]) -> bool:
+    """Guess from the return annotation whether the factory can return a context manager.
+    Decorated and unannotated factories are assumed to return context managers."""
+    if inspect.isclass(fn):
+        return issubclass(fn, _CONTEXT_MANAGER_TYPES)
+
+    if hasattr(fn, "__wrapped__"):
+        return True
+
+    # the signature is already evaluated by create_dependency_specs, so it does not fail here
+    return _is_context_manager_type(inspect.signature(fn, eval_str=True).return_annotation)
+
+
+def _is_context_manager_type(return_type: typing.Any) -> bool:
+    if return_type is None:
+        return False
+
+    origin = typing.get_origin(return_type) or return_type
+    if origin is typing.Union or origin is types.UnionType:
+        return any(_is_context_manager_type(arg) for arg in typing.get_args(return_type))
+
+    if not inspect.isclass(origin) or origin is inspect.Signature.empty:  # TypeVars, Literal, strings
+        return True
+
+    # typing.Any, object, protocols and other base classes may be annotated for context manager subclasses
+    return issubclass(origin, _CONTEXT_MANAGER_TYPES) or not _is_final_class(origin)
+
+
+def _is_final_class(cls: type) -> bool:
+    """Whether the value of the annotated class cannot be a context manager subclass.
+    Builtin value types count as final, context managers derived from them are not supported."""
+    if getattr(cls, "__final__", False) or not cls.__flags__ & _TPFLAGS_BASETYPE:
+        return True
+    return cls in _VALUE_TYPES
+
+
+def _compile_plan(plan: ResolutionPlan) -> typing.Callable[[ResolveContext], typing.Awaitable[dict[str, typing.Any]]]:
+    """Generate a function that resolves the plan.
+
+    Transient factories are called directly with positional arguments, variables are inlined as constants,
+    and request resolvers receive the connection directly.
+    Steps of other resolvers (including custom ones) fall back to `resolver.resolve(context, spec)`."""
+    namespace: dict[str, typing.Any] = {
+        "_AbstractContextManager": contextlib.AbstractContextManager,
+        "_AbstractAsyncContextManager": contextlib.AbstractAsyncContextManager,
+        "_none_value_error": _none_value_error,
+        "_run_sync": run_sync,
+        "_enter_in_executor": _enter_context_in_executor,
+        "_partial": functools.partial,
+    }
+    lines = ["    connection = context.connection"]
+    for index, step in enumerate(plan.steps):
+        spec, resolver, value = step.spec, step.spec.resolver, f"v{index}"
+        namespace[f"s{index}"] = spec
+        if step.factory is not None:
+            namespace[f"f{index}"] = step.factory._resolver
+            parameters = inspect.signature(step.factory._resolver).parameters
+            arguments = ", ".join(
+                f"v{slot}"
+                if parameters[param_name].kind
+                in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+                else f"{param_name}=v{slot}"
+                for param_name, slot in step.arguments
+            )
+            executor = step.factory._get_sync_executor(plan.factory_executor)
+            if executor is not None:
+                namespace[f"x{index}"] = executor
+                lines.append(f"    {value} = await _run_sync(x{index}, _partial(f{index}, {arguments}))")
+            else:
+                await_ = "await " if step.factory._is_async else ""
+                lines.append(f"    {value} = {await_}f{index}({arguments})")
+            if step.factory._may_return_context_manager:
+                lines.append(f"    if isinstance({value}, _AbstractContextManager):")
+                if executor is not None:
+                    namespace[f"s{index}"] = spec
+                    lines.append(f"        {value} = await _enter_in_executor(context, {value}, x{index}, s{index})")
+                else:
+                    lines.append(f"        {value} = context.sync_stack.enter_context({value})")
+                lines.append(f"    elif isinstance({value}, _AbstractAsyncContextManager):")
+                lines.append(f"        {value} = await context.async_stack.enter_async_context({value})")
+        elif type(resolver) is VariableResolver:
+            namespace[f"c{index}"] = resolver._value
+            lines.append(f"    {value} = c{index}")
+        elif type(resolver) is RequestResolver:
+            namespace[f"f{index}"] = resolver._fn
+            arguments = f"connection, s{index}" if resolver.takes_spec else "connection"
+            lines.append(f"    {value} = f{index}({arguments})")
+        elif type(resolver) is NoDependencyResolver and spec.param_type is DependencySpec:
+            lines.append(f"    {value} = s{index}")
+        else:
+            namespace[f"r{index}"] = resolver.resolve
+            lines.append(f"    {value} = await r{index}(context, s{index})")
+
+        is_constant = type(resolver) is VariableResolver and resolver._value is not None
+        if not spec.optional and not is_constant:
+            lines.append(f"    if {value} is None:")
+            lines.append(f"        raise _none_value_error(s{index})")
+
+    outputs = ", ".join(f"{param_name!r}: v{index}" for param_name, index in plan.outputs)
+    lines.append(f"    return {{{outputs}}}")
+
+    # constants are passed as arguments of the outer function so the generated code reads them from closure cells
+    source = "\n".join(
+        [
+            f"def make_resolver({', '.join(namespace)}):",
+            "  async def resolve_plan(context):",
+            *("  " + line for line in lines),
+            "  return resolve_plan",
+        ]
+    )
+    filename = f"<starlette_dispatch compiled plan {id(plan):#x}>"
+    linecache.cache[filename] = (len(source), None, source.splitlines(keepends=True), filename)
+    scope: dict[str, typing.Any] = {}
+    exec(compile(source, filename, "exec"), scope)
+    return typing.cast(
+        typing.Callable[[ResolveContext], typing.Awaitable[dict[str, typing.Any]]],
+        scope["make_resolver"](**namespace),
+    )
+
+
+def _none_value_error(spec: DependencySpec) -> DependencyRequiresValueError:
+    message = f'Dependency "{spec.param_name}" has None value but it is not optional.'
+    return DependencyRequiresValueError(message)
+
+
+def _requires_exit_stacks(spec: DependencySpec) -> bool:
+    """Check whether resolving the spec can enter a context manager into the exit stacks of the context."""
+    resolver = spec.resolver
+    if isinstance(resolver, (VariableResolver, RequestResolver)):
+        return False
+    if isinstance(resolver, FactoryResolver):
+        return resolver.requires_exit_stacks
+    if isinstance(resolver, LazyResolver):
+        return _requires_exit_stacks(resolver.spec)
+    if isinstance(resolver, NoDependencyResolver):
+        return spec.param_type not in _PREDEFINED_TYPES
+    return True
+
 
-    return solved_dependencies
+@dataclasses.dataclass(slots=True, frozen=True)
+class ResolveEvent:
+    """Describes a finished resolver call.
+
+    `elapsed` of scoped factories includes resolution of their dependencies,
+    `cache_hit` is None when the resolver cannot tell in advance whether the value is cached."""
+
+    spec: DependencySpec
+    resolver: DependencyResolver
+    scope: DependencyScope | None
+    cache_hit: bool | None
+    elapsed: float
+    error: Exception | None = None
+
+
+class ResolutionHooks:
+    """Callbacks fired around resolver calls. Override the methods you need.
+
+    `sync_called` reports how long a sync factory, request resolver callback or `__enter__`/`__exit__`
+    of a sync context manager blocked the event loop. For context managers, `fn` is the bound method.
+    Hooks are called synchronously on the request path, so they should be fast.
+    Plans with hooks are never compiled."""
+
+    def before_resolve(self, context: ResolveContext, spec: DependencySpec) -> None: ...
+
+    def after_resolve(self, context: ResolveContext, event: ResolveEvent) -> None: ...
+
+    def context_entered(self, context: ResolveContext, spec: DependencySpec | None, elapsed: float) -> None: ...
+
+    def context_exited(self, context: ResolveContext, spec: DependencySpec | None, elapsed: float) -> None: ...
+
+    def sync_called(self, context: ResolveContext, fn: typing.Callable[..., typing.Any], elapsed: float) -> None: ...
+
+
+def _call_sync_with_hooks(
+    context: ResolveContext, fn: typing.Callable[..., typing.Any], *args: typing.Any, **kwargs: typing.Any
+) -> typing.Any:
+    hooks = typing.cast(ResolutionHooks, context.hooks)
+    started_at = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        hooks.sync_called(context, fn, time.perf_counter() - started_at)
+
+
+async def _call_with_hooks(
+    context: ResolveContext,
+    spec: DependencySpec,
+    resolver: DependencyResolver,
+    resolve: typing.Callable[[], typing.Awaitable[typing.Any]],
+) -> typing.Any:
+    hooks = typing.cast(ResolutionHooks, context.hooks)
+    scope: DependencyScope | None = None
+    cache_hit: bool | None = False
+    if isinstance(resolver, FactoryResolver):
+        scope, cache_hit = resolver._scope, resolver._has_cached_value(context)
+
+    hooks.before_resolve(context, spec)
+    started_at = time.perf_counter()
+    try:
+        value = await resolve()
+    except Exception as ex:
+        elapsed = time.perf_counter() - started_at
+        hooks.after_resolve(context, ResolveEvent(spec, resolver, scope, cache_hit, elapsed, ex))
+        raise
+    elapsed = time.perf_counter() - started_at
+    hooks.after_resolve(context, ResolveEvent(spec, resolver, scope, cache_hit, elapsed))
+    return value
+
+
+async def _enter_context_with_hooks(
+    context: ResolveContext, value: typing.Any, spec: DependencySpec | None
+) -> typing.Any:
+    hooks = typing.cast(ResolutionHooks, context.hooks)
+    cls = type(value)
+    started_at = time.perf_counter()
+    # the exit is registered only after a successful enter, like ExitStack.enter_context does
+    if isinstance(value, contextlib.AbstractContextManager):
+        entered = cls.__enter__(value)
+        hooks.sync_called(context, value.__enter__, time.perf_counter() - started_at)
+        sync_exit: typing.Callable[..., bool | None] = cls.__exit__
+
+        def exit_with_hooks(*exc_details: typing.Any) -> bool | None:
+            exit_started_at = time.perf_counter()
+            try:
+                return sync_exit(value, *exc_details)
+            finally:
+                elapsed = time.perf_counter() - exit_started_at
+                hooks.context_exited(context, spec, elapsed)
+                hooks.sync_called(context, value.__exit__, elapsed)
+
+        context.sync_stack.push(exit_with_hooks)
+    else:
+        entered = await cls.__aenter__(value)
+        async_exit: typing.Callable[..., typing.Awaitable[bool | None]] = cls.__aexit__
+
+        async def async_exit_with_hooks(*exc_details: typing.Any) -> bool | None:
+            exit_started_at = time.perf_counter()
+            try:
+                return await async_exit(value, *exc_details)
+            finally:
+                hooks.context_exited(context, spec, time.perf_counter() - exit_started_at)
+
+        context.async_stack.push_async_exit(async_exit_with_hooks)
+    hooks.context_entered(context, spec, time.perf_counter() - started_at)
+    return entered
+
+
+async def _enter_context_in_executor(
+    context: ResolveContext,
+    value: contextlib.AbstractContextManager[typing.Any],
+    executor: SyncExecutor,
+    spec: DependencySpec | None,
+) -> typing.Any:
+    """Enter a sync context manager in the executor, it exits in the executor too, when the async stack closes."""
+    hooks = context.hooks
+    cls = type(value)
+    started_at = time.perf_counter()
+    entered = await run_sync(executor, functools.partial(cls.__enter__, value))
+    sync_exit: typing.Callable[..., bool | None] = cls.__exit__
+
+    async def exit_in_executor(*exc_details: typing.Any) -> bool | None:
+        exit_started_at = time.perf_counter()
+        try:
+            return typing.cast(bool | None, await run_sync(executor, functools.partial(sync_exit, value, *exc_details)))
+        finally:
+            if hooks is not None:
+                hooks.context_exited(context, spec, time.perf_counter() - exit_started_at)
+
+    context.async_stack.push_async_exit(exit_in_executor)
+    if hooks is not None:
+        hooks.context_entered(context, spec, time.perf_counter() - started_at)
+    return entered
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class PlanStep:
+    """A single resolver call of a resolution plan.
+
+    Steps of transient factories receive values of the previous steps as arguments,
+    all other steps are resolved by their resolver.
+
+    Concurrent plans run `is_async` steps in tasks. Context managers must be entered and exited in the same task,
+    so steps that enter them while resolving are not async. Context managers returned by transient factories
+    are entered by the parent task after the wave."""
+
+    spec: DependencySpec
+    factory: FactoryResolver | None = None
+    arguments: tuple[tuple[str, int], ...] = ()
+    is_async: bool = False
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class ResolutionPlan:
+    """Dependency tree flattened into a topologically ordered list of steps.
+
+    Each step writes its value into the slot with the same index,
+    so a step can only depend on the steps listed before it.
+    Scoped factories are not inlined because their sub-dependencies must not be resolved on cache hits.
+
+    Concurrent plans group steps into waves of independent steps.
+    Async factories of the same wave run at the same time, all other steps are resolved inline.
+
+    Compiled plans generate a specialized function that runs the steps without generic dispatch.
+    Use `executor` to run the plan, it is either the compiled function or `execute`.
+
+    Deduplicated plans share one step between all usages of the same transient factory, and share transient values
+    with nested resolutions of REQUEST scoped factories through `ResolveContext.transient_values`,
+    so the factory is called once per resolution.
+
+    `route_path` is the path template of the route that owns the plan, hooks read it from the context."""
+
+    steps: tuple[PlanStep, ...]
+    outputs: tuple[tuple[str, int], ...]
+    concurrent: bool = False
+    waves: tuple[tuple[int, ...], ...] = ()
+    requires_exit_stacks: bool = True
+    compiled: bool = False
+    factory_executor: SyncExecutor | None = None
+    hooks: ResolutionHooks | None = None
+    route_path: str | None = None
+    deduplicate: bool = False
+    executor: typing.Callable[[ResolveContext], typing.Awaitable[dict[str, typing.Any]]] = dataclasses.field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        # concurrent, instrumented and deduplicated plans are not compiled, they are executed by the interpreter
+        compiled = self.compiled and not self.concurrent and self.hooks is None and not self.deduplicate
+        object.__setattr__(self, "compiled", compiled)
+        object.__setattr__(self, "executor", _compile_plan(self) if compiled else self.execute)
+
+    @classmethod
+    def build(
+        cls,
+        dependencies: typing.Sequence[DependencySpec],
+        *,
+        concurrent: bool = False,
+        compiled: bool = False,
+        factory_executor: SyncExecutor | None = None,
+        hooks: ResolutionHooks | None = None,
+        deduplicate: bool = False,
+        route_path: str | None = None,
+    ) -> ResolutionPlan:
+        steps: list[PlanStep] = []
+        levels: list[int] = []
+        # slots of shared factory steps, optional and required usages differ in the None check
+        shared_steps: dict[tuple[FactoryResolver, bool], int] = {}
+
+        def visit(spec: DependencySpec) -> int:
+            resolver = spec.resolver
+            if isinstance(resolver, FactoryResolver) and resolver._is_inlinable:
+                shared_key = (resolver, spec.optional)
+                if shared_key in shared_steps:
+                    return shared_steps[shared_key]
+
+                arguments = tuple((dependency.param_name, visit(dependency)) for dependency in resolver._dependencies)
+                is_async = resolver._is_async or resolver._get_sync_executor(factory_executor) is not None
+                # shared values of deduplicated plans are entered when they are created
+                is_async = is_async and not (deduplicate and resolver._may_return_context_manager)
+                steps.append(PlanStep(spec=spec, factory=resolver, arguments=arguments, is_async=is_async))
+                levels.append(1 + max((levels[index] for _, index in arguments), default=-1))
+                if deduplicate:
+                    shared_steps[shared_key] = len(steps) - 1
+            else:
+                is_async = (
+                    isinstance(resolver, FactoryResolver)
+                    and (resolver._is_async or resolver._get_sync_executor(factory_executor) is not None)
+                    and not resolver.requires_exit_stacks
+                )
+                steps.append(PlanStep(spec=spec, is_async=is_async))
+                levels.append(0)
+            return len(steps) - 1
+
+        outputs = tuple((spec.param_name, visit(spec)) for spec in dependencies)
+        waves: tuple[tuple[int, ...], ...] = ()
+        if concurrent:
+            waves = tuple(
+                tuple(index for index, step_level in enumerate(levels) if step_level == level)
+                for level in range(max(levels, default=-1) + 1)
+            )
+        return cls(
+            steps=tuple(steps),
+            outputs=outputs,
+            concurrent=concurrent,
+            waves=waves,
+            requires_exit_stacks=any(_requires_exit_stacks(step.spec) for step in steps),
+            compiled=compiled,
+            factory_executor=factory_executor,
+            hooks=hooks,
+            route_path=route_path,
+            deduplicate=deduplicate,
+        )
+
+    async def execute(self, context: ResolveContext) -> dict[str, typing.Any]:
+        if self.concurrent:
+            return await self._execute_concurrently(context)
+
+        # hooks are checked once per plan, so uninstrumented resolution does not pay for them
+        resolve_step = self._resolve_step if context.hooks is None else self._resolve_step_with_hooks
+        values: list[typing.Any] = []
+        for step in self.steps:
+            values.append(await resolve_step(context, step, values))
+
+        return {param_name: values[index] for param_name, index in self.outputs}
+
+    async def _execute_concurrently(self, context: ResolveContext) -> dict[str, typing.Any]:
+        resolve_step = self._resolve_step if context.hooks is None else self._resolve_step_with_hooks
+        values: list[typing.Any] = [None] * len(self.steps)
+        for wave in self.waves:
+            concurrent_steps: list[int] = []
+            for index in wave:
+                step = self.steps[index]
+                if step.is_async:
+                    concurrent_steps.append(index)
+                else:
+                    values[index] = await resolve_step(context, step, values)
+
+            if len(concurrent_steps) == 1:
+                index = concurrent_steps[0]
+                values[index] = await resolve_step(context, self.steps[index], values)
+            elif concurrent_steps:
+                await self._resolve_steps_concurrently(context, concurrent_steps, values)
+
+        return {param_name: values[index] for param_name, index in self.outputs}
+
+    async def _resolve_steps_concurrently(
+        self, context: ResolveContext, indexes: list[int], values: list[typing.Any]
+    ) -> None:
+        errors: list[Exception | None] = [None] * len(indexes)
+        resolve_step = self._resolve_step if context.hooks is None else self._resolve_step_with_hooks
+
+        async def run(position: int, index: int) -> None:
+            step = self.steps[index]
+            try:
+                if step.factory is not None and step.factory._may_return_context_manager:
+                    values[index] = await self._call_step_factory(context, step, values)
+                else:
+                    values[index] = await resolve_step(context, step, values)
+            except Exception as ex:
+                errors[position] = ex
+
+        async with anyio.create_task_group() as task_group:
+            for position, index in enumerate(indexes):
+                task_group.start_soon(run, position, index)
+
+        # context managers are entered in plan order, so the teardown order does not depend on task completion,
+        # and values of failed waves are entered too, so they are closed with the others
+        for position, index in enumerate(indexes):
+            step = self.steps[index]
+            if errors[position] is None and step.factory is not None and step.factory._may_return_context_manager:
+                try:
+                    values[index] = await step.factory._enter_value(context, values[index], step.spec)
+                    if values[index] is None and not step.spec.optional:
+                        raise _none_value_error(step.spec)
+                except Exception as ex:
+                    errors[position] = ex
+
+        for error in errors:
+            if error is not None:
+                raise error
+
+    async def _call_step_factory(self, context: ResolveContext, step: PlanStep, values: list[typing.Any]) -> typing.Any:
+        """Call the factory of the step without entering the returned context manager."""
+        factory = typing.cast(FactoryResolver, step.factory)
+        dependencies = {param_name: values[index] for param_name, index in step.arguments}
+        if context.hooks is None:
+            return await factory._resolve_function(context, dependencies)
+        resolve = functools.partial(factory._resolve_function, context, dependencies)
+        return await _call_with_hooks(context, step.spec, factory, resolve)
+
+    async def _resolve_step(self, context: ResolveContext, step: PlanStep, values: list[typing.Any]) -> typing.Any:
+        if step.factory is None:
+            value = await step.spec.resolver.resolve(context, step.spec)
+        else:
+            dependencies = {param_name: values[index] for param_name, index in step.arguments}
+            if context.transient_values is None:
+                value = await step.factory._create_value(context, dependencies, step.spec)
+            else:
+                create = functools.partial(step.factory._create_value, context, dependencies, step.spec)
+                value = await step.factory._create_shared(context, create)
+
+        if value is None and not step.spec.optional:
+            raise _none_value_error(step.spec)
+        return value
+
+    async def _resolve_step_with_hooks(
+        self, context: ResolveContext, step: PlanStep, values: list[typing.Any]
+    ) -> typing.Any:
+        resolver = step.spec.resolver if step.factory is None else step.factory
+        resolve = functools.partial(self._resolve_step, context, step, values)
+        return await _call_with_hooks(context, step.spec, resolver, resolve)
 
 
 @contextlib.asynccontextmanager
 async def resolve_dependencies(
     connection: HTTPConnection,
-    dependencies: list[DependencySpec],
+    dependencies: list[DependencySpec] | ResolutionPlan,
     static_resolvers: dict[typing.Any, DependencyResolver] | None = None,
+    *,
+    hooks: ResolutionHooks | None = None,
 ) -> typing.AsyncGenerator[dict[str, typing.Any], None]:
+    """Resolve dependencies and close context-managed dependencies on exit.
+    `hooks` replace hooks of the plan for this call."""
+    plan = dependencies if isinstance(dependencies, ResolutionPlan) else ResolutionPlan.build(dependencies)
+    if not plan.requires_exit_stacks:
+        yield await solve_dependencies(connection, plan, static_resolvers, hooks=hooks)
+        return
+
     context = ResolveContext(
         connection=connection,
         sync_stack=contextlib.ExitStack(),
         async_stack=contextlib.AsyncExitStack(),
         static_resolvers=static_resolvers or {},
+        factory_executor=plan.factory_executor,
+        hooks=plan.hooks if hooks is None else hooks,
+        route_path=plan.route_path,
+        transient_values={} if plan.deduplicate else None,
     )
+    # compiled executors do not call hooks
+    executor = plan.executor if hooks is None else plan.execute
     with context.sync_stack:
         async with context.async_stack:
-            yield await _solve_dependencies(context, dependencies)
+            yield await executor(context)
+
+
+# plans without context-managed dependencies never enter anything into these stacks,
+# so they are shared by all contexts created by solve_dependencies
+_UNUSED_SYNC_STACK = contextlib.ExitStack()
+_UNUSED_ASYNC_STACK = contextlib.AsyncExitStack()
+
+
+async def solve_dependencies(
+    connection: HTTPConnection,
+    plan: ResolutionPlan,
+    static_resolvers: dict[typing.Any, DependencyResolver] | None = None,
+    *,
+    hooks: ResolutionHooks | None = None,
+) -> dict[str, typing.Any]:
+    """Resolve dependencies of a plan that has no context-managed dependencies.
+    Unlike resolve_dependencies, this does not allocate exit stacks."""
+    if plan.requires_exit_stacks:
+        raise ValueError("The plan has context-managed dependencies, use resolve_dependencies().")
+    context = ResolveContext(
+        connection=connection,
+        sync_stack=_UNUSED_SYNC_STACK,
+        async_stack=_UNUSED_ASYNC_STACK,
+        static_resolvers=static_resolvers or {},
+        factory_executor=plan.factory_executor,
+        hooks=plan.hooks if hooks is None else hooks,
+        route_path=plan.route_path,
+        transient_values={} if plan.deduplicate else None,
+    )
+    executor = plan.executor if hooks is None else plan.execute
+    return await executor(context)
+
+
+_detached_tasks: set[asyncio.Task[None]] = set()
+
+
+def start_detached(fn: typing.Callable[[], typing.Coroutine[typing.Any, typing.Any, None]]) -> None:
+    """Run `fn` in background outside of any task group, on asyncio or trio.
+    Asyncio tasks are referenced until they finish, so they are not garbage collected while running."""
+    if sniffio.current_async_library() == "trio":
+        importlib.import_module("trio.lowlevel").spawn_system_task(fn)
+        return
+
+    task = asyncio.get_running_loop().create_task(fn())
+    _detached_tasks.add(task)
+    task.add_done_callback(_detached_tasks.discard)
+
+
+async def run_sync(executor: SyncExecutor, fn: typing.Callable[[], typing.Any]) -> typing.Any:
+    """Call a sync function in the executor without blocking the event loop.
+    Custom executors require asyncio event loop."""
+    if executor == FactoryExecutor.THREADPOOL:
+        return await anyio.to_thread.run_sync(fn)
+
+    executor = typing.cast(concurrent.futures.Executor, executor)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, contextvars.copy_context().run, fn)
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class WarmUpResult:
+    """Outcome of creating a factory value during warm-up."""
+
+    spec: DependencySpec
+    resolver: FactoryResolver
+    elapsed: float
+    error: Exception | None = None
+
+
+def iter_route_dependencies(routes: typing.Iterable[typing.Any]) -> typing.Iterator[DependencySpec]:
+    """Yield dependency specs of routes that have a resolution plan, including routes of mounts."""
+    for route in routes:
+        if isinstance(plan := getattr(route, "plan", None), ResolutionPlan):
+            yield from (step.spec for step in plan.steps)
+        yield from iter_route_dependencies(getattr(route, "routes", None) or [])
+
+
+def _is_request_independent(spec: DependencySpec) -> bool:
+    """Check whether the spec can be resolved without a connection."""
+    resolver = spec.resolver
+    if isinstance(resolver, VariableResolver):
+        return True
+    if isinstance(resolver, FactoryResolver):
+        return all(_is_request_independent(dependency) for dependency in resolver._dependencies)
+    if isinstance(resolver, LazyResolver):
+        return _is_request_independent(resolver.spec)
+    if isinstance(resolver, NoDependencyResolver):
+        return spec.param_type == DependencySpec
+    return False
+
+
+def _collect_warm_up_specs(
+    specs: typing.Iterable[DependencySpec], scopes: set[DependencyScope]
+) -> list[tuple[FactoryResolver, DependencySpec]]:
+    collected: dict[FactoryResolver, DependencySpec] = {}
+
+    def visit(spec: DependencySpec) -> None:
+        resolver = spec.resolver
+        if isinstance(resolver, LazyResolver):
+            visit(resolver.spec)
+        if not isinstance(resolver, FactoryResolver) or resolver in collected:
+            return
+
+        # dependencies first, so their creation time is not attributed to the dependent factory
+        for dependency in resolver._dependencies:
+            visit(dependency)
+        if resolver._scope in scopes and _is_request_independent(spec) and not _is_closed_after_creation(resolver):
+            collected[resolver] = spec
+
+    for spec in specs:
+        visit(spec)
+    return [(resolver, spec) for resolver, spec in collected.items()]
+
+
+def _is_closed_after_creation(resolver: FactoryResolver) -> bool:
+    """SINGLETON values that are (or depend on) context managers are closed with the stacks of the creating context,
+    warm-up must not hand out such values to requests."""
+    return resolver._scope == DependencyScope.SINGLETON and resolver.requires_exit_stacks
+
+
+async def warm_up_dependencies(
+    specs: typing.Iterable[DependencySpec], *, app_dependencies: ApplicationDependencies | None = None
+) -> list[WarmUpResult]:
+    """Create values of SINGLETON scoped factories, and APP scoped factories when `app_dependencies` is given,
+    so the first requests do not pay for their initialization.
+
+    Factories that depend on the connection or on application resolvers are skipped, and so are SINGLETON factories
+    that may return context managers, because their values would be closed at the end of warm-up.
+    Errors are logged and returned in results, failed factories are created again on the first request."""
+    scopes = {DependencyScope.SINGLETON}
+    state: dict[str, typing.Any] = {}
+    if app_dependencies is not None:
+        scopes.add(DependencyScope.APP)
+        state[APP_DEPENDENCIES_KEY] = app_dependencies
+
+    results: list[WarmUpResult] = []
+    connection = HTTPConnection({"type": "http", "state": state})
+    # APP scoped context managers are entered into the application stacks, nothing else should be entered here
+    with contextlib.ExitStack() as sync_stack:
+        async with contextlib.AsyncExitStack() as async_stack:
+            context = ResolveContext(
+                connection=connection, sync_stack=sync_stack, async_stack=async_stack, static_resolvers={}
+            )
+            for resolver, spec in _collect_warm_up_specs(specs, scopes):
+                started_at = time.perf_counter()
+                error: Exception | None = None
+                try:
+                    await resolver.resolve(context, spec)
+                except Exception as ex:
+                    error = ex
+                    logger.exception("Failed to warm up dependency %r.", resolver._resolver)
+                elapsed = time.perf_counter() - started_at
+                logger.debug("Warmed up dependency %r in %.6fs.", resolver._resolver, elapsed)
+                results.append(WarmUpResult(spec=spec, resolver=resolver, elapsed=elapsed, error=error))
+    return results
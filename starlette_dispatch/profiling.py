@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import cProfile
+import os
+import pstats
+import random
+import re
+import secrets
+import time
+import typing
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+_INVALID_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RequestProfiler:
+    """Profiles single requests with cProfile: dependency resolution, the view and teardown.
+
+    A request is profiled when it sends `header` with the `secret` value, or by `sample_rate`.
+    The profile is written to `directory` as a `.prof` file (open it with pstats or snakeviz)
+    and its name is returned in the `X-Profile` response header. With `summary=True`,
+    the `X-Profile-Summary` header lists the `summary_size` functions with the highest cumulative time.
+
+    cProfile records everything that runs on the event loop thread while the request is profiled,
+    including other requests, and does not see sync views that run in the threadpool.
+    Only one request is profiled at a time."""
+
+    def __init__(
+        self,
+        *,
+        directory: str | os.PathLike[str] | None = None,
+        summary: bool = False,
+        summary_size: int = 10,
+        secret: str | None = None,
+        header: str = "x-profile",
+        sample_rate: float = 0.0,
+    ) -> None:
+        if directory is None and not summary:
+            raise ValueError("Set directory or summary, otherwise profiles are discarded.")
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1.")
+        self.directory = directory
+        self.summary = summary
+        self.summary_size = summary_size
+        self.secret = secret
+        self.header = header
+        self.sample_rate = sample_rate
+        self._active = False
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def should_profile(self, request: Request) -> bool:
+        if self.secret is not None:
+            value = request.headers.get(self.header)
+            if value is not None and secrets.compare_digest(value.encode(), self.secret.encode()):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def profile(self, request: Request, call: typing.Callable[[Request], typing.Awaitable[Response]]) -> Response:
+        """Call the endpoint under the profiler, requests are not profiled while another one is."""
+        if self._active:
+            return await call(request)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is active
+            return await call(request)
+
+        self._active = True
+        try:
+            response = await call(request)
+        finally:
+            profile.disable()
+            self._active = False
+
+        if self.directory is not None:
+            filename = self._make_filename(request)
+            await run_in_threadpool(profile.dump_stats, os.path.join(self.directory, filename))
+            response.headers["x-profile"] = filename
+        if self.summary:
+            response.headers["x-profile-summary"] = self.render_summary(pstats.Stats(profile))
+        return response
+
+    def render_summary(self, stats: pstats.Stats) -> str:
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)  # type: ignore[attr-defined]
+        parts = [f"total;dur={stats.total_tt * 1000:.3f}"]  # type: ignore[attr-defined]
+        for (filename, line, function), (_, calls, _, cumulative, _) in entries[: self.summary_size]:
+            location = f"{os.path.basename(filename)}:{line}" if line else filename
+            description = f"{function} ({location})".replace("\\", "\\\\").replace('"', '\\"')
+            parts.append(f'fn;dur={cumulative * 1000:.3f};calls={calls};desc="{description}"')
+        # header values must be latin-1
+        return ", ".join(parts).encode("ascii", "backslashreplace").decode()
+
+    def _make_filename(self, request: Request) -> str:
+        path = _INVALID_FILENAME_CHARS.sub("_", request.url.path.strip("/")) or "root"
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        return f"{timestamp}-{request.method}-{path[:100]}-{uuid.uuid4().hex[:8]}.prof"
@@ -1,23 +1,36 @@
 from __future__ import annotations
 
-import contextlib
 import functools
 import inspect
+import time
 import typing
+import weakref
 
 from starlette.concurrency import run_in_threadpool
 from starlette.middleware import Middleware
-from starlette.requests import HTTPConnection, Request
+from starlette.requests import Request
 from starlette.responses import Response
 from starlette.routing import BaseRoute, Route, WebSocketRoute
 from starlette.websockets import WebSocket
 
 from starlette_dispatch.injections import (
+    ApplicationDependencies,
     create_dependency_specs,
     DependencyResolver,
+    iter_route_dependencies,
     resolve_dependencies,
+    ResolutionHooks,
+    ResolutionPlan,
+    solve_dependencies,
+    SyncExecutor,
     VariableResolver,
+    warm_up_dependencies,
+    WarmUpResult,
 )
+from starlette_dispatch.profiling import RequestProfiler
+from starlette_dispatch.routing import RadixRouter
+from starlette_dispatch.stats import RouteHistograms, RouteStats
+from starlette_dispatch.timing import RequestTimings, ServerTiming
 
 AsyncViewCallable = typing.Callable[..., typing.Awaitable[Response]]
 SyncViewCallable = typing.Callable[..., Response]
@@ -40,15 +53,215 @@ def unwrap_websocket_callable(
     return typing.cast(typing.Callable[..., typing.Awaitable[None]], callback)
 
 
+def _get_state_resolvers(app: typing.Any) -> dict[typing.Any, DependencyResolver] | None:
+    # read the state dict directly, State raises AttributeError for missing attributes
+    state = getattr(getattr(app, "state", None), "_state", None)
+    return None if state is None else state.get("dependency_resolvers")
+
+
+class _BoundResolvers:
+    __slots__ = ("source", "resolvers")
+
+    def __init__(self) -> None:
+        self.source: dict[typing.Any, DependencyResolver] | None = None
+        self.resolvers: dict[typing.Any, DependencyResolver] = {}
+
+
+_bound_resolvers: weakref.WeakKeyDictionary[typing.Any, _BoundResolvers] = weakref.WeakKeyDictionary()
+
+
+def bind_dependency_resolvers(app: typing.Any) -> dict[typing.Any, DependencyResolver]:
+    """Bind application-level resolvers: the application itself and `app.state.dependency_resolvers`.
+
+    Endpoints bind resolvers on the first request to the application, and again when
+    `app.state.dependency_resolvers` is replaced with another dict.
+    Call this function after changing the dict in place."""
+    bound = _bound_resolvers.get(app)
+    if bound is None:
+        bound = _bound_resolvers[app] = _BoundResolvers()
+    bound.source = _get_state_resolvers(app)
+    # updated in place, so endpoints that hold the dict see the changes
+    bound.resolvers.clear()
+    bound.resolvers.update({type(app): VariableResolver(app), **(bound.source or {})})
+    return bound.resolvers
+
+
+class _StaticResolvers:
+    """Remembers static resolvers of the last application that called the endpoint."""
+
+    __slots__ = ("app", "source", "resolvers")
+
+    def __init__(self) -> None:
+        self.app: typing.Any = None
+        self.source: dict[typing.Any, DependencyResolver] | None = None
+        self.resolvers: dict[typing.Any, DependencyResolver] = {}
+
+    def get(self, app: typing.Any) -> dict[typing.Any, DependencyResolver]:
+        source = _get_state_resolvers(app)
+        if app is not self.app or source is not self.source:
+            bound = _bound_resolvers.get(app)
+            if bound is None or bound.source is not source:
+                bind_dependency_resolvers(app)
+                bound = _bound_resolvers[app]
+            self.app, self.source, self.resolvers = app, source, bound.resolvers
+        return self.resolvers
+
+
+def _build_plan(
+    view_callable: typing.Callable[..., typing.Any],
+    *,
+    concurrent: bool,
+    compiled: bool,
+    factory_executor: SyncExecutor | None,
+    hooks: ResolutionHooks | None,
+    deduplicate: bool,
+    route_path: str,
+) -> ResolutionPlan:
+    return ResolutionPlan.build(
+        create_dependency_specs(view_callable),
+        concurrent=concurrent,
+        compiled=compiled,
+        factory_executor=factory_executor,
+        hooks=hooks,
+        deduplicate=deduplicate,
+        route_path=route_path,
+    )
+
+
+async def _call_view(view_callable: AnyViewCallable, dependencies: dict[str, typing.Any]) -> Response:
+    if inspect.iscoroutinefunction(view_callable):
+        return await typing.cast(AsyncViewCallable, view_callable)(**dependencies)
+    return await run_in_threadpool(typing.cast(SyncViewCallable, view_callable), **dependencies)
+
+
+async def _call_timed_view(
+    request: Request,
+    view_callable: AnyViewCallable,
+    plan: ResolutionPlan,
+    static_dependencies: dict[typing.Any, DependencyResolver],
+    timings: RequestTimings,
+    hooks: ResolutionHooks | None,
+) -> Response:
+    # phases are measured in finally blocks, so timings of failed requests have the phases that ran
+    started_at = time.perf_counter()
+    teardown_started_at: float | None = None
+    try:
+        async with resolve_dependencies(request, plan, static_dependencies, hooks=hooks) as dependencies:
+            view_started_at = time.perf_counter()
+            timings.resolution = view_started_at - started_at
+            try:
+                return await _call_view(view_callable, dependencies)
+            finally:
+                teardown_started_at = time.perf_counter()
+                timings.view = teardown_started_at - view_started_at
+    finally:
+        if teardown_started_at is None:
+            timings.resolution = time.perf_counter() - started_at
+        else:
+            timings.teardown = time.perf_counter() - teardown_started_at
+
+
+_EndpointT = typing.TypeVar("_EndpointT", bound=typing.Callable[[Request], typing.Awaitable[Response]])
+
+
+def _profile_endpoint(endpoint: _EndpointT, profiler: RequestProfiler) -> _EndpointT:
+    @functools.wraps(endpoint)
+    async def profiled_endpoint(request: Request) -> Response:
+        if profiler.should_profile(request):
+            return await profiler.profile(request, endpoint)
+        return await endpoint(request)
+
+    return typing.cast(_EndpointT, profiled_endpoint)
+
+
+PlanSource = ResolutionPlan | typing.Callable[[], ResolutionPlan]
+
+
+class _PlanMixin:
+    """Holds the resolution plan of a route, the plan can be built on first access."""
+
+    _plan: ResolutionPlan | None
+    _build_plan: typing.Callable[[], ResolutionPlan] | None
+
+    def _set_plan(self, plan: PlanSource) -> None:
+        if isinstance(plan, ResolutionPlan):
+            self._plan, self._build_plan = plan, None
+        else:
+            self._plan, self._build_plan = None, plan
+
+    @property
+    def plan(self) -> ResolutionPlan:
+        if self._plan is None:
+            assert self._build_plan is not None
+            self._plan = self._build_plan()
+        return self._plan
+
+    @property
+    def plan_ready(self) -> bool:
+        """Whether the resolution plan has been built."""
+        return self._plan is not None
+
+
+class DispatchRoute(_PlanMixin, Route):
+    """HTTP route that exposes the dependency resolution plan of its endpoint."""
+
+    def __init__(
+        self,
+        path: str,
+        endpoint: typing.Callable[..., typing.Any],
+        *,
+        plan: PlanSource,
+        methods: list[HttpMethod] | None = None,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+    ) -> None:
+        super().__init__(path, endpoint, methods=methods, name=name, middleware=middleware)
+        self._set_plan(plan)
+
+
+class DispatchWebSocketRoute(_PlanMixin, WebSocketRoute):
+    """WebSocket route that exposes the dependency resolution plan of its endpoint."""
+
+    def __init__(
+        self,
+        path: str,
+        endpoint: typing.Callable[..., typing.Any],
+        *,
+        plan: PlanSource,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+    ) -> None:
+        super().__init__(path, endpoint, name=name, middleware=middleware)
+        self._set_plan(plan)
+
+
 class RouteGroup(typing.Sequence[BaseRoute]):
     def __init__(
         self,
         prefix: str | None = None,
         middleware: typing.Sequence[Middleware] | None = None,
         children: typing.Sequence[RouteGroup | BaseRoute] | None = None,
+        concurrent_dependencies: bool = False,
+        compile_dependencies: bool = False,
+        factory_executor: SyncExecutor | None = None,
+        defer_dependencies: bool = False,
+        hooks: ResolutionHooks | None = None,
+        server_timing: ServerTiming | None = None,
+        route_stats: RouteStats | None = None,
+        profiler: RequestProfiler | None = None,
+        deduplicate_dependencies: bool = False,
     ) -> None:
         self.prefix = prefix or ""
         self.routes: list[BaseRoute] = []
+        self.concurrent_dependencies = concurrent_dependencies
+        self.compile_dependencies = compile_dependencies
+        self.factory_executor = factory_executor
+        self.defer_dependencies = defer_dependencies
+        self.hooks = hooks
+        self.server_timing = server_timing
+        self.route_stats = route_stats
+        self.profiler = profiler
+        self.deduplicate_dependencies = deduplicate_dependencies
         self._common_middleware = list(middleware or [])
 
         for child in children or []:
@@ -64,95 +277,222 @@ class RouteGroup(typing.Sequence[BaseRoute]):
         methods: list[HttpMethod] | None = None,
         name: str | None = None,
         middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[AnyViewCallable], AsyncViewCallable]:
         path = self.prefix.removesuffix("/") + path if self.prefix else path
+        concurrent = self.concurrent_dependencies if concurrent_dependencies is None else concurrent_dependencies
 
         def decorator(view_callable: AnyViewCallable) -> AsyncViewCallable:
             # find the original view callable in order to parse the dependencies
             actual_view_callable = unwrap_callable(view_callable)
-            resolvers = create_dependency_specs(actual_view_callable)
+            static_resolvers = _StaticResolvers()
+            server_timing = self.server_timing
 
             async def endpoint(request: Request) -> Response:
-                app_resolvers: dict[typing.Any, DependencyResolver] = {}
-                with contextlib.suppress(AttributeError):
-                    app_resolvers = request.app.state.dependency_resolvers
-
-                static_dependencies = {
-                    type(request.app): VariableResolver(request.app),
-                    Request: VariableResolver(request),
-                    HTTPConnection: VariableResolver(request),
-                    **app_resolvers,
-                }
-                async with resolve_dependencies(request, resolvers, static_dependencies) as dependencies:
-                    if inspect.iscoroutinefunction(view_callable):
-                        return await typing.cast(AsyncViewCallable, view_callable)(**dependencies)
-                    return await run_in_threadpool(typing.cast(SyncViewCallable, view_callable), **dependencies)
+                plan = route.plan
+                static_dependencies = static_resolvers.get(request.app)
+                sampled = server_timing is not None and server_timing.should_sample(request)
+                if sampled or histograms is not None:
+                    # factory times are collected with hooks only for the Server-Timing header
+                    timings = RequestTimings(plan.hooks)
+                    hooks = timings if sampled else None
+                    try:
+                        response = await _call_timed_view(
+                            request, view_callable, plan, static_dependencies, timings, hooks
+                        )
+                    finally:
+                        if histograms is not None:
+                            histograms.record(timings)
+                    if server_timing is not None and sampled:
+                        response.headers.append("Server-Timing", server_timing.render(timings))
+                    return response
+
+                if not plan.requires_exit_stacks:
+                    dependencies = await solve_dependencies(request, plan, static_dependencies)
+                    return await _call_view(view_callable, dependencies)
+
+                async with resolve_dependencies(request, plan, static_dependencies) as dependencies:
+                    return await _call_view(view_callable, dependencies)
+
+            if self.profiler is not None:
+                endpoint = _profile_endpoint(endpoint, self.profiler)
 
             all_middleware = self._common_middleware + list(middleware or [])
-            self.routes.append(Route(path, endpoint, name=name, methods=methods, middleware=all_middleware))
+            plan = self._get_plan_source(actual_view_callable, concurrent, path)
+            route = DispatchRoute(path, endpoint, plan=plan, name=name, methods=methods, middleware=all_middleware)
+            histograms: RouteHistograms | None = None
+            if self.route_stats is not None:
+                # unnamed routes are named after the endpoint wrapper, use the view name instead
+                route_name: str = name or getattr(actual_view_callable, "__name__", None) or route.name
+                histograms = self.route_stats.for_route(route_name, route.path)
+            self.routes.append(route)
             return endpoint
 
         return decorator
 
     def get(
-        self, path: str, *, name: str | None = None, middleware: typing.Sequence[Middleware] | None = None
+        self,
+        path: str,
+        *,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[AnyViewCallable], AnyViewCallable]:
-        return self.add(path, methods=["GET"], name=name, middleware=middleware)
+        return self.add(
+            path,
+            methods=["GET"],
+            name=name,
+            middleware=middleware,
+            concurrent_dependencies=concurrent_dependencies,
+        )
 
     def post(
-        self, path: str, *, name: str | None = None, middleware: typing.Sequence[Middleware] | None = None
+        self,
+        path: str,
+        *,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[AnyViewCallable], AnyViewCallable]:
-        return self.add(path, methods=["POST"], name=name, middleware=middleware)
+        return self.add(
+            path,
+            methods=["POST"],
+            name=name,
+            middleware=middleware,
+            concurrent_dependencies=concurrent_dependencies,
+        )
 
     def get_or_post(
-        self, path: str, *, name: str | None = None, middleware: typing.Sequence[Middleware] | None = None
+        self,
+        path: str,
+        *,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[AnyViewCallable], AnyViewCallable]:
-        return self.add(path, methods=["GET", "POST"], name=name, middleware=middleware)
+        return self.add(
+            path,
+            methods=["GET", "POST"],
+            name=name,
+            middleware=middleware,
+            concurrent_dependencies=concurrent_dependencies,
+        )
 
     def put(
-        self, path: str, *, name: str | None = None, middleware: typing.Sequence[Middleware] | None = None
+        self,
+        path: str,
+        *,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[AnyViewCallable], AnyViewCallable]:
-        return self.add(path, methods=["PUT"], name=name, middleware=middleware)
+        return self.add(
+            path,
+            methods=["PUT"],
+            name=name,
+            middleware=middleware,
+            concurrent_dependencies=concurrent_dependencies,
+        )
 
     def patch(
-        self, path: str, *, name: str | None = None, middleware: typing.Sequence[Middleware] | None = None
+        self,
+        path: str,
+        *,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[AnyViewCallable], AnyViewCallable]:
-        return self.add(path, methods=["PATCH"], name=name, middleware=middleware)
+        return self.add(
+            path,
+            methods=["PATCH"],
+            name=name,
+            middleware=middleware,
+            concurrent_dependencies=concurrent_dependencies,
+        )
 
     def delete(
-        self, path: str, *, name: str | None = None, middleware: typing.Sequence[Middleware] | None = None
+        self,
+        path: str,
+        *,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[AnyViewCallable], AnyViewCallable]:
-        return self.add(path, methods=["DELETE"], name=name, middleware=middleware)
+        return self.add(
+            path,
+            methods=["DELETE"],
+            name=name,
+            middleware=middleware,
+            concurrent_dependencies=concurrent_dependencies,
+        )
 
     def websocket(
-        self, path: str, *, name: str | None = None, middleware: typing.Sequence[Middleware] | None = None
+        self,
+        path: str,
+        *,
+        name: str | None = None,
+        middleware: typing.Sequence[Middleware] | None = None,
+        concurrent_dependencies: bool | None = None,
     ) -> typing.Callable[[typing.Callable[_PS, typing.Awaitable[None]]], WebSocketViewCallable]:
         path = self.prefix.removesuffix("/") + path if self.prefix else path
+        concurrent = self.concurrent_dependencies if concurrent_dependencies is None else concurrent_dependencies
 
         def decorator(view_callable: typing.Callable[_PS, typing.Awaitable[None]]) -> WebSocketViewCallable:
             unwrapped_view_callable = unwrap_websocket_callable(view_callable)
-            resolvers = create_dependency_specs(unwrapped_view_callable)
+            static_resolvers = _StaticResolvers()
 
             @functools.wraps(unwrapped_view_callable)
             async def endpoint(websocket: WebSocket) -> None:
-                app_resolvers: dict[typing.Any, DependencyResolver] = {}
-                with contextlib.suppress(AttributeError):
-                    app_resolvers = websocket.app.state.dependency_resolvers
-
-                static_dependencies = {
-                    type(websocket.app): VariableResolver(websocket.app),
-                    WebSocket: VariableResolver(websocket),
-                    HTTPConnection: VariableResolver(websocket),
-                    **app_resolvers,
-                }
-                async with resolve_dependencies(websocket, resolvers, static_dependencies) as dependencies:
+                plan = route.plan
+                static_dependencies = static_resolvers.get(websocket.app)
+                if not plan.requires_exit_stacks:
+                    await unwrapped_view_callable(**await solve_dependencies(websocket, plan, static_dependencies))
+                    return
+
+                async with resolve_dependencies(websocket, plan, static_dependencies) as dependencies:
                     await unwrapped_view_callable(**dependencies)
 
-            self.routes.append(WebSocketRoute(path, endpoint, name=name, middleware=middleware))
+            plan = self._get_plan_source(unwrapped_view_callable, concurrent, path)
+            route = DispatchWebSocketRoute(path, endpoint, plan=plan, name=name, middleware=middleware)
+            self.routes.append(route)
             return endpoint
 
         return decorator
 
+    def _get_plan_source(
+        self, view_callable: typing.Callable[..., typing.Any], concurrent: bool, path: str
+    ) -> PlanSource:
+        build_plan = functools.partial(
+            _build_plan,
+            view_callable,
+            concurrent=concurrent,
+            compiled=self.compile_dependencies,
+            factory_executor=self.factory_executor,
+            hooks=self.hooks,
+            deduplicate=self.deduplicate_dependencies,
+            route_path=path,
+        )
+        return build_plan if self.defer_dependencies else build_plan()
+
+    def prepare(self) -> None:
+        """Build resolution plans of all routes that have deferred dependencies.
+
+        Call it on startup to fail early on invalid dependencies, or run it in a worker thread
+        to build plans in background: `await anyio.to_thread.run_sync(group.prepare)`."""
+        for route in self.routes:
+            if isinstance(route, _PlanMixin):
+                route.plan  # noqa: B018
+
+    async def warm_up(self, *, app_dependencies: ApplicationDependencies | None = None) -> list[WarmUpResult]:
+        """Create SINGLETON (and APP, when `app_dependencies` is given) scoped dependencies of the group routes."""
+        return await warm_up_dependencies(iter_route_dependencies(self.routes), app_dependencies=app_dependencies)
+
+    def compile(self) -> list[BaseRoute]:
+        """Return the routes of the group as a single radix tree router: `Starlette(routes=group.compile())`.
+
+        Routes added to the group later are not included."""
+        return [RadixRouter(self.routes)]
+
     def __iter__(self) -> typing.Iterator[BaseRoute]:
         return iter(self.routes)
 
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import re
+import typing
+
+from starlette.convertors import Convertor, FloatConvertor, IntegerConvertor, StringConvertor, UUIDConvertor
+from starlette.datastructures import URLPath
+from starlette.routing import BaseRoute, Match, NoMatchFound, PARAM_REGEX, Route, WebSocketRoute
+from starlette.types import Receive, Scope, Send
+
+
+# convertors whose patterns never match "/", subclasses and custom convertors may
+_SEGMENT_CONVERTORS: frozenset[type[Convertor[typing.Any]]] = frozenset(
+    {StringConvertor, IntegerConvertor, FloatConvertor, UUIDConvertor}
+)
+
+
+def _get_route_path(scope: Scope) -> str:
+    """The path relative to the mount point, computed like Starlette routes do."""
+    path: str = scope["path"]
+    root_path: str = scope.get("root_path", "")
+    if not root_path or not path.startswith(root_path):
+        return path
+    if path == root_path:
+        return ""
+    if path[len(root_path)] == "/":
+        return path[len(root_path) :]
+    return path
+
+
+class _Node:
+    __slots__ = ("static", "params", "routes")
+
+    def __init__(self) -> None:
+        self.static: dict[str, _Node] = {}
+        self.params: dict[str, tuple[re.Pattern[str], _Node]] = {}
+        self.routes: list[int] = []
+
+
+def _parse_segments(route: Route | WebSocketRoute) -> list[str | re.Pattern[str]] | None:
+    """Split the path template into static segments and patterns of parameter segments.
+    Return None for paths that cannot be matched segment by segment."""
+    segments: list[str | re.Pattern[str]] = []
+    for segment in route.path.split("/"):
+        if "{" not in segment:
+            segments.append(segment)
+            continue
+
+        match = PARAM_REGEX.fullmatch(segment)
+        if match is None:  # parameters mixed with text, like "{name}.{ext}"
+            return None
+        convertor = route.param_convertors[match.group(1)]
+        if type(convertor) not in _SEGMENT_CONVERTORS:  # may span several segments, like `path`
+            return None
+        segments.append(re.compile(convertor.regex))
+    return segments
+
+
+class RadixRouter(BaseRoute):
+    """Matches routes with a prefix tree of path segments instead of trying the routes one by one.
+
+    The tree narrows the routes down to those whose static and typed parameter segments match the path,
+    then the candidates are checked by their own `matches()` in the original order,
+    so the first matching route wins exactly like in the flat route list.
+    Routes that cannot be split into segments (mounts, hosts, parameters mixed with text, `path` and
+    custom convertor parameters) are checked for every request.
+
+    The matched route is stored in `scope["route"]`."""
+
+    def __init__(self, routes: typing.Iterable[BaseRoute]) -> None:
+        self.routes = list(routes)
+        self._trees: dict[str, _Node] = {"http": _Node(), "websocket": _Node()}
+        self._fallback: list[int] = []
+
+        for index, route in enumerate(self.routes):
+            segments = _parse_segments(route) if isinstance(route, Route | WebSocketRoute) else None
+            if segments is None:
+                self._fallback.append(index)
+                continue
+
+            node = self._trees["http" if isinstance(route, Route) else "websocket"]
+            for segment in segments:
+                if isinstance(segment, str):
+                    node = node.static.setdefault(segment, _Node())
+                else:
+                    node = node.params.setdefault(segment.pattern, (segment, _Node()))[1]
+            node.routes.append(index)
+
+    def matches(self, scope: Scope) -> tuple[Match, Scope]:
+        tree = self._trees.get(scope["type"])
+        if tree is None:
+            return Match.NONE, {}
+
+        candidates: list[int] = []
+        _collect(tree, _get_route_path(scope).split("/"), 0, candidates)
+        if self._fallback:
+            candidates += self._fallback
+        candidates.sort()
+
+        partial: tuple[Match, Scope] | None = None
+        for index in candidates:
+            route = self.routes[index]
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return Match.FULL, {**child_scope, "route": route}
+            if match == Match.PARTIAL and partial is None:
+                partial = Match.PARTIAL, {**child_scope, "route": route}
+        return partial or (Match.NONE, {})
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route: BaseRoute = scope["route"]
+        await route.handle(scope, receive, send)
+
+    def url_path_for(self, name: str, /, **path_params: typing.Any) -> URLPath:
+        for route in self.routes:
+            try:
+                return route.url_path_for(name, **path_params)
+            except NoMatchFound:
+                pass
+        raise NoMatchFound(name, path_params)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(routes={len(self.routes)})"
+
+
+def _collect(node: _Node, segments: list[str], position: int, candidates: list[int]) -> None:
+    if position == len(segments):
+        candidates += node.routes
+        return
+
+    segment = segments[position]
+    child = node.static.get(segment)
+    if child is not None:
+        _collect(child, segments, position + 1, candidates)
+    for pattern, child in node.params.values():
+        if pattern.fullmatch(segment):
+            _collect(child, segments, position + 1, candidates)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import bisect
+import typing
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from starlette_dispatch.timing import RequestTimings
+
+PHASES = ("resolution", "view", "teardown", "total")
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def log_buckets(min_value: float, max_value: float, growth: float) -> tuple[float, ...]:
+    """Upper bounds of buckets that grow by `growth` from `min_value` until they cover `max_value`."""
+    if not 0 < min_value < max_value:
+        raise ValueError("min_value must be positive and less than max_value.")
+    if growth <= 1:
+        raise ValueError("growth must be greater than 1.")
+    bounds = [min_value]
+    while bounds[-1] < max_value:
+        bounds.append(bounds[-1] * growth)
+    return tuple(bounds)
+
+
+class LatencyHistogram:
+    """Counts values in fixed buckets, memory does not grow with the number of recorded values.
+
+    The last bucket counts values above the largest bound."""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the quantile by the upper bound of its bucket."""
+        if not self.count:
+            return 0.0
+        rank, cumulative = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max  # pragma: no cover
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": [[bound, count] for bound, count in zip(self.bounds, self.counts) if count],
+            "overflow": self.counts[-1],
+        }
+
+
+class RouteHistograms:
+    """Latency histograms of request phases of a single route."""
+
+    __slots__ = ("name", "path", "resolution", "view", "teardown", "total")
+
+    def __init__(self, name: str, path: str, bounds: tuple[float, ...]) -> None:
+        self.name = name
+        self.path = path
+        self.resolution = LatencyHistogram(bounds)
+        self.view = LatencyHistogram(bounds)
+        self.teardown = LatencyHistogram(bounds)
+        self.total = LatencyHistogram(bounds)
+
+    def record(self, timings: RequestTimings) -> None:
+        self.resolution.record(timings.resolution)
+        self.view.record(timings.view)
+        self.teardown.record(timings.teardown)
+        self.total.record(timings.total)
+
+    def phases(self) -> typing.Iterator[tuple[str, LatencyHistogram]]:
+        for phase in PHASES:
+            yield phase, getattr(self, phase)
+
+
+class RouteStats:
+    """Per-route latency histograms of dependency resolution, view and teardown phases.
+
+    Routes are identified by the route name and the path template.
+    Histograms use log buckets from `min_latency` to `max_latency` seconds, each bucket `growth` times wider."""
+
+    def __init__(self, *, min_latency: float = 1e-5, max_latency: float = 60.0, growth: float = 2.0) -> None:
+        self.bounds = log_buckets(min_latency, max_latency, growth)
+        self.routes: dict[tuple[str, str], RouteHistograms] = {}
+
+    def for_route(self, name: str, path: str) -> RouteHistograms:
+        histograms = self.routes.get((name, path))
+        if histograms is None:
+            histograms = self.routes[name, path] = RouteHistograms(name, path, self.bounds)
+        return histograms
+
+    def reset(self) -> None:
+        for key, histograms in self.routes.items():
+            self.routes[key] = RouteHistograms(histograms.name, histograms.path, self.bounds)
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        return {
+            "routes": [
+                {
+                    "name": histograms.name,
+                    "path": histograms.path,
+                    "phases": {phase: histogram.as_dict() for phase, histogram in histograms.phases()},
+                }
+                for histograms in self.routes.values()
+            ]
+        }
+
+    def as_prometheus(self, metric_name: str = "starlette_dispatch_route_duration_seconds") -> str:
+        lines = [
+            f"# HELP {metric_name} Duration of request phases of RouteGroup endpoints.",
+            f"# TYPE {metric_name} histogram",
+        ]
+        for histograms in self.routes.values():
+            for phase, histogram in histograms.phases():
+                labels = f'route="{_escape(histograms.name)}",path="{_escape(histograms.path)}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(self.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric_name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{metric_name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric_name}_sum{{{labels}}} {histogram.sum:.9g}")
+                lines.append(f"{metric_name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    async def endpoint(self, request: Request) -> Response:
+        """Return stats as JSON, or as Prometheus text for `?format=prometheus` and Prometheus scrapers."""
+        accept = request.headers.get("accept", "")
+        if request.query_params.get("format") == "prometheus" or "text/plain" in accept or "openmetrics" in accept:
+            return PlainTextResponse(self.as_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+        return JSONResponse(self.as_dict())
+
+    def route(self, path: str = "/stats", *, name: str = "route_stats") -> Route:
+        return Route(path, self.endpoint, methods=["GET"], name=name)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import inspect
+import logging
+import random
+import re
+import typing
+
+from starlette.requests import Request
+
+from starlette_dispatch.injections import (
+    DependencySpec,
+    FactoryResolver,
+    ResolutionHooks,
+    ResolveContext,
+    ResolveEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+_INVALID_METRIC_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _factory_name(resolver: FactoryResolver) -> str:
+    factory = resolver._resolver
+    name: str = getattr(factory, "__qualname__", None) or type(factory).__qualname__
+    return name.rpartition("<locals>.")[2]
+
+
+class RequestTimings(ResolutionHooks):
+    """Durations of request phases, in seconds.
+
+    When used as resolution hooks, it also sums the time spent in each factory, by factory name.
+    Calls are forwarded to `hooks`, so hooks of the route group keep working."""
+
+    def __init__(self, hooks: ResolutionHooks | None = None) -> None:
+        self.resolution = 0.0
+        self.view = 0.0
+        self.teardown = 0.0
+        self.factories: dict[str, float] = {}
+        self._hooks = hooks
+
+    @property
+    def total(self) -> float:
+        return self.resolution + self.view + self.teardown
+
+    def before_resolve(self, context: ResolveContext, spec: DependencySpec) -> None:
+        if self._hooks is not None:
+            self._hooks.before_resolve(context, spec)
+
+    def after_resolve(self, context: ResolveContext, event: ResolveEvent) -> None:
+        if isinstance(event.resolver, FactoryResolver):
+            name = _factory_name(event.resolver)
+            self.factories[name] = self.factories.get(name, 0.0) + event.elapsed
+        if self._hooks is not None:
+            self._hooks.after_resolve(context, event)
+
+    def context_entered(self, context: ResolveContext, spec: DependencySpec | None, elapsed: float) -> None:
+        if self._hooks is not None:
+            self._hooks.context_entered(context, spec, elapsed)
+
+    def context_exited(self, context: ResolveContext, spec: DependencySpec | None, elapsed: float) -> None:
+        if self._hooks is not None:
+            self._hooks.context_exited(context, spec, elapsed)
+
+    def sync_called(self, context: ResolveContext, fn: typing.Callable[..., typing.Any], elapsed: float) -> None:
+        if self._hooks is not None:
+            self._hooks.sync_called(context, fn, elapsed)
+
+
+class ServerTiming:
+    """Adds a Server-Timing header with the dependency breakdown to sampled responses.
+
+    The header lists dependency resolution (`resolve`), every factory (`dep.<name>`), the view (`view`)
+    and closing of context-managed dependencies (`teardown`), in milliseconds.
+    Factory times of scoped factories include resolution of their own dependencies."""
+
+    def __init__(self, *, sample_rate: float = 1.0, dependencies: bool = True) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1.")
+        self.sample_rate = sample_rate
+        self.dependencies = dependencies
+
+    def should_sample(self, request: Request) -> bool:
+        """Override to enable the header by other criteria, for example, for staff users."""
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def render(self, timings: RequestTimings) -> str:
+        metrics = [_metric("resolve", timings.resolution)]
+        if self.dependencies:
+            for name, elapsed in timings.factories.items():
+                metrics.append(_metric("dep." + _INVALID_METRIC_CHARS.sub("_", name), elapsed, name))
+        metrics += [_metric("view", timings.view), _metric("teardown", timings.teardown)]
+        return ", ".join(metrics)
+
+
+def _metric(name: str, elapsed: float, description: str | None = None) -> str:
+    metric = f"{name};dur={elapsed * 1000:.3f}"
+    if description is not None:
+        description = description.replace("\\", "\\\\").replace('"', '\\"')
+        metric += f';desc="{description}"'
+    return metric
+
+
+def _call_name(fn: typing.Callable[..., typing.Any]) -> str:
+    manager = getattr(fn, "__self__", None)
+    generator = getattr(manager, "gen", None)
+    if isinstance(manager, contextlib.AbstractContextManager) and inspect.isgenerator(generator):
+        # context managers made by @contextmanager are named by the decorated function,
+        # it is not kept on the manager after enter, so the name is taken from the generator
+        module = inspect.getmodule(generator.gi_code)
+        return f"{module.__name__ if module else '?'}.{generator.__qualname__}.{getattr(fn, '__name__', '?')}"
+    return f"{getattr(fn, '__module__', None) or '?'}.{getattr(fn, '__qualname__', None) or repr(fn)}"
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class BlockingCall:
+    """A sync call that blocked the event loop longer than the threshold."""
+
+    name: str
+    route: str | None
+    path: str
+    elapsed: float
+
+
+class BlockingDetector(ResolutionHooks):
+    """Reports sync factories and request resolver callbacks that block the event loop longer than `threshold` seconds.
+
+    Entering and exiting sync context managers returned by factories is reported too, as `<factory>.__enter__`
+    and `<factory>.__exit__`. Reports are logged as warnings unless `callback` is given.
+    Factories offloaded to an executor are not reported."""
+
+    def __init__(
+        self, threshold: float = 0.01, *, callback: typing.Callable[[BlockingCall], None] | None = None
+    ) -> None:
+        self.threshold = threshold
+        self.callback = callback
+
+    def sync_called(self, context: ResolveContext, fn: typing.Callable[..., typing.Any], elapsed: float) -> None:
+        if elapsed < self.threshold:
+            return
+
+        call = BlockingCall(
+            name=_call_name(fn),
+            route=context.route_path,
+            path=context.connection.scope.get("path", ""),
+            elapsed=elapsed,
+        )
+        if self.callback is not None:
+            self.callback(call)
+        else:
+            logger.warning(
+                "%s blocked the event loop for %.1fms (route %s, path %s).",
+                call.name,
+                call.elapsed * 1000,
+                call.route,
+                call.path,
+            )
@@ -3,6 +3,15 @@ import pytest
 from starlette_dispatch.route_group import RouteGroup
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--record-allocation-budgets",
+        action="store_true",
+        default=False,
+        help="record allocation budgets of tests/test_allocations.py instead of checking them",
+    )
+
+
 @pytest.fixture
 def route_group() -> RouteGroup:
     return RouteGroup()
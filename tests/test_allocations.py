@@ -0,0 +1,212 @@
+"""Allocation budgets of the request path.
+
+Each scenario measures, with tracemalloc, the memory blocks and bytes that are live when the view is called
+(everything routing and dependency resolution allocated for the request) and the peak memory of the whole request.
+The test fails when a measurement exceeds the budget recorded in `allocation_budgets.json` for this Python version
+by more than the tolerance, or when no budget is recorded for this Python version.
+The check is skipped while a tracer is active, for example, under coverage.
+
+Record budgets after an intentional change with:
+    pytest tests/test_allocations.py --record-allocation-budgets
+"""
+
+import contextlib
+import gc
+import json
+import sys
+import tracemalloc
+import typing
+from pathlib import Path
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Message
+
+from starlette_dispatch import DependencyScope, FactoryResolver, RouteGroup
+from starlette_dispatch.injections import create_dependency_specs, ResolutionPlan, resolve_dependencies
+
+BUDGETS_FILE = Path(__file__).parent / "allocation_budgets.json"
+PYTHON_VERSION = f"{sys.version_info.major}.{sys.version_info.minor}"
+WARM_UP_REQUESTS = 5
+ROUNDS = 5
+TOLERANCE = 0.1  # measurements vary slightly between runs and platforms
+
+
+def _sync_factory() -> int:
+    return 1
+
+
+async def _async_factory(value: typing.Annotated[int, FactoryResolver(_sync_factory)]) -> int:
+    return value + 1
+
+
+@contextlib.asynccontextmanager
+async def _cm_factory() -> typing.AsyncGenerator[int, None]:
+    yield 1
+
+
+def _request_value(request: Request) -> str:
+    return request.url.path
+
+
+SyncValue = typing.Annotated[int, FactoryResolver(_sync_factory)]
+AsyncValue = typing.Annotated[int, FactoryResolver(_async_factory)]
+ContextManagerValue = typing.Annotated[int, FactoryResolver(_cm_factory)]
+RequestValue = typing.Annotated[str, FactoryResolver(_request_value, scope=DependencyScope.REQUEST)]
+SingletonValue = typing.Annotated[int, FactoryResolver(_sync_factory, scope=DependencyScope.SINGLETON)]
+
+
+class _Probe:
+    """Takes a tracemalloc snapshot when the view is called."""
+
+    def __init__(self) -> None:
+        self.snapshot: tracemalloc.Snapshot | None = None
+
+    def take(self) -> None:
+        if tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+
+
+def _make_views(probe: _Probe) -> dict[str, typing.Callable[..., typing.Any]]:
+    async def no_dependencies() -> Response:
+        probe.take()
+        return PlainTextResponse("ok")
+
+    async def factories(sync: SyncValue, value: AsyncValue) -> Response:
+        probe.take()
+        return PlainTextResponse("ok")
+
+    async def context_manager(value: ContextManagerValue) -> Response:
+        probe.take()
+        return PlainTextResponse("ok")
+
+    async def scoped(request: Request, first: RequestValue, second: RequestValue, value: SingletonValue) -> Response:
+        probe.take()
+        return PlainTextResponse("ok")
+
+    return {
+        "no_dependencies": no_dependencies,
+        "factories": factories,
+        "context_manager": context_manager,
+        "scoped": scoped,
+    }
+
+
+def _make_scope(path: str) -> dict[str, typing.Any]:
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("testserver", 80),
+        "state": {},
+    }
+
+
+async def _receive() -> Message:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message: Message) -> None:
+    pass
+
+
+def _filter(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+async def _measure(call: typing.Callable[[], typing.Awaitable[None]], probe: _Probe) -> dict[str, int]:
+    for _ in range(WARM_UP_REQUESTS):
+        await call()
+
+    # the smallest value of several rounds, so one-time allocations (like interned strings) are not counted
+    measurements: list[dict[str, int]] = []
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        for _ in range(ROUNDS):
+            before = _filter(tracemalloc.take_snapshot())
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            await call()
+            _, peak = tracemalloc.get_traced_memory()
+
+            assert probe.snapshot is not None
+            statistics = _filter(probe.snapshot).compare_to(before, "filename")
+            measurements.append(
+                {
+                    "blocks": sum(stat.count_diff for stat in statistics),
+                    "bytes": sum(stat.size_diff for stat in statistics),
+                    "peak_bytes": peak - baseline,
+                }
+            )
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return {key: min(measurement[key] for measurement in measurements) for key in measurements[0]}
+
+
+def _load_budgets() -> dict[str, dict[str, dict[str, int]]]:
+    if not BUDGETS_FILE.exists():
+        return {}
+    return typing.cast(dict[str, dict[str, dict[str, int]]], json.loads(BUDGETS_FILE.read_text()))
+
+
+def _is_traced() -> bool:
+    if sys.gettrace() is not None:
+        return True
+    monitoring = getattr(sys, "monitoring", None)  # Python 3.12+, used by coverage with COVERAGE_CORE=sysmon
+    return monitoring is not None and monitoring.get_tool(monitoring.COVERAGE_ID) is not None
+
+
+def _check_budget(request: pytest.FixtureRequest, name: str, measured: dict[str, int]) -> None:
+    if _is_traced():
+        pytest.skip("Allocations are not comparable with budgets while a tracer, like coverage, is active.")
+    budgets = _load_budgets()
+    if request.config.getoption("record_allocation_budgets"):
+        budgets.setdefault(PYTHON_VERSION, {})[name] = measured
+        BUDGETS_FILE.write_text(json.dumps(budgets, indent=2, sort_keys=True) + "\n")
+        return
+
+    budget = budgets.get(PYTHON_VERSION, {}).get(name)
+    if budget is None:
+        pytest.fail(
+            f"No allocation budget recorded for {name!r} on Python {PYTHON_VERSION}, "
+            "record it with --record-allocation-budgets."
+        )
+
+    exceeded = {key: (value, budget[key]) for key, value in measured.items() if value > budget[key] * (1 + TOLERANCE)}
+    assert not exceeded, f"Allocation budget exceeded for {name!r} (measured, budget): {exceeded}"
+
+
+@pytest.mark.parametrize("view_name", ["no_dependencies", "factories", "context_manager", "scoped"])
+async def test_endpoint_allocations(request: pytest.FixtureRequest, view_name: str) -> None:
+    probe = _Probe()
+    group = RouteGroup()
+    group.get("/")(_make_views(probe)[view_name])
+    app = Starlette(routes=group)
+
+    async def call() -> None:
+        await app(_make_scope("/"), _receive, _send)
+
+    _check_budget(request, f"endpoint_{view_name}", await _measure(call, probe))
+
+
+@pytest.mark.parametrize("view_name", ["factories", "context_manager", "scoped"])
+async def test_resolve_dependencies_allocations(request: pytest.FixtureRequest, view_name: str) -> None:
+    probe = _Probe()
+    plan = ResolutionPlan.build(create_dependency_specs(_make_views(probe)[view_name]))
+
+    async def call() -> None:
+        async with resolve_dependencies(Request(_make_scope("/")), plan):
+            probe.take()
+
+    _check_budget(request, f"resolve_dependencies_{view_name}", await _measure(call, probe))
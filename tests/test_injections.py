@@ -1,12 +1,19 @@
+import concurrent.futures
 import contextlib
+import contextvars
 import dataclasses
+import threading
 import time
 import typing
 
+import anyio
 import pytest
 from starlette.requests import HTTPConnection, Request
 
 from starlette_dispatch.injections import (
+    APP_DEPENDENCIES_KEY,
+    ApplicationDependencies,
+    CachedResolver,
     create_dependency_specs,
     DependencyError,
     DependencyNotFoundError,
@@ -14,11 +21,19 @@ from starlette_dispatch.injections import (
     DependencyResolver,
     DependencyScope,
     DependencySpec,
+    FactoryExecutor,
     FactoryResolver,
+    get_request_cache,
+    Lazy,
     RequestResolver,
+    ResolutionHooks,
+    ResolutionPlan,
     resolve_dependencies,
     ResolveContext,
+    ResolveEvent,
+    solve_dependencies,
     VariableResolver,
+    warm_up_dependencies,
 )
 
 
@@ -423,6 +438,227 @@ class TestFactoryResolver:
         value2 = await resolver.resolve(context, spec)
         assert value == value2
 
+    async def test_singleton_initialized_once(self) -> None:
+        calls: list[int] = []
+
+        async def factory() -> int:
+            calls.append(1)
+            await anyio.sleep(0.01)
+            return len(calls)
+
+        resolver = FactoryResolver(factory, scope=DependencyScope.SINGLETON)
+        spec = DependencySpec(
+            resolver=resolver,
+            optional=False,
+            param_type=int,
+            default=None,
+            param_name="dep",
+            annotation=int,
+            resolver_options=[],
+        )
+        context = ResolveContext(
+            connection=HTTPConnection({"type": "http"}),
+            sync_stack=contextlib.ExitStack(),
+            async_stack=contextlib.AsyncExitStack(),
+            static_resolvers={},
+        )
+        values: list[int] = []
+
+        async def resolve() -> None:
+            values.append(await resolver.resolve(context, spec))
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(5):
+                task_group.start_soon(resolve)
+
+        assert values == [1, 1, 1, 1, 1]
+        assert len(calls) == 1
+
+    async def test_singleton_caches_falsy_values(self) -> None:
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            return 0
+
+        resolver = FactoryResolver(factory, scope=DependencyScope.SINGLETON)
+        spec = DependencySpec(
+            resolver=resolver,
+            optional=False,
+            param_type=int,
+            default=None,
+            param_name="dep",
+            annotation=int,
+            resolver_options=[],
+        )
+        context = ResolveContext(
+            connection=HTTPConnection({"type": "http"}),
+            sync_stack=contextlib.ExitStack(),
+            async_stack=contextlib.AsyncExitStack(),
+            static_resolvers={},
+        )
+        assert await resolver.resolve(context, spec) == 0
+        assert await resolver.resolve(context, spec) == 0
+        assert len(calls) == 1
+
+    async def test_singleton_initialization_failure(self) -> None:
+        calls: list[int] = []
+
+        async def factory() -> int:
+            calls.append(1)
+            await anyio.sleep(0.01)
+            if len(calls) == 1:
+                raise ValueError("failed")
+            return len(calls)
+
+        resolver = FactoryResolver(factory, scope=DependencyScope.SINGLETON)
+        spec = DependencySpec(
+            resolver=resolver,
+            optional=False,
+            param_type=int,
+            default=None,
+            param_name="dep",
+            annotation=int,
+            resolver_options=[],
+        )
+        context = ResolveContext(
+            connection=HTTPConnection({"type": "http"}),
+            sync_stack=contextlib.ExitStack(),
+            async_stack=contextlib.AsyncExitStack(),
+            static_resolvers={},
+        )
+        errors: list[Exception] = []
+
+        async def resolve() -> None:
+            try:
+                await resolver.resolve(context, spec)
+            except ValueError as ex:
+                errors.append(ex)
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(3):
+                task_group.start_soon(resolve)
+
+        assert len(errors) == 3
+        assert len(calls) == 1
+        assert await resolver.resolve(context, spec) == 2
+        assert await resolver.resolve(context, spec) == 2
+
+    async def test_singleton_initialization_cancelled(self) -> None:
+        calls: list[int] = []
+
+        async def factory() -> int:
+            calls.append(1)
+            await anyio.sleep(1 if len(calls) == 1 else 0)
+            return len(calls)
+
+        resolver = FactoryResolver(factory, scope=DependencyScope.SINGLETON)
+        spec = DependencySpec(
+            resolver=resolver,
+            optional=False,
+            param_type=int,
+            default=None,
+            param_name="dep",
+            annotation=int,
+            resolver_options=[],
+        )
+        context = ResolveContext(
+            connection=HTTPConnection({"type": "http"}),
+            sync_stack=contextlib.ExitStack(),
+            async_stack=contextlib.AsyncExitStack(),
+            static_resolvers={},
+        )
+        values: list[int] = []
+
+        async def resolve() -> None:
+            values.append(await resolver.resolve(context, spec))
+
+        cancel_scope = anyio.CancelScope()
+
+        async def cancelled_resolve() -> None:
+            with cancel_scope:
+                await resolve()
+
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(cancelled_resolve)
+            await anyio.sleep(0.005)
+            task_group.start_soon(resolve)
+            await anyio.sleep(0.001)
+            cancel_scope.cancel()
+
+        assert values == [2]
+        assert len(calls) == 2
+
+    async def test_request_value_creation_cancelled(self) -> None:
+        calls: list[int] = []
+
+        async def factory() -> int:
+            calls.append(1)
+            await anyio.sleep(1 if len(calls) == 1 else 0)
+            return len(calls)
+
+        resolver = FactoryResolver(factory, scope=DependencyScope.REQUEST)
+        spec = DependencySpec(
+            resolver=resolver,
+            optional=False,
+            param_type=int,
+            default=None,
+            param_name="dep",
+            annotation=int,
+            resolver_options=[],
+        )
+        context = ResolveContext(
+            connection=HTTPConnection({"type": "http"}),
+            sync_stack=contextlib.ExitStack(),
+            async_stack=contextlib.AsyncExitStack(),
+            static_resolvers={},
+        )
+        values: list[int] = []
+
+        async def resolve() -> None:
+            values.append(await resolver.resolve(context, spec))
+
+        cancel_scope = anyio.CancelScope()
+
+        async def cancelled_resolve() -> None:
+            with cancel_scope:
+                await resolve()
+
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(cancelled_resolve)
+            await anyio.sleep(0.005)
+            task_group.start_soon(resolve)
+            await anyio.sleep(0.001)
+            cancel_scope.cancel()
+
+        assert values == [2]
+        assert len(calls) == 2
+
+    async def test_app_value_initialized_once(self) -> None:
+        calls: list[int] = []
+
+        async def factory() -> int:
+            calls.append(1)
+            await anyio.sleep(0.01)
+            return len(calls)
+
+        def view(value: typing.Annotated[int, FactoryResolver(factory, scope=DependencyScope.APP)]) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view))
+        values: list[int] = []
+        async with ApplicationDependencies() as app_dependencies:
+
+            async def resolve() -> None:
+                request = Request({"type": "http", "state": {APP_DEPENDENCIES_KEY: app_dependencies}})
+                values.append((await solve_dependencies(request, plan))["value"])
+
+            async with anyio.create_task_group() as task_group:
+                for _ in range(3):
+                    task_group.start_soon(resolve)
+
+        assert values == [1, 1, 1]
+        assert len(calls) == 1
+
     async def test_cached_dependency_failure(self) -> None:
         def factory() -> float:
             return time.time()
@@ -509,6 +745,513 @@ class TestFactoryResolver:
         assert value2 != value3
 
 
+class TestRequestCache:
+    async def test_shared_between_parameters(self) -> None:
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            return 0
+
+        RequestValue = typing.Annotated[int, FactoryResolver(factory, scope=DependencyScope.REQUEST)]
+
+        def child(value: RequestValue) -> int:
+            return value + 1
+
+        def view(
+            first: RequestValue, second: RequestValue, child: typing.Annotated[int, FactoryResolver(child)]
+        ) -> None: ...
+
+        request = Request({"type": "http"})
+        async with resolve_dependencies(request, create_dependency_specs(view)) as dependencies:
+            assert dependencies == {"first": 0, "second": 0, "child": 1}
+        assert len(calls) == 1
+
+    async def test_uses_cached_values(self) -> None:
+        resolver = FactoryResolver(resolver_one, scope=DependencyScope.REQUEST)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        request = Request({"type": "http"})
+        get_request_cache(request.scope)[resolver] = 100
+        async with resolve_dependencies(request, create_dependency_specs(view)) as dependencies:
+            assert dependencies == {"value": 100}
+
+        assert get_request_cache(Request({"type": "http"}).scope) == {}
+
+
+class TestCachedResolver:
+    async def test_caches_by_dependency_values(self) -> None:
+        calls: list[str] = []
+
+        def factory(key: typing.Annotated[str, FactoryResolver(lambda: "key")]) -> str:
+            calls.append(key)
+            return key.upper()
+
+        resolver = CachedResolver(factory)
+
+        def view(value: typing.Annotated[str, resolver]) -> None: ...
+
+        for _ in range(3):
+            async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+                assert dependencies == {"value": "KEY"}
+        assert calls == ["key"]
+
+    async def test_separate_entries_per_key(self) -> None:
+        calls: list[str] = []
+
+        def factory(key: typing.Annotated[str, RequestResolver(lambda r: r.scope["key"])]) -> str:
+            calls.append(key)
+            return key.upper()
+
+        resolver = CachedResolver(factory)
+
+        def view(value: typing.Annotated[str, resolver]) -> None: ...
+
+        for key in ["a", "b", "a"]:
+            async with resolve_dependencies(
+                Request({"type": "http", "key": key}), create_dependency_specs(view)
+            ) as dependencies:
+                assert dependencies == {"value": key.upper()}
+        assert calls == ["a", "b"]
+
+    async def test_ttl(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = 100.0
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            return len(calls)
+
+        resolver = CachedResolver(factory, ttl=10)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        async def resolve() -> int:
+            async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+                return typing.cast(int, dependencies["value"])
+
+        assert await resolve() == 1
+        now = 109.0
+        assert await resolve() == 1
+        now = 110.0
+        assert await resolve() == 2
+
+    async def test_refresh_after(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = 100.0
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        calls: list[int] = []
+        release = anyio.Event()
+
+        async def factory() -> int:
+            calls.append(1)
+            if len(calls) > 1:
+                await release.wait()
+            return len(calls)
+
+        resolver = CachedResolver(factory, ttl=60, refresh_after=10)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        async def resolve() -> int:
+            async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+                return typing.cast(int, dependencies["value"])
+
+        assert await resolve() == 1
+        now = 110.0
+        # stale values are returned while a single refresh runs in background
+        assert await resolve() == 1
+        assert await resolve() == 1
+        await anyio.wait_all_tasks_blocked()
+        assert len(calls) == 2
+
+        release.set()
+        await anyio.wait_all_tasks_blocked()
+        assert await resolve() == 2
+        assert len(calls) == 2
+
+    async def test_refresh_failure_keeps_stale_value(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = 100.0
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            if len(calls) == 2:
+                raise ValueError("boom")
+            return len(calls)
+
+        resolver = CachedResolver(factory, ttl=60, refresh_after=10)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        async def resolve() -> int:
+            async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+                return typing.cast(int, dependencies["value"])
+
+        assert await resolve() == 1
+        now = 110.0
+        assert await resolve() == 1
+        await anyio.wait_all_tasks_blocked()
+        assert await resolve() == 1  # the next refresh waits for another refresh_after
+        await anyio.wait_all_tasks_blocked()
+        assert len(calls) == 2
+
+        now = 120.0
+        assert await resolve() == 1  # starts another refresh
+        await anyio.wait_all_tasks_blocked()
+        assert await resolve() == 3
+
+    async def test_refresh_runs_in_application_task_group(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = 100.0
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        calls: list[int] = []
+        cancelled = anyio.Event()
+
+        async def factory() -> int:
+            calls.append(1)
+            if len(calls) > 1:
+                try:
+                    await anyio.sleep_forever()
+                finally:
+                    cancelled.set()
+            return len(calls)
+
+        resolver = CachedResolver(factory, ttl=60, refresh_after=10)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        async with ApplicationDependencies() as app_dependencies:
+            request = Request({"type": "http", "state": {APP_DEPENDENCIES_KEY: app_dependencies}})
+            async with resolve_dependencies(request, create_dependency_specs(view)) as dependencies:
+                assert dependencies == {"value": 1}
+            now = 110.0
+            async with resolve_dependencies(request, create_dependency_specs(view)) as dependencies:
+                assert dependencies == {"value": 1}
+            await anyio.wait_all_tasks_blocked()
+            assert len(calls) == 2
+
+        # the refresh is cancelled on shutdown
+        assert cancelled.is_set()
+
+    async def test_application_task_group_lifetime(self) -> None:
+        app_dependencies = ApplicationDependencies()
+        with pytest.raises(RuntimeError, match="not entered"):
+            app_dependencies.start_soon(anyio.lowlevel.checkpoint)
+
+        async with app_dependencies:
+            assert app_dependencies.running
+        assert not app_dependencies.running
+        await app_dependencies.__aexit__(None, None, None)  # closing again does nothing
+
+    def test_detached_refresh_on_trio(self) -> None:
+        pytest.importorskip("trio")
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            return len(calls)
+
+        resolver = CachedResolver(factory, refresh_after=0)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        async def main() -> list[int]:
+            values = []
+            for _ in range(2):
+                async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as deps:
+                    values.append(deps["value"])
+                await anyio.wait_all_tasks_blocked()
+            return values
+
+        assert anyio.run(main, backend="trio") == [1, 1]
+        assert len(calls) == 2
+
+    async def test_refresh_blocks_after_ttl(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = 100.0
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            return len(calls)
+
+        resolver = CachedResolver(factory, ttl=60, refresh_after=10)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        async def resolve() -> int:
+            async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+                return typing.cast(int, dependencies["value"])
+
+        assert await resolve() == 1
+        now = 160.0
+        assert await resolve() == 2
+
+    async def test_evicts_least_recently_used(self) -> None:
+        calls: list[str] = []
+
+        def factory(key: typing.Annotated[str, RequestResolver(lambda r: r.scope["key"])]) -> str:
+            calls.append(key)
+            return key
+
+        resolver = CachedResolver(factory, max_entries=2)
+
+        def view(value: typing.Annotated[str, resolver]) -> None: ...
+
+        for key in ["a", "b", "a", "c", "a", "b"]:
+            async with resolve_dependencies(Request({"type": "http", "key": key}), create_dependency_specs(view)):
+                pass
+        assert calls == ["a", "b", "c", "b"]
+
+    async def test_invalidate(self) -> None:
+        calls: list[str] = []
+
+        def factory(key: typing.Annotated[str, RequestResolver(lambda r: r.scope["key"])]) -> str:
+            calls.append(key)
+            return key
+
+        resolver = CachedResolver(factory)
+
+        def view(value: typing.Annotated[str, resolver]) -> None: ...
+
+        async def resolve(key: str) -> None:
+            async with resolve_dependencies(Request({"type": "http", "key": key}), create_dependency_specs(view)):
+                pass
+
+        await resolve("a")
+        await resolve("b")
+        resolver.invalidate(key="a")
+        await resolve("a")
+        await resolve("b")
+        assert calls == ["a", "b", "a"]
+
+        resolver.clear()
+        await resolve("b")
+        assert calls == ["a", "b", "a", "b"]
+
+    async def test_concurrent_calls_share_factory_call(self) -> None:
+        calls: list[int] = []
+
+        async def factory() -> int:
+            calls.append(1)
+            await anyio.sleep(0.01)
+            return 1
+
+        resolver = CachedResolver(factory)
+
+        def view(value: typing.Annotated[int, resolver]) -> None: ...
+
+        async def resolve() -> None:
+            async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+                assert dependencies == {"value": 1}
+
+        async with anyio.create_task_group() as tg:
+            for _ in range(5):
+                tg.start_soon(resolve)
+        assert len(calls) == 1
+
+    async def test_unhashable_dependencies(self) -> None:
+        def factory(key: typing.Annotated[list[str], FactoryResolver(lambda: [])]) -> str:
+            return ""
+
+        def view(value: typing.Annotated[str, CachedResolver(factory)]) -> None: ...
+
+        with pytest.raises(DependencyError, match="must be hashable"):
+            async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)):
+                pass
+
+
+class TestLazy:
+    async def test_resolves_on_await(self) -> None:
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            return 42
+
+        def view(value: Lazy[typing.Annotated[int, FactoryResolver(factory)]]) -> None: ...
+
+        async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+            lazy = dependencies["value"]
+            assert isinstance(lazy, Lazy)
+            assert not lazy.resolved
+            assert calls == []
+
+            assert await lazy == 42
+            assert await lazy.get() == 42
+            assert lazy.resolved
+        assert calls == [1]
+
+    async def test_not_resolved_when_not_awaited(self) -> None:
+        calls: list[int] = []
+
+        def factory() -> int:
+            calls.append(1)
+            return 42
+
+        def view(value: Lazy[typing.Annotated[int, FactoryResolver(factory)]]) -> None: ...
+
+        async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)):
+            pass
+        assert calls == []
+
+    async def test_concurrent_awaits_resolve_once(self) -> None:
+        calls: list[int] = []
+
+        async def factory() -> int:
+            calls.append(1)
+            await anyio.sleep(0.01)
+            return 42
+
+        def view(value: Lazy[typing.Annotated[int, FactoryResolver(factory)]]) -> None: ...
+
+        async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+            results: list[int] = []
+
+            async def get() -> None:
+                results.append(await dependencies["value"])
+
+            async with anyio.create_task_group() as tg:
+                for _ in range(3):
+                    tg.start_soon(get)
+        assert results == [42, 42, 42]
+        assert calls == [1]
+
+    async def test_context_manager_closed_with_request(self) -> None:
+        events: list[str] = []
+
+        @contextlib.asynccontextmanager
+        async def factory() -> typing.AsyncGenerator[str, None]:
+            events.append("enter")
+            yield "value"
+            events.append("exit")
+
+        def view(value: Lazy[typing.Annotated[str, FactoryResolver(factory)]]) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view))
+        assert plan.requires_exit_stacks
+
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert await dependencies["value"] == "value"
+            assert events == ["enter"]
+        assert events == ["enter", "exit"]
+
+    async def test_none_value(self) -> None:
+        def view(value: Lazy[typing.Annotated[str, FactoryResolver(lambda: None)]]) -> None: ...
+
+        async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+            with pytest.raises(DependencyRequiresValueError):
+                await dependencies["value"]
+
+
+class TestWarmUp:
+    async def test_creates_singletons(self) -> None:
+        calls: list[str] = []
+
+        def make_config() -> str:
+            calls.append("config")
+            return "config"
+
+        def make_client(
+            config: typing.Annotated[str, FactoryResolver(make_config, scope=DependencyScope.SINGLETON)],
+        ) -> str:
+            calls.append("client")
+            return f"client:{config}"
+
+        def make_user(request: Request) -> str:
+            calls.append("user")
+            return "user"
+
+        Client = typing.Annotated[str, FactoryResolver(make_client, scope=DependencyScope.SINGLETON)]
+        User = typing.Annotated[str, FactoryResolver(make_user, scope=DependencyScope.SINGLETON)]
+
+        def view(
+            client: Client, user: User, transient: typing.Annotated[str, FactoryResolver(lambda: "t")]
+        ) -> None: ...
+
+        results = await warm_up_dependencies(create_dependency_specs(view))
+        assert [result.spec.param_name for result in results] == ["config", "client"]
+        assert all(result.error is None and result.elapsed >= 0 for result in results)
+        assert calls == ["config", "client"]
+
+        async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+            assert dependencies["client"] == "client:config"
+        assert calls == ["config", "client", "user"]
+
+    async def test_checks_dependencies_of_factories(self) -> None:
+        calls: list[str] = []
+
+        def make_config() -> str:
+            calls.append("config")
+            return "config"
+
+        Config = typing.Annotated[str, FactoryResolver(make_config, scope=DependencyScope.SINGLETON)]
+
+        async def make_settings(debug: typing.Annotated[bool, VariableResolver(True)], config: Lazy[Config]) -> str:
+            calls.append("settings")
+            return f"settings:{debug}:{await config.get()}"
+
+        def make_agent(agent: typing.Annotated[str, lambda request: request.headers["user-agent"]]) -> str:
+            return agent  # pragma: no cover
+
+        def view(
+            settings: typing.Annotated[str, FactoryResolver(make_settings, scope=DependencyScope.SINGLETON)],
+            agent: typing.Annotated[str, FactoryResolver(make_agent, scope=DependencyScope.SINGLETON)],
+        ) -> None: ...
+
+        results = await warm_up_dependencies(create_dependency_specs(view))
+        assert [result.spec.param_name for result in results] == ["config", "settings"]
+        assert calls == ["config", "settings"]
+
+    async def test_app_scope(self) -> None:
+        def view(
+            value: typing.Annotated[str, FactoryResolver(lambda: "app", scope=DependencyScope.APP)],
+        ) -> None: ...
+
+        specs = create_dependency_specs(view)
+        assert await warm_up_dependencies(specs) == []
+
+        async with ApplicationDependencies() as app_dependencies:
+            results = await warm_up_dependencies(specs, app_dependencies=app_dependencies)
+            assert len(results) == 1
+            assert [shared.value for shared in app_dependencies.values.values()] == ["app"]
+
+    async def test_skips_context_managed_singletons(self) -> None:
+        class Pool:
+            closed = False
+
+            def __enter__(self) -> "Pool":
+                return self
+
+            def __exit__(self, *args: typing.Any) -> None:
+                self.closed = True
+
+        def make_service(pool: typing.Annotated[Pool, FactoryResolver(Pool)]) -> str:
+            return "service"
+
+        def view(
+            pool: typing.Annotated[Pool, FactoryResolver(Pool, scope=DependencyScope.SINGLETON)],
+            service: typing.Annotated[str, FactoryResolver(make_service, scope=DependencyScope.SINGLETON)],
+        ) -> None: ...
+
+        specs = create_dependency_specs(view)
+        assert await warm_up_dependencies(specs) == []
+
+        async with resolve_dependencies(Request({"type": "http"}), specs) as dependencies:
+            assert not dependencies["pool"].closed
+
+    async def test_reports_errors(self) -> None:
+        def factory() -> str:
+            raise ValueError("boom")
+
+        def view(value: typing.Annotated[str, FactoryResolver(factory, scope=DependencyScope.SINGLETON)]) -> None: ...
+
+        (result,) = await warm_up_dependencies(create_dependency_specs(view))
+        assert isinstance(result.error, ValueError)
+
+
 class TestVariableResolver:
     async def test_variable_resolver(self) -> None:
         resolver = VariableResolver("abc")
@@ -637,3 +1380,1027 @@ class TestGuessResolverType:
         request = Request({"type": "http"})
         async with resolve_dependencies(request, resolvers) as dependencies:
             assert dependencies == {"req": "value"}
+
+
+class TestAnnotationCache:
+    def test_shares_resolvers_of_same_annotation(self) -> None:
+        Value = typing.Annotated[str, lambda r: "value"]
+        Factory = typing.Annotated[str, lambda: "value"]
+
+        def view(first: Value, second: Factory, unannotated: int) -> None: ...
+
+        def other_view(value: Value, factory: Factory | None, other: str) -> None: ...
+
+        first, second, unannotated = create_dependency_specs(view)
+        value, factory, other = create_dependency_specs(other_view)
+        assert first.resolver is value.resolver
+        assert second.resolver is not factory.resolver  # Optional[Factory] is a different annotation
+        assert unannotated.resolver is other.resolver
+        assert (value.param_name, value.param_type, factory.optional) == ("value", str, True)
+
+    def test_resolver_options_are_not_shared(self) -> None:
+        Value = typing.Annotated[str, "option", "value"]
+
+        def view(first: Value, second: Value) -> None: ...
+
+        first, second = create_dependency_specs(view)
+        assert first.resolver is second.resolver
+        assert first.resolver_options == second.resolver_options == ["option"]
+        assert first.resolver_options is not second.resolver_options
+
+    async def test_lazy_specs_are_not_shared(self) -> None:
+        ParamName = typing.Annotated[str, RequestResolver(lambda r, s: s.param_name)]
+
+        def view(first: Lazy[ParamName], second: Lazy[ParamName]) -> None: ...
+
+        async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+            assert await dependencies["first"] == "first"
+            assert await dependencies["second"] == "second"
+
+
+class TestResolutionPlan:
+    async def test_flattens_dependency_tree(self) -> None:
+        def grandparent() -> str:
+            return "grandparent"
+
+        def parent(value: typing.Annotated[str, FactoryResolver(grandparent)]) -> str:
+            return value + " parent"
+
+        def child(value: typing.Annotated[str, FactoryResolver(parent)], suffix: typing.Annotated[str, "!"]) -> str:
+            return value + " child" + suffix
+
+        def view(dep: typing.Annotated[str, FactoryResolver(child)], other: _IntDependency) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view))
+        assert [step.spec.param_name for step in plan.steps] == ["value", "value", "suffix", "dep", "other"]
+        assert plan.steps[1].arguments == (("value", 0),)
+        assert plan.steps[3].arguments == (("value", 1), ("suffix", 2))
+        assert plan.outputs == (("dep", 3), ("other", 4))
+
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"dep": "grandparent parent child!", "other": 42}
+
+    def test_does_not_inline_scoped_factories(self) -> None:
+        def view(
+            singleton: typing.Annotated[str, FactoryResolver(resolver_two, scope=DependencyScope.SINGLETON)],
+            request: typing.Annotated[str, FactoryResolver(resolver_two, scope=DependencyScope.REQUEST)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view))
+        assert len(plan.steps) == 2
+        assert all(step.factory is None for step in plan.steps)
+
+
+class TestDeduplicatedResolutionPlan:
+    @pytest.mark.parametrize("options", [{}, {"compiled": True}, {"concurrent": True}])
+    async def test_calls_shared_factories_once(self, options: dict[str, typing.Any]) -> None:
+        calls: list[str] = []
+
+        @contextlib.asynccontextmanager
+        async def open_session() -> typing.AsyncGenerator[object, None]:
+            calls.append("open")
+            yield object()
+            calls.append("close")
+
+        Session = typing.Annotated[object, FactoryResolver(open_session)]
+
+        def users(session: Session) -> object:
+            return session
+
+        async def orders(session: Session) -> object:
+            return session
+
+        def view(
+            users: typing.Annotated[object, FactoryResolver(users)],
+            orders: typing.Annotated[object, FactoryResolver(orders)],
+            session: Session,
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), deduplicate=True, **options)
+        assert [step.spec.param_name for step in plan.steps] == ["session", "users", "orders"]
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies["users"] is dependencies["orders"] is dependencies["session"]
+        assert calls == ["open", "close"]
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), **options)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies["users"] is not dependencies["orders"]
+        assert calls == ["open", "close"] + ["open"] * 3 + ["close"] * 3
+
+    @pytest.mark.parametrize("concurrent", [False, True])
+    async def test_shares_factories_with_scoped_dependents(self, concurrent: bool) -> None:
+        calls: list[object] = []
+
+        async def open_session() -> object:
+            await anyio.sleep(0)
+            calls.append(object())
+            return calls[-1]
+
+        Session = typing.Annotated[object, FactoryResolver(open_session)]
+
+        async def users(session: Session) -> object:
+            return session
+
+        async def orders(session: Session) -> object:
+            return session
+
+        def view(
+            users: typing.Annotated[object, FactoryResolver(users, scope=DependencyScope.REQUEST)],
+            orders: typing.Annotated[object, FactoryResolver(orders)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), deduplicate=True, concurrent=concurrent)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies["users"] is dependencies["orders"]
+        assert len(calls) == 1
+
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies["users"] is calls[1]
+        assert len(calls) == 2
+
+    @pytest.mark.parametrize("fail", [False, True])
+    async def test_concurrent_scoped_dependents_share_factories(self, fail: bool) -> None:
+        calls: list[int] = []
+
+        async def open_session() -> str:
+            calls.append(1)
+            await anyio.sleep(0.01)
+            if fail:
+                raise ValueError("failed")
+            return f"session {len(calls)}"
+
+        Session = typing.Annotated[str, FactoryResolver(open_session)]
+
+        async def users(session: Session) -> str:
+            return session
+
+        async def orders(session: Session) -> str:
+            return session
+
+        async def posts(session: Session) -> str:
+            return session
+
+        def view(
+            users: typing.Annotated[str, FactoryResolver(users, scope=DependencyScope.REQUEST)],
+            orders: typing.Annotated[str, FactoryResolver(orders, scope=DependencyScope.REQUEST)],
+            posts: typing.Annotated[str, FactoryResolver(posts, scope=DependencyScope.REQUEST)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), deduplicate=True, concurrent=True)
+        assert plan.waves == ((0, 1, 2),)
+        if fail:
+            with pytest.raises(ValueError):
+                await solve_dependencies(Request({"type": "http"}), plan)
+        else:
+            assert await solve_dependencies(Request({"type": "http"}), plan) == {
+                "users": "session 1",
+                "orders": "session 1",
+                "posts": "session 1",
+            }
+        assert calls == [1]
+
+    async def test_shares_factories_with_lazy_dependencies(self) -> None:
+        calls: list[int] = []
+
+        async def make_value() -> str:
+            calls.append(1)
+            # the first call is cancelled
+            await anyio.sleep(1 if len(calls) == 1 else 0)
+            return f"value {len(calls)}"
+
+        Value = typing.Annotated[str, FactoryResolver(make_value)]
+
+        def view(lazy: Lazy[Value], other: Lazy[Value]) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), deduplicate=True)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            with anyio.move_on_after(0.01):
+                await dependencies["lazy"].get()
+            assert await dependencies["lazy"].get() == "value 2"
+            assert await dependencies["other"].get() == "value 2"
+        assert len(calls) == 2
+
+    @pytest.mark.parametrize("scope", [DependencyScope.APP, DependencyScope.SINGLETON, None])
+    async def test_long_lived_values_do_not_capture_shared_values(self, scope: DependencyScope | None) -> None:
+        class Session:
+            closed = False
+
+        @contextlib.contextmanager
+        def open_session() -> typing.Generator[Session, None, None]:
+            session = Session()
+            yield session
+            session.closed = True
+
+        DbSession = typing.Annotated[Session, FactoryResolver(open_session)]
+
+        def make_repository(session: DbSession) -> Session:
+            return session
+
+        resolver = CachedResolver(make_repository) if scope is None else FactoryResolver(make_repository, scope=scope)
+
+        def view(session: DbSession, repository: typing.Annotated[Session, resolver]) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), deduplicate=True)
+        async with ApplicationDependencies() as app_dependencies:
+            for _ in range(2):
+                request = Request({"type": "http", "state": {APP_DEPENDENCIES_KEY: app_dependencies}})
+                async with resolve_dependencies(request, plan) as dependencies:
+                    assert dependencies["session"] is not dependencies["repository"]
+                    assert not dependencies["session"].closed
+
+    async def test_checks_optional_and_required_usages_separately(self) -> None:
+        calls: list[None] = []
+        resolver = FactoryResolver(lambda: calls.append(None))
+
+        def view(
+            optional: typing.Annotated[str, resolver] | None,
+            required: typing.Annotated[str, resolver],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), deduplicate=True)
+        assert len(plan.steps) == 2
+        with pytest.raises(DependencyRequiresValueError, match='"required" has None value'):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+        assert calls == [None]
+
+
+class TestConcurrentResolutionPlan:
+    def test_groups_steps_into_waves(self) -> None:
+        async def user() -> str:
+            return "user"
+
+        async def flags() -> str:
+            return "flags"
+
+        def page(
+            user: typing.Annotated[str, FactoryResolver(user)], flags: typing.Annotated[str, FactoryResolver(flags)]
+        ) -> str:
+            return user + flags
+
+        def view(page: typing.Annotated[str, FactoryResolver(page)], value: typing.Annotated[str, "value"]) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        assert plan.waves == ((0, 1, 3), (2,))
+        assert [step.is_async for step in plan.steps] == [True, True, False, False]
+
+    async def test_resolves_async_siblings_concurrently(self) -> None:
+        event = anyio.Event()
+
+        async def waiter() -> str:
+            with anyio.fail_after(1):
+                await event.wait()
+            return "waited"
+
+        async def setter() -> str:
+            event.set()
+            return "set"
+
+        def view(
+            first: typing.Annotated[str, FactoryResolver(waiter)],
+            second: typing.Annotated[str, FactoryResolver(setter)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"first": "waited", "second": "set"}
+
+    async def test_shares_request_scoped_dependency_of_siblings(self) -> None:
+        calls: list[object] = []
+
+        async def open_session() -> object:
+            await anyio.sleep(0)
+            calls.append(object())
+            return calls[-1]
+
+        Session = typing.Annotated[object, FactoryResolver(open_session, scope=DependencyScope.REQUEST)]
+
+        async def users(session: Session) -> object:
+            return session
+
+        async def orders(session: Session) -> object:
+            return session
+
+        def view(
+            users: typing.Annotated[object, FactoryResolver(users)],
+            orders: typing.Annotated[object, FactoryResolver(orders)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        request = Request({"type": "http"})
+        async with resolve_dependencies(request, plan) as dependencies:
+            assert dependencies["users"] is dependencies["orders"]
+        assert len(calls) == 1
+        assert list(get_request_cache(request.scope).values()) == calls
+
+    async def test_request_scoped_failure_is_shared_by_siblings(self) -> None:
+        calls: list[int] = []
+
+        async def open_session() -> object:
+            calls.append(1)
+            await anyio.sleep(0)
+            raise ValueError("failed")
+
+        Session = typing.Annotated[object, FactoryResolver(open_session, scope=DependencyScope.REQUEST)]
+
+        async def users(session: Session) -> object:
+            return session  # pragma: no cover
+
+        async def orders(session: Session) -> object:
+            return session  # pragma: no cover
+
+        def view(
+            users: typing.Annotated[object, FactoryResolver(users)],
+            orders: typing.Annotated[object, FactoryResolver(orders)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        with pytest.raises(ValueError):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+        assert calls == [1]
+
+    @pytest.mark.parametrize("fail", [False, True])
+    async def test_shares_request_scoped_dependency_of_scoped_siblings(self, fail: bool) -> None:
+        calls: list[int] = []
+
+        async def open_session() -> str:
+            calls.append(1)
+            await anyio.sleep(0.01)
+            if fail:
+                raise ValueError("failed")
+            return "session"
+
+        Session = typing.Annotated[str, FactoryResolver(open_session, scope=DependencyScope.REQUEST)]
+
+        async def users(session: Session) -> str:
+            return session
+
+        async def orders(session: Session) -> str:
+            return session
+
+        async def posts(session: Session) -> str:
+            return session
+
+        # scoped factories resolve their dependencies in their own plans, so the siblings wait for each other
+        def view(
+            users: typing.Annotated[str, FactoryResolver(users, scope=DependencyScope.REQUEST)],
+            orders: typing.Annotated[str, FactoryResolver(orders, scope=DependencyScope.REQUEST)],
+            posts: typing.Annotated[str, FactoryResolver(posts, scope=DependencyScope.REQUEST)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        assert plan.waves == ((0, 1, 2),)
+        if fail:
+            with pytest.raises(ValueError):
+                await solve_dependencies(Request({"type": "http"}), plan)
+        else:
+            dependencies = await solve_dependencies(Request({"type": "http"}), plan)
+            assert dependencies == {"users": "session", "orders": "session", "posts": "session"}
+        assert calls == [1]
+
+    async def test_raises_first_error_in_plan_order(self) -> None:
+        async def slow_failure() -> str:
+            await anyio.sleep(0.01)
+            raise ValueError("first")
+
+        async def fast_failure() -> str:
+            raise KeyError("second")
+
+        def view(
+            first: typing.Annotated[str, FactoryResolver(slow_failure)],
+            second: typing.Annotated[str, FactoryResolver(fast_failure)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        with pytest.raises(ValueError, match="first"):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+
+    async def test_keeps_teardown_order(self) -> None:
+        events: list[str] = []
+
+        def make_factory(name: str, delay: float) -> typing.Callable[[], typing.AsyncContextManager[str]]:
+            @contextlib.asynccontextmanager
+            async def factory() -> typing.AsyncGenerator[str, None]:
+                await anyio.sleep(delay)
+                events.append(f"enter {name}")
+                yield name
+                events.append(f"exit {name}")
+
+            return factory
+
+        async def first() -> typing.AsyncContextManager[str]:
+            return make_factory("first", 0.01)()
+
+        async def second() -> typing.AsyncContextManager[str]:
+            return make_factory("second", 0)()
+
+        def view(
+            first: typing.Annotated[str, FactoryResolver(first)],
+            second: typing.Annotated[str, FactoryResolver(second)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"first": "first", "second": "second"}
+        assert events == ["enter first", "enter second", "exit second", "exit first"]
+
+    async def test_enters_context_managers_in_parent_task(self) -> None:
+        variable: contextvars.ContextVar[str] = contextvars.ContextVar("variable", default="")
+
+        @contextlib.asynccontextmanager
+        async def set_variable(value: str) -> typing.AsyncGenerator[str, None]:
+            token = variable.set(value)
+            with anyio.CancelScope():
+                yield value
+            variable.reset(token)
+
+        async def first() -> typing.AsyncContextManager[str]:
+            return set_variable("first")
+
+        async def second() -> typing.AsyncContextManager[str]:
+            await anyio.sleep(0)
+            return set_variable("second")
+
+        def view(
+            first: typing.Annotated[str, FactoryResolver(first)],
+            second: typing.Annotated[str, FactoryResolver(second)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"first": "first", "second": "second"}
+            assert variable.get() == "second"
+        assert variable.get() == ""
+
+    async def test_closes_context_managers_of_failed_wave(self) -> None:
+        events: list[str] = []
+
+        @contextlib.asynccontextmanager
+        async def open_session() -> typing.AsyncGenerator[str, None]:
+            try:
+                yield "session"
+            finally:
+                events.append("closed")
+
+        async def failing() -> typing.AsyncContextManager[str]:
+            raise ValueError("failed")
+
+        async def session() -> typing.AsyncContextManager[str]:
+            return open_session()
+
+        async def none() -> typing.AsyncContextManager[str]:
+            return contextlib.nullcontext(typing.cast(str, None))
+
+        def view(
+            failing: typing.Annotated[str, FactoryResolver(failing)],
+            session: typing.Annotated[str, FactoryResolver(session)],
+            none: typing.Annotated[str, FactoryResolver(none)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        with pytest.raises(ValueError, match="failed"):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+        assert events == ["closed"]
+
+        plan = ResolutionPlan.build(create_dependency_specs(view)[1:], concurrent=True)
+        with pytest.raises(DependencyRequiresValueError, match='"none" has None value'):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+
+    async def test_resolves_context_managed_scoped_factories_in_parent_task(self) -> None:
+        @contextlib.asynccontextmanager
+        async def open_session() -> typing.AsyncGenerator[str, None]:
+            yield "session"
+
+        async def users(session: typing.Annotated[str, FactoryResolver(open_session)]) -> str:
+            return session
+
+        async def flags() -> str:
+            return "flags"
+
+        def view(
+            users: typing.Annotated[str, FactoryResolver(users, scope=DependencyScope.REQUEST)],
+            flags: typing.Annotated[str, FactoryResolver(flags)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=True)
+        assert [step.is_async for step in plan.steps] == [False, True]
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"users": "session", "flags": "flags"}
+
+
+class TestExitStackAnalysis:
+    def test_factory_return_annotation(self) -> None:
+        class Resource:
+            def __enter__(self) -> str:
+                return "resource"
+
+            def __exit__(self, *args: typing.Any) -> None: ...
+
+        def plain() -> str:
+            return ""
+
+        async def async_plain() -> dict[str, str]:
+            return {}
+
+        def optional() -> str | None:
+            return None
+
+        def unannotated():  # type: ignore[no-untyped-def]
+            return ""
+
+        def context_manager() -> typing.ContextManager[str]:
+            return contextlib.nullcontext("")
+
+        def maybe_resource() -> Resource | None:
+            return None
+
+        @contextlib.asynccontextmanager
+        async def decorated() -> typing.AsyncGenerator[str, None]:
+            yield ""
+
+        def returns_none() -> None: ...
+
+        assert not FactoryResolver(plain).requires_exit_stacks
+        assert not FactoryResolver(async_plain).requires_exit_stacks
+        assert not FactoryResolver(optional).requires_exit_stacks
+        assert FactoryResolver(unannotated).requires_exit_stacks
+        assert FactoryResolver(context_manager).requires_exit_stacks
+        assert FactoryResolver(maybe_resource).requires_exit_stacks
+        assert FactoryResolver(decorated).requires_exit_stacks
+        assert FactoryResolver(Resource).requires_exit_stacks
+        assert not FactoryResolver(returns_none).requires_exit_stacks
+
+    @pytest.mark.parametrize("compile_plan", [True, False])
+    async def test_broad_return_annotations(self, compile_plan: bool) -> None:
+        events: list[str] = []
+
+        class Connection:
+            pass
+
+        class PooledConnection(Connection, contextlib.AbstractContextManager["PooledConnection"]):
+            def __exit__(self, *args: typing.Any) -> None:
+                events.append("released")
+
+        class Closeable(typing.Protocol):
+            def close(self) -> None: ...
+
+        @typing.final
+        class Settings:
+            pass
+
+        def any_factory() -> typing.Any:
+            return contextlib.nullcontext("any")
+
+        def base_class_factory() -> Connection:
+            return PooledConnection()
+
+        def protocol_factory() -> Closeable:
+            return contextlib.nullcontext("protocol")  # type: ignore[return-value]
+
+        def view(
+            any_value: typing.Annotated[str, FactoryResolver(any_factory)],
+            connection: typing.Annotated[Connection, FactoryResolver(base_class_factory)],
+            closeable: typing.Annotated[str, FactoryResolver(protocol_factory)],
+        ) -> None: ...
+
+        def final_factory() -> Settings:
+            return Settings()
+
+        assert FactoryResolver(any_factory).requires_exit_stacks
+        assert FactoryResolver(base_class_factory).requires_exit_stacks
+        assert FactoryResolver(protocol_factory).requires_exit_stacks
+        assert not FactoryResolver(final_factory).requires_exit_stacks
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), compiled=compile_plan)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies["any_value"] == "any"
+            assert isinstance(dependencies["connection"], PooledConnection)
+            assert dependencies["closeable"] == "protocol"
+            assert events == []
+        assert events == ["released"]
+
+    def test_factory_with_context_managed_subdependency(self) -> None:
+        @contextlib.contextmanager
+        def parent() -> typing.Generator[str, None, None]:
+            yield ""
+
+        def child(value: typing.Annotated[str, parent]) -> str:
+            return value
+
+        assert FactoryResolver(child).requires_exit_stacks
+        assert FactoryResolver(child, scope=DependencyScope.SINGLETON).requires_exit_stacks
+
+    def test_plan_without_context_managers(self) -> None:
+        def view(
+            request: Request,
+            connection: HTTPConnection,
+            spec: DependencySpec,
+            value: typing.Annotated[str, "value"],
+            from_request: typing.Annotated[str, RequestResolver(lambda r: "value")],
+            factory: _IntDependency,
+        ) -> None: ...
+
+        assert not ResolutionPlan.build(create_dependency_specs(view)).requires_exit_stacks
+
+    def test_plan_with_unknown_resolvers(self) -> None:
+        class CustomResolver(DependencyResolver):
+            async def resolve(self, context: ResolveContext, spec: DependencySpec) -> typing.Any: ...
+
+        class AppService: ...
+
+        def custom_view(value: typing.Annotated[str, CustomResolver()]) -> None: ...
+
+        def static_view(value: AppService) -> None: ...
+
+        assert ResolutionPlan.build(create_dependency_specs(custom_view)).requires_exit_stacks
+        assert ResolutionPlan.build(create_dependency_specs(static_view)).requires_exit_stacks
+
+    async def test_solve_dependencies(self) -> None:
+        def view(request: Request, dep: _IntDependency) -> None: ...
+
+        request = Request({"type": "http"})
+        plan = ResolutionPlan.build(create_dependency_specs(view))
+        static: dict[typing.Any, DependencyResolver] = {Request: VariableResolver(request)}
+        assert await solve_dependencies(request, plan, static) == {"request": request, "dep": 42}
+
+    async def test_solve_dependencies_rejects_context_managed_plans(self) -> None:
+        @contextlib.contextmanager
+        def factory() -> typing.Generator[str, None, None]:
+            yield ""
+
+        def view(dep: typing.Annotated[str, factory]) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view))
+        with pytest.raises(ValueError, match="use resolve_dependencies"):
+            await solve_dependencies(Request({"type": "http"}), plan)
+
+
+class TestCompiledResolutionPlan:
+    async def test_resolves_same_values_as_interpreter(self) -> None:
+        class CustomResolver(DependencyResolver):
+            async def resolve(self, context: ResolveContext, spec: DependencySpec) -> typing.Any:
+                return "custom " + spec.param_name
+
+        @contextlib.contextmanager
+        def managed() -> typing.Generator[str, None, None]:
+            yield "managed"
+
+        async def parent(value: typing.Annotated[str, "variable"]) -> str:
+            return value + " parent"
+
+        def child(
+            spec: DependencySpec,
+            value: typing.Annotated[str, FactoryResolver(parent)],
+            *,
+            suffix: typing.Annotated[str, managed],
+        ) -> str:
+            return f"{spec.param_name} {value} {suffix}"
+
+        def view(
+            request: Request,
+            child: typing.Annotated[str, FactoryResolver(child)],
+            from_request: typing.Annotated[str, RequestResolver(lambda r: type(r).__name__)],
+            from_spec: typing.Annotated[str, RequestResolver(lambda r, s: s.param_name)],
+            custom: typing.Annotated[str, CustomResolver()],
+            singleton: typing.Annotated[int, FactoryResolver(resolver_one, scope=DependencyScope.SINGLETON)],
+            optional: typing.Annotated[str | None, None],
+        ) -> None: ...
+
+        request = Request({"type": "http"})
+        static: dict[typing.Any, DependencyResolver] = {Request: VariableResolver(request)}
+        interpreted = ResolutionPlan.build(create_dependency_specs(view))
+        compiled = ResolutionPlan.build(create_dependency_specs(view), compiled=True)
+        assert compiled.executor != compiled.execute
+
+        async with resolve_dependencies(request, interpreted, static) as expected:
+            async with resolve_dependencies(request, compiled, static) as dependencies:
+                assert dependencies == expected
+                assert dependencies == {
+                    "request": request,
+                    "child": "spec variable parent managed",
+                    "from_request": "Request",
+                    "from_spec": "from_spec",
+                    "custom": "custom custom",
+                    "singleton": 42,
+                    "optional": None,
+                }
+
+    async def test_raises_for_none_values(self) -> None:
+        def view(value: typing.Annotated[str, FactoryResolver(lambda: None)]) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), compiled=True)
+        with pytest.raises(DependencyRequiresValueError, match='"value" has None value'):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+
+    def test_concurrent_plans_are_interpreted(self) -> None:
+        def view(value: _IntDependency) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), compiled=True, concurrent=True)
+        assert plan.executor == plan.execute
+
+
+class _RecordingHooks(ResolutionHooks):
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str | None]] = []
+        self.events: dict[str, ResolveEvent] = {}
+
+    def before_resolve(self, context: ResolveContext, spec: DependencySpec) -> None:
+        self.calls.append(("before", spec.param_name))
+
+    def after_resolve(self, context: ResolveContext, event: ResolveEvent) -> None:
+        self.calls.append(("after", event.spec.param_name))
+        self.events[event.spec.param_name] = event
+
+    def context_entered(self, context: ResolveContext, spec: DependencySpec | None, elapsed: float) -> None:
+        self.calls.append(("entered", spec.param_name if spec else None))
+
+    def context_exited(self, context: ResolveContext, spec: DependencySpec | None, elapsed: float) -> None:
+        self.calls.append(("exited", spec.param_name if spec else None))
+
+
+class TestResolutionHooks:
+    @pytest.mark.parametrize("concurrent", [False, True])
+    async def test_fires_around_resolver_calls(self, concurrent: bool) -> None:
+        def parent() -> int:
+            return 1
+
+        async def child(value: typing.Annotated[int, FactoryResolver(parent)]) -> int:
+            return value + 1
+
+        def view(child: typing.Annotated[int, FactoryResolver(child)]) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), concurrent=concurrent, hooks=hooks)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"child": 2}
+
+        assert hooks.calls == [("before", "value"), ("after", "value"), ("before", "child"), ("after", "child")]
+        event = hooks.events["child"]
+        assert event.scope == DependencyScope.TRANSIENT
+        assert event.cache_hit is False
+        assert event.elapsed >= 0
+        assert event.error is None
+
+    async def test_reports_cache_hits(self) -> None:
+        resolver = FactoryResolver(resolver_one, scope=DependencyScope.REQUEST)
+
+        def view(
+            first: typing.Annotated[int, resolver],
+            second: typing.Annotated[int, resolver],
+            variable: typing.Annotated[str, VariableResolver("value")],
+        ) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), hooks=hooks)
+        async with resolve_dependencies(Request({"type": "http"}), plan):
+            pass
+
+        assert hooks.events["first"].cache_hit is False
+        assert hooks.events["second"].cache_hit is True
+        assert hooks.events["second"].scope == DependencyScope.REQUEST
+        assert hooks.events["variable"].scope is None
+        assert isinstance(hooks.events["variable"].resolver, VariableResolver)
+
+    async def test_reports_cache_hits_of_long_lived_values(self) -> None:
+        def view(
+            singleton: typing.Annotated[int, FactoryResolver(resolver_one, scope=DependencyScope.SINGLETON)],
+            app: typing.Annotated[int, FactoryResolver(resolver_one, scope=DependencyScope.APP)],
+            cached: typing.Annotated[int, CachedResolver(resolver_one)],
+        ) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), hooks=hooks)
+        cache_hits: list[dict[str, bool | None]] = []
+        async with ApplicationDependencies() as app_dependencies:
+            for _ in range(2):
+                request = Request({"type": "http", "state": {APP_DEPENDENCIES_KEY: app_dependencies}})
+                await solve_dependencies(request, plan)
+                cache_hits.append({name: event.cache_hit for name, event in hooks.events.items()})
+
+        # the cache key of cached resolvers is known only after resolving the factory dependencies
+        assert cache_hits == [
+            {"singleton": False, "app": False, "cached": None},
+            {"singleton": True, "app": True, "cached": None},
+        ]
+
+    async def test_reports_errors(self) -> None:
+        def factory() -> int:
+            raise ValueError("failed")
+
+        def view(value: typing.Annotated[int, FactoryResolver(factory)]) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), hooks=hooks)
+        with pytest.raises(ValueError):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+
+        assert isinstance(hooks.events["value"].error, ValueError)
+
+    async def test_context_managers(self) -> None:
+        @contextlib.contextmanager
+        def sync_factory() -> typing.Generator[int, None, None]:
+            yield 1
+
+        @contextlib.asynccontextmanager
+        async def async_factory() -> typing.AsyncGenerator[int, None]:
+            yield 2
+
+        def view(
+            first: typing.Annotated[int, FactoryResolver(sync_factory)],
+            second: typing.Annotated[int, FactoryResolver(async_factory)],
+        ) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), hooks=hooks)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"first": 1, "second": 2}
+            assert ("exited", "first") not in hooks.calls
+
+        assert hooks.calls == [
+            ("before", "first"),
+            ("entered", "first"),
+            ("after", "first"),
+            ("before", "second"),
+            ("entered", "second"),
+            ("after", "second"),
+            ("exited", "second"),
+            ("exited", "first"),
+        ]
+
+    async def test_context_managers_of_concurrent_factories(self) -> None:
+        @contextlib.asynccontextmanager
+        async def open_resource(value: str) -> typing.AsyncGenerator[str, None]:
+            yield value
+
+        async def first() -> typing.AsyncContextManager[str]:
+            return open_resource("first")
+
+        async def second() -> typing.AsyncContextManager[str]:
+            await anyio.sleep(0)
+            return open_resource("second")
+
+        def view(
+            first: typing.Annotated[str, FactoryResolver(first)],
+            second: typing.Annotated[str, FactoryResolver(second)],
+        ) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), hooks=hooks, concurrent=True)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"first": "first", "second": "second"}
+
+        # factories are called in tasks, the returned context managers are entered by the request in plan order
+        assert sorted(hooks.calls[:4]) == [
+            ("after", "first"),
+            ("after", "second"),
+            ("before", "first"),
+            ("before", "second"),
+        ]
+        assert hooks.calls[4:] == [
+            ("entered", "first"),
+            ("entered", "second"),
+            ("exited", "second"),
+            ("exited", "first"),
+        ]
+
+    @pytest.mark.parametrize("is_async", [False, True])
+    async def test_failed_enter_is_not_exited(self, is_async: bool) -> None:
+        @contextlib.contextmanager
+        def opened() -> typing.Generator[int, None, None]:
+            yield 1
+
+        @contextlib.contextmanager
+        def failing() -> typing.Generator[int, None, None]:
+            raise ValueError("cannot connect")
+            yield  # pragma: no cover
+
+        @contextlib.asynccontextmanager
+        async def async_failing() -> typing.AsyncGenerator[int, None]:
+            raise ValueError("cannot connect")
+            yield  # pragma: no cover
+
+        def view(
+            first: typing.Annotated[int, FactoryResolver(opened)],
+            second: typing.Annotated[int, FactoryResolver(async_failing if is_async else failing)],
+        ) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), hooks=hooks)
+        with pytest.raises(ValueError, match="cannot connect"):
+            async with resolve_dependencies(Request({"type": "http"}), plan):
+                pass  # pragma: no cover
+
+        assert ("exited", "second") not in hooks.calls
+        assert ("entered", "second") not in hooks.calls
+        assert hooks.calls[-1] == ("exited", "first")
+
+    async def test_lazy_dependencies(self) -> None:
+        def view(value: Lazy[typing.Annotated[int, FactoryResolver(resolver_one)]]) -> None: ...
+
+        hooks = _RecordingHooks()
+        plan = ResolutionPlan.build(create_dependency_specs(view), hooks=hooks)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert hooks.calls == [("before", "value"), ("after", "value")]
+            assert await dependencies["value"] == 42
+
+        assert hooks.calls == [("before", "value"), ("after", "value")] * 2
+
+    def test_disables_compilation(self) -> None:
+        def view(value: _IntDependency) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), compiled=True, hooks=ResolutionHooks())
+        assert not plan.compiled
+        assert plan.executor == plan.execute
+
+
+def _thread_id() -> int:
+    return threading.get_ident()
+
+
+class TestFactoryExecutor:
+    async def test_inline_by_default(self) -> None:
+        def view(thread_id: typing.Annotated[int, FactoryResolver(_thread_id)]) -> None: ...
+
+        async with resolve_dependencies(Request({"type": "http"}), create_dependency_specs(view)) as dependencies:
+            assert dependencies == {"thread_id": threading.get_ident()}
+
+    @pytest.mark.parametrize("compiled", [False, True])
+    async def test_threadpool(self, compiled: bool) -> None:
+        def view(
+            thread_id: typing.Annotated[int, FactoryResolver(_thread_id, executor=FactoryExecutor.THREADPOOL)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(create_dependency_specs(view), compiled=compiled)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies["thread_id"] != threading.get_ident()
+
+    @pytest.mark.parametrize("compiled", [False, True])
+    async def test_custom_executor(self, compiled: bool) -> None:
+        with concurrent.futures.ThreadPoolExecutor(thread_name_prefix="factory") as executor:
+
+            def factory() -> str:
+                return threading.current_thread().name
+
+            def view(thread_name: typing.Annotated[str, FactoryResolver(factory, executor=executor)]) -> None: ...
+
+            plan = ResolutionPlan.build(create_dependency_specs(view), compiled=compiled)
+            async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+                assert dependencies["thread_name"].startswith("factory")
+
+    @pytest.mark.parametrize("compiled", [False, True])
+    @pytest.mark.parametrize("with_hooks", [False, True])
+    async def test_enters_context_managers_in_executor(self, compiled: bool, with_hooks: bool) -> None:
+        threads: list[tuple[str, int]] = []
+
+        @contextlib.contextmanager
+        def connect() -> typing.Generator[str, None, None]:
+            threads.append(("enter", threading.get_ident()))
+            yield "connection"
+            threads.append(("exit", threading.get_ident()))
+
+        def view(
+            connection: typing.Annotated[str, FactoryResolver(connect, executor=FactoryExecutor.THREADPOOL)],
+        ) -> None: ...
+
+        hooks = _RecordingHooks() if with_hooks else None
+        plan = ResolutionPlan.build(create_dependency_specs(view), compiled=compiled, hooks=hooks)
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies == {"connection": "connection"}
+
+        assert [event for event, _ in threads] == ["enter", "exit"]
+        assert all(thread_id != threading.get_ident() for _, thread_id in threads)
+        if hooks is not None:
+            assert ("entered", "connection") in hooks.calls
+            assert hooks.calls[-1] == ("exited", "connection")
+
+    @pytest.mark.parametrize("compiled", [False, True])
+    async def test_default_executor(self, compiled: bool) -> None:
+        def view(
+            default: typing.Annotated[int, FactoryResolver(_thread_id)],
+            inline: typing.Annotated[int, FactoryResolver(_thread_id, executor=FactoryExecutor.INLINE)],
+            scoped: typing.Annotated[int, FactoryResolver(_thread_id, scope=DependencyScope.REQUEST)],
+        ) -> None: ...
+
+        plan = ResolutionPlan.build(
+            create_dependency_specs(view), compiled=compiled, factory_executor=FactoryExecutor.THREADPOOL
+        )
+        async with resolve_dependencies(Request({"type": "http"}), plan) as dependencies:
+            assert dependencies["default"] != threading.get_ident()
+            assert dependencies["inline"] == threading.get_ident()
+            assert dependencies["scoped"] != threading.get_ident()
+
+    def test_offloaded_factories_run_concurrently(self) -> None:
+        def view(
+            first: typing.Annotated[int, FactoryResolver(_thread_id)],
+            second: typing.Annotated[int, FactoryResolver(_thread_id)],
+        ) -> None: ...
+
+        specs = create_dependency_specs(view)
+        plan = ResolutionPlan.build(specs, concurrent=True, factory_executor=FactoryExecutor.THREADPOOL)
+        assert [step.is_async for step in plan.steps] == [True, True]
@@ -0,0 +1,114 @@
+import cProfile
+import pstats
+import typing
+from pathlib import Path
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.testclient import TestClient
+
+from starlette_dispatch import FactoryResolver, RequestProfiler, RouteGroup
+
+
+def load_user() -> str:
+    return "user"
+
+
+User = typing.Annotated[str, FactoryResolver(load_user)]
+
+
+def test_profiles_requests_with_secret_header(tmp_path: Path) -> None:
+    group = RouteGroup(profiler=RequestProfiler(directory=tmp_path, secret="s3cret"))
+
+    @group.get("/users/{id}")
+    async def view(user: User) -> Response:
+        return PlainTextResponse(user)
+
+    with TestClient(Starlette(routes=group)) as client:
+        assert "x-profile" not in client.get("/users/1").headers
+        assert "x-profile" not in client.get("/users/1", headers={"x-profile": "wrong"}).headers
+
+        response = client.get("/users/1", headers={"x-profile": "s3cret"})
+
+    assert response.text == "user"
+    filename = response.headers["x-profile"]
+    assert filename.endswith(".prof")
+    assert "-GET-users_1-" in filename
+    assert [path.name for path in tmp_path.iterdir()] == [filename]
+
+    stats = pstats.Stats(str(tmp_path / filename))
+    assert any(function == "load_user" for _, _, function in stats.stats)  # type: ignore[attr-defined]
+
+
+def test_profiles_sampled_requests(tmp_path: Path) -> None:
+    group = RouteGroup(profiler=RequestProfiler(directory=tmp_path, sample_rate=1))
+
+    @group.get("/")
+    async def view(user: User) -> Response:
+        return PlainTextResponse(user)
+
+    with TestClient(Starlette(routes=group)) as client:
+        assert "x-profile" in client.get("/").headers
+
+
+def test_profile_summary() -> None:
+    group = RouteGroup(profiler=RequestProfiler(summary=True, summary_size=3, sample_rate=1))
+
+    @group.get("/")
+    async def view(user: User) -> Response:
+        return PlainTextResponse(user)
+
+    with TestClient(Starlette(routes=group)) as client:
+        response = client.get("/")
+
+    assert "x-profile" not in response.headers
+    parts = response.headers["x-profile-summary"].split(", ")
+    assert parts[0].startswith("total;dur=")
+    assert len(parts) == 4
+    assert all(part.startswith("fn;dur=") and ";calls=" in part for part in parts[1:])
+
+
+async def test_profiles_one_request_at_a_time() -> None:
+    profiler = RequestProfiler(summary=True, sample_rate=1)
+
+    async def call(request: Request) -> Response:
+        return await profiler.profile(request, endpoint)
+
+    async def endpoint(request: Request) -> Response:
+        return PlainTextResponse("ok")
+
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+    response = await profiler.profile(request, call)
+    assert "x-profile-summary" in response.headers
+
+    profiler._active = True
+    assert "x-profile-summary" not in (await profiler.profile(request, endpoint)).headers
+
+
+async def test_skips_requests_when_another_profiler_is_active(monkeypatch: pytest.MonkeyPatch) -> None:
+    def enable(self: cProfile.Profile) -> None:
+        raise ValueError("Another profiling tool is already active")
+
+    # Python 3.12+ raises when another profiler, like a debugger or coverage with sys.monitoring, is active
+    monkeypatch.setattr(cProfile.Profile, "enable", enable)
+    profiler = RequestProfiler(summary=True, sample_rate=1)
+
+    async def endpoint(request: Request) -> Response:
+        return PlainTextResponse("ok")
+
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+    response = await profiler.profile(request, endpoint)
+    assert "x-profile-summary" not in response.headers
+    assert not profiler._active
+
+
+def test_requires_output() -> None:
+    with pytest.raises(ValueError, match="Set directory or summary"):
+        RequestProfiler(sample_rate=1)
+
+
+def test_validates_sample_rate(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="sample_rate must be between 0 and 1"):
+        RequestProfiler(directory=tmp_path, sample_rate=2)
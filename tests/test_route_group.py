@@ -1,10 +1,13 @@
+import contextlib
 import functools
+import threading
 import typing
 
+import pytest
 from starlette.applications import Starlette
 from starlette.authentication import requires
 from starlette.middleware import Middleware
-from starlette.requests import Request
+from starlette.requests import HTTPConnection, Request
 from starlette.responses import PlainTextResponse, Response
 from starlette.routing import Mount, Route
 from starlette.testclient import TestClient
@@ -12,8 +15,27 @@ from starlette.types import ASGIApp, Receive, Scope, Send
 from starlette.websockets import WebSocket
 
 from starlette_dispatch.contrib.dependencies import PathParamValue
-from starlette_dispatch.injections import FactoryResolver
-from starlette_dispatch.route_group import AsyncViewCallable, RouteGroup
+from starlette_dispatch.injections import (
+    dependency_lifespan,
+    DependencyError,
+    DependencyNotFoundError,
+    DependencyScope,
+    FactoryExecutor,
+    FactoryResolver,
+    get_request_cache,
+    Lazy,
+    ResolutionHooks,
+    ResolveContext,
+    ResolveEvent,
+    VariableResolver,
+)
+from starlette_dispatch.route_group import (
+    AsyncViewCallable,
+    bind_dependency_resolvers,
+    DispatchRoute,
+    DispatchWebSocketRoute,
+    RouteGroup,
+)
 
 
 class _ExampleMiddleware:
@@ -82,6 +104,158 @@ def test_getattr(route_group: RouteGroup) -> None:
     assert len(routes) == 2
 
 
+def test_route_exposes_resolution_plan(route_group: RouteGroup) -> None:
+    @route_group.get("/test/{injection}")
+    async def view(request: Request, injection: _Injection) -> Response:
+        return PlainTextResponse("ok")
+
+    @route_group.websocket("/ws")
+    async def websocket_view(websocket: WebSocket) -> None: ...
+
+    route = route_group[0]
+    assert isinstance(route, DispatchRoute)
+    assert [step.spec.param_name for step in route.plan.steps] == ["request", "injection"]
+
+    websocket_route = route_group[1]
+    assert isinstance(websocket_route, DispatchWebSocketRoute)
+    assert [step.spec.param_name for step in websocket_route.plan.steps] == ["websocket"]
+
+
+def test_concurrent_dependencies() -> None:
+    route_group = RouteGroup(concurrent_dependencies=True)
+
+    @route_group.get("/concurrent")
+    async def view(request: Request) -> Response:
+        return PlainTextResponse("ok")
+
+    @route_group.get("/sequential", concurrent_dependencies=False)
+    async def sequential_view(request: Request) -> Response:
+        return PlainTextResponse("ok")
+
+    @route_group.websocket("/ws")
+    async def websocket_view(websocket: WebSocket) -> None: ...
+
+    assert [typing.cast(DispatchRoute, route).plan.concurrent for route in route_group] == [True, False, True]
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/concurrent").text == "ok"
+
+
+def test_compiled_dependencies() -> None:
+    route_group = RouteGroup(compile_dependencies=True)
+
+    @route_group.get("/test/{injection}")
+    async def view(request: Request, injection: _Injection) -> Response:
+        return PlainTextResponse(injection)
+
+    route = typing.cast(DispatchRoute, route_group[0])
+    assert route.plan.compiled
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/test/compiled").text == "compiled"
+
+
+def test_deferred_dependencies() -> None:
+    route_group = RouteGroup(defer_dependencies=True)
+
+    @route_group.get("/test/{injection}")
+    async def view(request: Request, injection: _Injection) -> Response:
+        return PlainTextResponse(injection)
+
+    @route_group.websocket("/ws")
+    async def websocket_view(websocket: WebSocket, injection: _Injection) -> None:
+        await websocket.accept()
+        await websocket.send_text(injection)
+        await websocket.close()
+
+    route, websocket_route = typing.cast(list[DispatchRoute | DispatchWebSocketRoute], list(route_group))
+    assert not route.plan_ready
+    assert not websocket_route.plan_ready
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/test/deferred").text == "deferred"
+        assert route.plan_ready
+        assert not websocket_route.plan_ready
+
+    # routes added without the group have no plans
+    route_group.routes.append(Route("/plain", lambda request: PlainTextResponse("plain")))
+    route_group.prepare()
+    assert websocket_route.plan_ready
+
+
+def test_resolution_hooks() -> None:
+    class Hooks(ResolutionHooks):
+        def __init__(self) -> None:
+            self.events: list[ResolveEvent] = []
+
+        def after_resolve(self, context: ResolveContext, event: ResolveEvent) -> None:
+            self.events.append(event)
+
+    hooks = Hooks()
+    route_group = RouteGroup(hooks=hooks, compile_dependencies=True)
+
+    @route_group.get("/test/{injection}")
+    async def view(injection: _Injection) -> Response:
+        return PlainTextResponse(injection)
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/test/hooked").text == "hooked"
+    assert [event.spec.param_name for event in hooks.events] == ["injection"]
+
+
+def test_deduplicate_dependencies() -> None:
+    calls: list[int] = []
+
+    def counter() -> int:
+        calls.append(1)
+        return len(calls)
+
+    Counter = typing.Annotated[int, FactoryResolver(counter)]
+
+    def double(value: Counter) -> int:
+        return value * 2
+
+    route_group = RouteGroup(deduplicate_dependencies=True)
+
+    @route_group.get("/")
+    async def view(value: Counter, doubled: typing.Annotated[int, FactoryResolver(double)]) -> Response:
+        return PlainTextResponse(f"{value} {doubled}")
+
+    with TestClient(Starlette(routes=route_group)) as client:
+        assert client.get("/").text == "1 2"
+        assert client.get("/").text == "2 4"
+
+
+def test_deferred_dependencies_errors() -> None:
+    route_group = RouteGroup(defer_dependencies=True)
+
+    @route_group.get("/")
+    async def view(value: "_Undefined") -> Response:  # type: ignore[name-defined]  # noqa: F821
+        return PlainTextResponse("ok")
+
+    with pytest.raises(NameError):
+        route_group.prepare()
+
+
+def test_factory_executor() -> None:
+    route_group = RouteGroup(factory_executor=FactoryExecutor.THREADPOOL)
+
+    def factory() -> int:
+        return threading.get_ident()
+
+    @route_group.get("/")
+    async def view(thread_id: typing.Annotated[int, FactoryResolver(factory)]) -> Response:
+        return PlainTextResponse(str(thread_id == threading.get_ident()))
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/").text == "False"
+
+
 def test_iter(route_group: RouteGroup) -> None:
     @route_group.get("/test/{injection}")
     async def view(request: Request) -> Response:
@@ -191,6 +365,235 @@ def test_websocket_dependency_injects_websocket(route_group: RouteGroup) -> None
             assert session.receive_text() == "/test"
 
 
+def test_context_managed_dependencies(route_group: RouteGroup) -> None:
+    events: list[str] = []
+
+    @contextlib.asynccontextmanager
+    async def factory() -> typing.AsyncGenerator[str, None]:
+        yield "value"
+        events.append("closed")
+
+    @route_group.get("/")
+    async def view(dep: typing.Annotated[str, factory]) -> Response:
+        return PlainTextResponse(dep)
+
+    @route_group.websocket("/ws")
+    async def websocket_view(websocket: WebSocket, dep: typing.Annotated[str, factory]) -> None:
+        await websocket.accept()
+        await websocket.send_text(dep)
+        await websocket.close()
+
+    assert all(typing.cast(DispatchRoute, route).plan.requires_exit_stacks for route in route_group)
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/").text == "value"
+        with client.websocket_connect("/ws") as session:
+            assert session.receive_text() == "value"
+    assert events == ["closed", "closed"]
+
+
+def test_lazy_dependencies(route_group: RouteGroup) -> None:
+    events: list[str] = []
+
+    @contextlib.asynccontextmanager
+    async def factory() -> typing.AsyncGenerator[str, None]:
+        events.append("opened")
+        yield "value"
+        events.append("closed")
+
+    @route_group.get("/")
+    async def view(request: Request, dep: Lazy[typing.Annotated[str, factory]]) -> Response:
+        if "skip" in request.query_params:
+            return PlainTextResponse("skipped")
+        return PlainTextResponse(await dep)
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/?skip").text == "skipped"
+        assert events == []
+        assert client.get("/").text == "value"
+        assert events == ["opened", "closed"]
+
+
+def test_injects_application_and_connection(route_group: RouteGroup) -> None:
+    @route_group.get("/")
+    async def view(app: Starlette, request: Request, connection: HTTPConnection) -> Response:
+        return PlainTextResponse(f"{type(app).__name__} {request is connection}")
+
+    @route_group.websocket("/ws")
+    async def websocket_view(websocket: WebSocket, connection: HTTPConnection) -> None:
+        await websocket.accept()
+        await websocket.send_text(str(websocket is connection))
+        await websocket.close()
+
+    @route_group.get("/websocket")
+    async def websocket_in_http_view(websocket: WebSocket) -> Response:  # pragma: no cover
+        return PlainTextResponse("")
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/").text == "Starlette True"
+        with client.websocket_connect("/ws") as session:
+            assert session.receive_text() == "True"
+        with pytest.raises(DependencyNotFoundError):
+            client.get("/websocket")
+
+
+def test_application_resolvers(route_group: RouteGroup) -> None:
+    class Service:
+        def __init__(self, name: str) -> None:
+            self.name = name
+
+    @route_group.get("/")
+    async def view(service: Service) -> Response:
+        return PlainTextResponse(service.name)
+
+    app = Starlette(routes=route_group)
+    app.state.dependency_resolvers = {Service: VariableResolver(Service("first"))}
+    with TestClient(app) as client:
+        assert client.get("/").text == "first"
+
+        app.state.dependency_resolvers = {Service: VariableResolver(Service("second"))}
+        assert client.get("/").text == "second"
+
+        app.state.dependency_resolvers[Service] = VariableResolver(Service("third"))
+        assert client.get("/").text == "second"
+
+        bind_dependency_resolvers(app)
+        assert client.get("/").text == "third"
+
+        del app.state.dependency_resolvers
+        with pytest.raises(DependencyNotFoundError):
+            client.get("/")
+
+
+def test_request_cache_shared_with_middleware(route_group: RouteGroup) -> None:
+    resolver = FactoryResolver(lambda: "from factory", scope=DependencyScope.REQUEST)
+
+    class PrimeCacheMiddleware:
+        def __init__(self, app: ASGIApp) -> None:
+            self.app = app
+
+        async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+            get_request_cache(scope)[resolver] = "from middleware"
+            await self.app(scope, receive, send)
+
+    @route_group.get("/", middleware=[Middleware(PrimeCacheMiddleware)])
+    async def view(value: typing.Annotated[str, resolver]) -> Response:
+        return PlainTextResponse(value)
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client:
+        assert client.get("/").text == "from middleware"
+
+
+def test_app_scoped_dependencies(route_group: RouteGroup) -> None:
+    events: list[str] = []
+
+    @contextlib.asynccontextmanager
+    async def client_factory() -> typing.AsyncGenerator[str, None]:
+        events.append("open")
+        yield f"client {events.count('open')}"
+        events.append("close")
+
+    HttpClient = typing.Annotated[str, FactoryResolver(client_factory, scope=DependencyScope.APP)]
+
+    @route_group.get("/")
+    async def view(client: HttpClient) -> Response:
+        return PlainTextResponse(client)
+
+    assert not typing.cast(DispatchRoute, route_group[0]).plan.requires_exit_stacks
+
+    app = Starlette(routes=route_group, lifespan=dependency_lifespan)
+    with TestClient(app) as client:
+        assert client.get("/").text == "client 1"
+        assert client.get("/").text == "client 1"
+        assert events == ["open"]
+    assert events == ["open", "close"]
+
+    with TestClient(app) as client:
+        assert client.get("/").text == "client 2"
+    assert events == ["open", "close", "open", "close"]
+
+
+def test_warm_up_on_startup(route_group: RouteGroup) -> None:
+    events: list[str] = []
+
+    @contextlib.asynccontextmanager
+    async def client_factory() -> typing.AsyncGenerator[str, None]:
+        events.append("open")
+        yield "client"
+        events.append("close")
+
+    def make_config() -> str:
+        events.append("config")
+        return "config"
+
+    HttpClient = typing.Annotated[str, FactoryResolver(client_factory, scope=DependencyScope.APP)]
+    Config = typing.Annotated[str, FactoryResolver(make_config, scope=DependencyScope.SINGLETON)]
+
+    @route_group.get("/")
+    async def view(client: HttpClient, config: Config) -> Response:
+        return PlainTextResponse(f"{client} {config}")
+
+    app = Starlette(
+        routes=[Mount("/api", routes=route_group)], lifespan=functools.partial(dependency_lifespan, warm_up=True)
+    )
+    with TestClient(app) as client:
+        assert events == ["open", "config"]
+        assert client.get("/api/").text == "client config"
+        assert events == ["open", "config"]
+    assert events == ["open", "config", "close"]
+
+
+async def test_route_group_warm_up(route_group: RouteGroup) -> None:
+    calls: list[int] = []
+
+    def make_config() -> str:
+        calls.append(1)
+        return "config"
+
+    @route_group.get("/")
+    async def view(
+        config: typing.Annotated[str, FactoryResolver(make_config, scope=DependencyScope.SINGLETON)],
+    ) -> Response:
+        return PlainTextResponse(config)
+
+    (result,) = await route_group.warm_up()
+    assert result.spec.param_name == "config"
+    assert calls == [1]
+
+
+def test_app_scoped_dependencies_with_custom_lifespan(route_group: RouteGroup) -> None:
+    AppValue = typing.Annotated[str, FactoryResolver(lambda: "value", scope=DependencyScope.APP)]
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> typing.AsyncGenerator[dict[str, typing.Any], None]:
+        async with dependency_lifespan(app) as state:
+            yield {**state, "custom": "custom"}
+
+    @route_group.get("/")
+    async def view(request: Request, value: AppValue) -> Response:
+        return PlainTextResponse(value + " " + request.state.custom)
+
+    app = Starlette(routes=route_group, lifespan=lifespan)
+    with TestClient(app) as client:
+        assert client.get("/").text == "value custom"
+
+
+def test_app_scoped_dependencies_require_lifespan(route_group: RouteGroup) -> None:
+    AppValue = typing.Annotated[str, FactoryResolver(lambda: "value", scope=DependencyScope.APP)]
+
+    @route_group.get("/")
+    async def view(value: AppValue) -> Response:  # pragma: no cover
+        return PlainTextResponse(value)
+
+    app = Starlette(routes=route_group)
+    with TestClient(app) as client, pytest.raises(DependencyError, match="dependency_lifespan"):
+        client.get("/")
+
+
 def test_norequest_handler(route_group: RouteGroup) -> None:
     @route_group.get("/test")
     async def view() -> Response:
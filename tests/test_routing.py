@@ -0,0 +1,154 @@
+import typing
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.convertors import CONVERTOR_TYPES, Convertor, register_url_convertor
+from starlette.routing import Match, Mount, NoMatchFound, Route
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocket
+
+from starlette_dispatch import RadixRouter, RouteGroup
+
+
+class TeamPathConvertor(Convertor[str]):
+    regex = "[a-z]+/[a-z]+"
+
+    def convert(self, value: str) -> str:
+        return value
+
+    def to_string(self, value: str) -> str:
+        return value
+
+
+@pytest.fixture(scope="module", autouse=True)
+def team_path_convertor() -> typing.Generator[None, None, None]:
+    register_url_convertor("team_path", TeamPathConvertor())
+    yield
+    CONVERTOR_TYPES.pop("team_path")
+
+
+@pytest.fixture
+def group(route_group: RouteGroup) -> RouteGroup:
+    def add_view(path: str, name: str, methods: list[str] | None = None) -> None:
+        async def view(request: Request) -> Response:
+            return PlainTextResponse(f"{name} {request.path_params}")
+
+        route_group.add(path, methods=methods or ["GET"], name=name)(view)
+
+    add_view("/", "index")
+    add_view("/users", "users")
+    add_view("/users/", "users_slash")
+    add_view("/users/me", "me")
+    add_view("/users/{id:int}", "user_by_id")
+    add_view("/users/{name}", "user_by_name")
+    add_view("/users/{id:int}/posts/{post_id:uuid}", "post")
+    add_view("/users/{id:int}/edit", "edit", methods=["POST"])
+    add_view("/files/{path:path}", "file")
+    add_view("/images/{name}.{ext}", "image")
+    add_view("/orders/{id}", "order_first")
+    add_view("/orders/{id:int}", "order_shadowed")
+    add_view("/posts/", "posts")
+    add_view("/teams/{team:team_path}", "team")
+
+    @route_group.websocket("/ws/{room}")
+    async def chat(websocket: WebSocket) -> None:
+        await websocket.accept()
+        await websocket.send_text(websocket.path_params["room"])
+        await websocket.close()
+
+    route_group.routes.append(Mount("/static", routes=[Route("/{name}", lambda request: PlainTextResponse("static"))]))
+    return route_group
+
+
+PATHS = [
+    "/",
+    "/users",
+    "/users/",
+    "/users/me",
+    "/users/42",
+    "/users/john",
+    "/users/42/posts/0d9c4e29-5b7f-4b89-9d7e-8a7f63e5c3a1",
+    "/users/42/posts/not-a-uuid",
+    "/users/42/edit",
+    "/files/a/b/c.txt",
+    "/images/cat.png",
+    "/orders/42",
+    "/posts",
+    "/teams/red/blue",
+    "/static/app.js",
+    "/missing",
+    "/users/42/missing",
+]
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_matches_like_flat_routes(group: RouteGroup, path: str) -> None:
+    with TestClient(Starlette(routes=group)) as flat, TestClient(Starlette(routes=group.compile())) as compiled:
+        expected = flat.get(path, follow_redirects=False)
+        response = compiled.get(path, follow_redirects=False)
+
+    assert (response.status_code, response.text) == (expected.status_code, expected.text)
+    assert response.headers.get("location") == expected.headers.get("location")
+    assert response.headers.get("allow") == expected.headers.get("allow")
+
+
+def test_typed_segments(group: RouteGroup) -> None:
+    with TestClient(Starlette(routes=group.compile())) as client:
+        assert client.get("/users/42").text == "user_by_id {'id': 42}"
+        assert client.get("/users/john").text == "user_by_name {'name': 'john'}"
+        assert client.get("/orders/42").text == "order_first {'id': '42'}"
+        assert client.get("/users/42/edit").status_code == 405
+        assert client.get("/teams/red/blue").text == "team {'team': 'red/blue'}"
+
+
+def test_websocket(group: RouteGroup) -> None:
+    with TestClient(Starlette(routes=group.compile())) as client:
+        with client.websocket_connect("/ws/general") as websocket:
+            assert websocket.receive_text() == "general"
+
+
+def test_stores_matched_route_in_scope(route_group: RouteGroup) -> None:
+    routes: list[typing.Any] = []
+
+    @route_group.get("/users/{id}", name="user")
+    async def view(request: Request) -> Response:
+        routes.append(request.scope["route"])
+        return PlainTextResponse("ok")
+
+    with TestClient(Starlette(routes=route_group.compile())) as client:
+        client.get("/users/1")
+    assert routes == [route_group.routes[0]]
+
+
+def test_url_path_for(group: RouteGroup) -> None:
+    router = RadixRouter(group)
+    assert router.url_path_for("user_by_id", id=42) == "/users/42"
+
+    app = Starlette(routes=[router])
+    assert app.url_path_for("post", id=1, post_id="0d9c4e29-5b7f-4b89-9d7e-8a7f63e5c3a1").startswith("/users/1/posts/")
+    with pytest.raises(NoMatchFound):
+        router.url_path_for("unknown")
+
+
+def test_standalone_app() -> None:
+    router = RadixRouter([Route("/users/{id:int}", lambda request: PlainTextResponse("user"))])
+    client = TestClient(router)
+    assert client.get("/users/1").text == "user"
+    assert client.get("/users/me").status_code == 404
+
+
+def test_lifespan_scope_does_not_match(group: RouteGroup) -> None:
+    router = RadixRouter(group)
+    assert router.matches({"type": "lifespan"})[1] == {}
+    assert repr(router) == "RadixRouter(routes=16)"
+
+
+def test_mounted_router_matches_relative_path() -> None:
+    router = RadixRouter([Route("/users/{id:int}", lambda request: PlainTextResponse("user"))])
+    scope = {"type": "http", "method": "GET", "path": "/api/users/1", "root_path": "/api"}
+    assert router.matches(scope)[0] == Match.FULL
+    assert router.matches({**scope, "path": "/users/1", "root_path": ""})[0] == Match.FULL
+    assert router.matches({**scope, "path": "/api"})[0] == Match.NONE
+    assert router.matches({**scope, "path": "/apiusers/1"})[0] == Match.NONE
@@ -0,0 +1,190 @@
+import contextlib
+import typing
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response
+from starlette.testclient import TestClient
+
+from starlette_dispatch import FactoryResolver, RouteGroup, RouteStats, ServerTiming
+from starlette_dispatch.stats import LatencyHistogram, log_buckets
+
+
+@contextlib.asynccontextmanager
+async def open_session() -> typing.AsyncGenerator[str, None]:
+    yield "session"
+
+
+Session = typing.Annotated[str, FactoryResolver(open_session)]
+
+
+class TestLatencyHistogram:
+    def test_log_buckets(self) -> None:
+        assert log_buckets(1, 10, 2) == (1, 2, 4, 8, 16)
+
+        with pytest.raises(ValueError, match="min_value must be positive"):
+            log_buckets(0, 10, 2)
+        with pytest.raises(ValueError, match="min_value must be positive"):
+            log_buckets(10, 1, 2)
+        with pytest.raises(ValueError, match="growth must be greater than 1"):
+            log_buckets(1, 10, 1)
+
+    def test_record(self) -> None:
+        histogram = LatencyHistogram((1, 2, 4))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.record(value)
+
+        assert histogram.counts == [2, 1, 1, 1]
+        assert histogram.count == 5
+        assert histogram.sum == 16
+        assert histogram.max == 10
+
+    def test_quantile(self) -> None:
+        histogram = LatencyHistogram((1, 2, 4))
+        assert histogram.quantile(0.5) == 0
+
+        for value in (0.5, 0.5, 1.5, 3):
+            histogram.record(value)
+        assert histogram.quantile(0.5) == 1
+        assert histogram.quantile(0.75) == 2
+        assert histogram.quantile(1) == 3  # clamped by the max value
+
+        histogram.record(10)
+        assert histogram.quantile(1) == 10
+
+
+def test_records_route_phases() -> None:
+    stats = RouteStats()
+    group = RouteGroup(route_stats=stats)
+
+    @group.get("/users/{id}", name="user")
+    async def view(session: Session) -> Response:
+        return PlainTextResponse(session)
+
+    @group.get("/")
+    def index() -> Response:
+        return PlainTextResponse("index")
+
+    with TestClient(Starlette(routes=group)) as client:
+        assert client.get("/users/1").text == "session"
+        assert client.get("/users/2").text == "session"
+        assert client.get("/").text == "index"
+
+    histograms = stats.routes["user", "/users/{id}"]
+    assert histograms.total.count == 2
+    assert [histogram.count for _, histogram in histograms.phases()] == [2, 2, 2, 2]
+    assert histograms.total.sum >= histograms.view.sum
+    assert stats.routes["index", "/"].total.count == 1
+
+    stats.reset()
+    assert stats.routes["user", "/users/{id}"].total.count == 0
+
+
+def test_routes_with_same_name_and_path_share_histograms() -> None:
+    stats = RouteStats()
+    group = RouteGroup(route_stats=stats)
+
+    @group.get("/items", name="items")
+    async def list_items() -> Response:
+        return PlainTextResponse("list")
+
+    @group.post("/items", name="items")
+    async def create_item() -> Response:
+        return PlainTextResponse("create")
+
+    with TestClient(Starlette(routes=group)) as client:
+        assert client.get("/items").text == "list"
+        assert client.post("/items").text == "create"
+
+    assert list(stats.routes) == [("items", "/items")]
+    assert stats.routes["items", "/items"].total.count == 2
+
+
+def test_records_failed_requests() -> None:
+    stats = RouteStats()
+    group = RouteGroup(route_stats=stats)
+
+    def fail() -> str:
+        raise LookupError("missing")
+
+    @group.get("/resolution")
+    async def resolution_view(session: Session, value: typing.Annotated[str, FactoryResolver(fail)]) -> Response:
+        return PlainTextResponse(value)  # pragma: no cover
+
+    @group.get("/view")
+    async def view(session: Session) -> Response:
+        raise LookupError("missing")
+
+    with TestClient(Starlette(routes=group), raise_server_exceptions=False) as client:
+        assert client.get("/resolution").status_code == 500
+        assert client.get("/view").status_code == 500
+
+    histograms = stats.routes["resolution_view", "/resolution"]
+    assert histograms.total.count == 1
+    assert histograms.resolution.sum > 0
+    assert histograms.view.sum == histograms.teardown.sum == 0
+
+    histograms = stats.routes["view", "/view"]
+    assert histograms.total.count == 1
+    assert histograms.resolution.sum > 0
+    assert histograms.view.sum > 0
+    assert histograms.teardown.sum > 0
+
+
+def test_records_with_server_timing() -> None:
+    stats = RouteStats()
+    group = RouteGroup(route_stats=stats, server_timing=ServerTiming(sample_rate=0))
+
+    @group.get("/users/{id}", name="user")
+    async def view(session: Session) -> Response:
+        return PlainTextResponse(session)
+
+    with TestClient(Starlette(routes=group)) as client:
+        response = client.get("/users/1")
+    assert "server-timing" not in response.headers
+    assert stats.routes["user", "/users/{id}"].total.count == 1
+
+
+def test_stats_route_json() -> None:
+    stats = RouteStats()
+    group = RouteGroup(route_stats=stats)
+
+    @group.get("/users/{id}", name="user")
+    async def view(session: Session) -> Response:
+        return PlainTextResponse(session)
+
+    @group.get("/")
+    def index() -> Response:
+        return PlainTextResponse("index")  # pragma: no cover
+
+    with TestClient(Starlette(routes=[*group, stats.route()])) as client:
+        client.get("/users/1")
+        data = client.get("/stats").json()
+
+    routes = {route["name"]: route for route in data["routes"]}
+    assert routes["user"]["path"] == "/users/{id}"
+    assert set(routes["user"]["phases"]) == {"resolution", "view", "teardown", "total"}
+    assert routes["user"]["phases"]["total"]["count"] == 1
+    assert routes["index"]["phases"]["total"]["count"] == 0
+
+
+def test_stats_route_prometheus() -> None:
+    stats = RouteStats(min_latency=0.001, max_latency=1, growth=10)
+    group = RouteGroup(route_stats=stats)
+
+    @group.get("/users/{id}", name="user")
+    async def view(session: Session) -> Response:
+        return PlainTextResponse(session)
+
+    with TestClient(Starlette(routes=[*group, stats.route()])) as client:
+        client.get("/users/1")
+        response = client.get("/stats?format=prometheus")
+        assert client.get("/stats", headers={"accept": "text/plain"}).text == response.text
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert lines[1] == "# TYPE starlette_dispatch_route_duration_seconds histogram"
+    labels = 'route="user",path="/users/{id}",phase="total"'
+    assert f'starlette_dispatch_route_duration_seconds_bucket{{{labels},le="0.001"}}' in response.text
+    assert f'starlette_dispatch_route_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in lines
+    assert f"starlette_dispatch_route_duration_seconds_count{{{labels}}} 1" in lines
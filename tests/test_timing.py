@@ -0,0 +1,227 @@
+import contextlib
+import re
+import typing
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.testclient import TestClient
+
+from starlette_dispatch import (
+    BlockingCall,
+    BlockingDetector,
+    FactoryExecutor,
+    FactoryResolver,
+    RequestTimings,
+    ResolutionHooks,
+    ResolutionPlan,
+    ResolveContext,
+    ResolveEvent,
+    RouteGroup,
+    VariableResolver,
+)
+from starlette_dispatch.injections import create_dependency_specs, resolve_dependencies
+from starlette_dispatch.timing import ServerTiming
+
+
+def get_user() -> str:
+    return "user"
+
+
+@contextlib.asynccontextmanager
+async def open_session() -> typing.AsyncGenerator[str, None]:
+    yield "session"
+
+
+User = typing.Annotated[str, FactoryResolver(get_user)]
+Session = typing.Annotated[str, FactoryResolver(open_session)]
+
+
+def test_server_timing_header() -> None:
+    group = RouteGroup(server_timing=ServerTiming())
+
+    @group.get("/")
+    async def view(user: User, session: Session) -> Response:
+        return PlainTextResponse(f"{user} {session}")
+
+    with TestClient(Starlette(routes=group)) as client:
+        response = client.get("/")
+
+    assert response.text == "user session"
+    metrics = [metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")]
+    assert metrics == ["resolve", "dep.get_user", "dep.open_session", "view", "teardown"]
+    assert re.fullmatch(r"resolve;dur=\d+\.\d{3}", response.headers["server-timing"].split(", ")[0])
+    assert 'desc="get_user"' in response.headers["server-timing"]
+
+
+def test_server_timing_without_dependencies() -> None:
+    group = RouteGroup(server_timing=ServerTiming(dependencies=False), compile_dependencies=True)
+
+    @group.get("/")
+    async def view(user: User, session: Session) -> Response:
+        return PlainTextResponse(f"{user} {session}")
+
+    with TestClient(Starlette(routes=group)) as client:
+        response = client.get("/")
+
+    metrics = [metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")]
+    assert metrics == ["resolve", "view", "teardown"]
+
+
+def test_server_timing_sampling() -> None:
+    class StaffServerTiming(ServerTiming):
+        def should_sample(self, request: Request) -> bool:
+            return "x-staff" in request.headers
+
+    sampled_group = RouteGroup(server_timing=ServerTiming(sample_rate=0))
+    staff_group = RouteGroup("/staff", server_timing=StaffServerTiming(sample_rate=0))
+
+    @sampled_group.get("/")
+    @staff_group.get("/")
+    async def view(user: User) -> Response:
+        return PlainTextResponse(user)
+
+    with TestClient(Starlette(routes=[*sampled_group, *staff_group])) as client:
+        assert "server-timing" not in client.get("/").headers
+        assert "server-timing" not in client.get("/staff/").headers
+        assert "server-timing" in client.get("/staff/", headers={"x-staff": "1"}).headers
+
+
+def test_server_timing_forwards_hooks() -> None:
+    class Hooks(ResolutionHooks):
+        def __init__(self) -> None:
+            self.names: list[str] = []
+
+        def after_resolve(self, context: ResolveContext, event: ResolveEvent) -> None:
+            self.names.append(event.spec.param_name)
+
+    hooks = Hooks()
+    group = RouteGroup(server_timing=ServerTiming(), hooks=hooks)
+
+    @group.get("/")
+    async def view(user: User, session: Session) -> Response:
+        return PlainTextResponse(f"{user} {session}")
+
+    with TestClient(Starlette(routes=group)) as client:
+        assert "server-timing" in client.get("/").headers
+    assert hooks.names == ["user", "session"]
+
+
+def test_request_timings_sum_repeated_factories() -> None:
+    timings = RequestTimings()
+    resolver = FactoryResolver(lambda: 1)
+    context = typing.cast(ResolveContext, None)
+    for _ in range(2):
+        timings.after_resolve(context, ResolveEvent(typing.cast(typing.Any, None), resolver, None, False, 0.5))
+    # only factories are listed
+    timings.after_resolve(context, ResolveEvent(typing.cast(typing.Any, None), VariableResolver(1), None, False, 0.5))
+
+    assert timings.factories == {"<lambda>": 1.0}
+    assert ServerTiming().render(timings).split(", ")[1] == 'dep._lambda_;dur=1000.000;desc="<lambda>"'
+
+
+def test_server_timing_validates_sample_rate() -> None:
+    with pytest.raises(ValueError, match="sample_rate must be between 0 and 1"):
+        ServerTiming(sample_rate=2)
+    with pytest.raises(ValueError, match="sample_rate must be between 0 and 1"):
+        ServerTiming(sample_rate=-1)
+
+
+def test_blocking_detector_reports_sync_calls() -> None:
+    calls: list[BlockingCall] = []
+    group = RouteGroup(hooks=BlockingDetector(threshold=0, callback=calls.append))
+
+    async def load_settings() -> str:
+        return "settings"
+
+    @group.get("/users/{id}")
+    async def view(
+        user: User,
+        settings: typing.Annotated[str, FactoryResolver(load_settings)],
+        offloaded: typing.Annotated[str, FactoryResolver(get_user, executor=FactoryExecutor.THREADPOOL)],
+        agent: typing.Annotated[str, lambda request: request.headers["user-agent"]],
+    ) -> Response:
+        return PlainTextResponse(user)
+
+    with TestClient(Starlette(routes=group)) as client:
+        assert client.get("/users/1").text == "user"
+
+    assert [call.name for call in calls] == [
+        "tests.test_timing.get_user",
+        "tests.test_timing.test_blocking_detector_reports_sync_calls.<locals>.<lambda>",
+    ]
+    assert calls[0].route == "/users/{id}"
+    assert calls[0].path == "/users/1"
+    assert calls[0].elapsed >= 0
+
+
+def test_blocking_detector_reports_sync_context_managers() -> None:
+    calls: list[BlockingCall] = []
+    group = RouteGroup(hooks=BlockingDetector(threshold=0, callback=calls.append))
+
+    @contextlib.contextmanager
+    def open_connection() -> typing.Generator[str, None, None]:
+        yield "connection"
+
+    class Transaction:
+        def __enter__(self) -> str:
+            return "transaction"
+
+        def __exit__(self, *exc_details: object) -> None: ...
+
+    @group.get("/")
+    async def view(
+        connection: typing.Annotated[str, FactoryResolver(open_connection)],
+        transaction: typing.Annotated[str, FactoryResolver(Transaction)],
+        session: Session,
+    ) -> Response:
+        return PlainTextResponse(f"{connection} {transaction}")
+
+    with TestClient(Starlette(routes=group)) as client:
+        assert client.get("/").text == "connection transaction"
+
+    prefix = "tests.test_timing.test_blocking_detector_reports_sync_context_managers.<locals>."
+    assert [call.name.removeprefix(prefix) for call in calls] == [
+        "open_connection",
+        "open_connection.__enter__",
+        "Transaction",
+        "Transaction.__enter__",
+        # entering and exiting async context managers does not block
+        "tests.test_timing.open_session",
+        "Transaction.__exit__",
+        "open_connection.__exit__",
+    ]
+
+
+def test_blocking_detector_threshold(caplog: pytest.LogCaptureFixture) -> None:
+    calls: list[BlockingCall] = []
+    detector = BlockingDetector(threshold=60, callback=calls.append)
+    group = RouteGroup(hooks=detector)
+
+    @group.get("/users/{id}")
+    async def view(user: User) -> Response:
+        return PlainTextResponse(user)
+
+    with TestClient(Starlette(routes=group)) as client:
+        client.get("/users/1")
+        assert calls == []
+
+        detector.threshold, detector.callback = 0, None
+        client.get("/users/1")
+    assert "tests.test_timing.get_user blocked the event loop for" in caplog.text
+    assert "(route /users/{id}, path /users/1)" in caplog.text
+
+
+async def test_blocking_detector_reads_route_from_plan() -> None:
+    def view(user: User) -> None: ...
+
+    calls: list[BlockingCall] = []
+    plan = ResolutionPlan.build(
+        create_dependency_specs(view), hooks=BlockingDetector(threshold=0, callback=calls.append), route_path="/me"
+    )
+    # older starlette releases do not store the matched route in the scope
+    request = Request({"type": "http", "path": "/me", "headers": []})
+    async with resolve_dependencies(request, plan) as dependencies:
+        assert dependencies == {"user": "user"}
+    assert [(call.route, call.path) for call in calls] == [("/me", "/me")]